@@ -0,0 +1,196 @@
+"""Batch export of the setup() arguments of many setup.cfg distributions.
+
+This is meant for tooling that works with many distributions at once (for
+example every package in a large repository), where running
+``./setup.py --name --version ...`` separately for each one is too slow.
+The setup.cfg files are processed with `setup.cfg.config.to_setup` in a pool
+of worker processes, and the results are reported as they come in.
+
+The results can also be written as newline-delimited JSON with the
+``setup-cfg-export`` command (or ``python -m setup.cfg.batch``).
+"""
+
+from __future__ import with_statement
+
+import contextlib
+import json
+import multiprocessing
+import optparse
+import os
+import sys
+import traceback
+
+from . import profiling, timing
+from .config import to_setup
+from .serialize import dump_kwargs
+from .util import monkeypatch_method
+
+
+def export_metadata(paths, jobs=None, fields=None, parser='scanner'):
+    """
+    Computes the setup() arguments for each of the given setup.cfg files (or
+    directories containing a setup.cfg file) and yields them as they finish,
+    not necessarily in the order given.
+
+    Each result is a dict containing the ``path`` to the setup.cfg file and
+    either its setup() arguments as ``kwargs`` (in the JSON-compatible format
+    of `setup.cfg.serialize.dump_kwargs`), or an ``error`` message.  If
+    *fields* is given, only those setup() arguments are included.
+
+    The files are processed by a pool of *jobs* worker processes (by default
+    one per CPU).  Within a worker, each distribution is processed with its
+    own working directory and ``sys.path``, and any modules imported or
+    monkey-patches installed while processing it are discarded afterwards.
+
+    The files are parsed with the given *parser* (see
+    `setup.cfg.config.read_config`); by default this is the faster
+    `setup.cfg.scanner`.
+    """
+
+    tasks = [(_find_setup_cfg(path), fields, parser) for path in paths]
+
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _export_one(task)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap_unordered(_export_one, tasks, chunksize=1):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _find_setup_cfg(path):
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        path = os.path.join(path, 'setup.cfg')
+    return path
+
+
+def _export_one(task):
+    path, fields, parser = task
+    result = {'path': path}
+
+    try:
+        with isolated(os.path.dirname(path)):
+            kwargs = to_setup(path, parser=parser)
+            if fields is not None:
+                kwargs = dict((key, value) for key, value in kwargs.items()
+                              if key in fields)
+            if 'long_description' in kwargs:
+                kwargs['long_description'] = str(kwargs['long_description'])
+            result['kwargs'] = dump_kwargs(kwargs)
+    except (Exception, SystemExit):
+        e = sys.exc_info()[1]
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        result['traceback'] = traceback.format_exc()
+
+    return result
+
+
+@contextlib.contextmanager
+def isolated(package_dir):
+    """
+    Context manager for processing a distribution as if by its own setup.py
+    script in *package_dir*, and undoing any changes to the interpreter state
+    afterwards: the working directory, ``sys.path``, monkey-patches, custom
+    compilers and the distribution's own modules are all restored.
+
+    The distribution also gets its own hook times and profiler, whose
+    reports (if enabled by its setup.cfg) are written once it is done.
+
+    Output from the distribution's hooks is sent to stderr so that it does
+    not get mixed in with the results.
+    """
+
+    old_cwd = os.getcwd()
+    old_path = sys.path[:]
+    old_modules = set(sys.modules)
+    old_stdout = sys.stdout
+
+    compiler_class = None
+    if 'distutils.ccompiler' in sys.modules:
+        compiler_class = sys.modules['distutils.ccompiler'].compiler_class
+        old_compiler_class = compiler_class.copy()
+
+    old_hook_times = timing._hook_times
+    old_profiler = profiling._profiler
+    timing._hook_times = timing.HookTimes()
+    profiling._profiler = profiling.PhaseProfiler(
+        profiling.parse_profile_mode(os.environ.get(profiling.PROFILE_ENV)))
+
+    os.chdir(package_dir)
+    sys.path.insert(0, package_dir)
+    sys.stdout = sys.stderr
+    try:
+        yield
+    finally:
+        try:
+            timing._hook_times.report()
+            profiling._profiler.report()
+        finally:
+            timing._hook_times = old_hook_times
+            profiling._profiler = old_profiler
+        sys.stdout = old_stdout
+        monkeypatch_method.unpatch_all()
+        if compiler_class is not None:
+            compiler_class.clear()
+            compiler_class.update(old_compiler_class)
+        # Forget the distribution's own modules (such as its hooks), but not
+        # any libraries that were imported along the way
+        for name in set(sys.modules) - old_modules:
+            filename = getattr(sys.modules[name], '__file__', None)
+            if (filename and os.path.abspath(filename).startswith(
+                    os.path.join(package_dir, ''))):
+                del sys.modules[name]
+        sys.path[:] = old_path
+        os.chdir(old_cwd)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage='%prog [options] PATH [PATH ...]',
+        description='Writes the setup() arguments for each of the given '
+                    'setup.cfg files (or directories containing one) to '
+                    'stdout as newline-delimited JSON, in the order they '
+                    'finish.')
+    parser.add_option('-j', '--jobs', type='int', default=None,
+                      help='number of worker processes (default: the number '
+                           'of CPUs)')
+    parser.add_option('-f', '--field', dest='fields', action='append',
+                      metavar='FIELD',
+                      help='only include the given setup() argument; may be '
+                           'given more than once')
+    parser.add_option('-p', '--parser', default='scanner',
+                      choices=['scanner', 'configparser'],
+                      help='how to parse the setup.cfg files: with the fast '
+                           'setup.cfg scanner or with RawConfigParser '
+                           '(default: %default)')
+    options, args = parser.parse_args(argv)
+
+    if not args:
+        parser.error('at least one path is required')
+
+    errors = 0
+    for result in export_metadata(args, jobs=options.jobs,
+                                  fields=options.fields,
+                                  parser=options.parser):
+        if 'error' in result:
+            errors += 1
+        sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+        sys.stdout.flush()
+
+    return int(errors > 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Micro-benchmarks of the processing of synthetic setup.cfg files.
+
+`generate_config` writes setup.cfg files of growing size, with as many
+classifiers, entry points, package_data lines, data_files and extension
+sections as the given size, and `run_benchmarks` times the stages of their
+processing on each of them:
+
+``parse``
+    reading the file with `setup.cfg.config.read_config`
+``scan``
+    reading the file with `setup.cfg.scanner`
+``process_config``
+    converting the config to setup() arguments
+``get_extension_modules``
+    building the Extension objects
+``get_entry_points``
+    converting the ``[entry_points]`` section
+``setup_cfg``
+    the whole ``setup_cfg`` setup() keyword, as run by ``setup.py``
+
+Run it with ``python -m setup.cfg.benchmark``; the results are written as
+JSON (see `run_benchmarks`), which can be compared against the results for
+another commit with ``--compare``.  The report also shows how the time of
+each stage grows with the size of the config, so that code that is quadratic
+in the number of options stands out.
+"""
+
+from __future__ import with_statement
+
+import json
+import math
+import optparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from .batch import isolated
+from .util import split_multiline
+
+# Bump this whenever the structure of the results changes in an incompatible
+# way
+BENCHMARK_FORMAT = 1
+
+DEFAULT_SIZES = [10, 100, 1000, 3000]
+DEFAULT_REPEAT = 5
+
+# A change in time by more than this factor is reported by compare_results
+DEFAULT_THRESHOLD = 1.25
+
+STAGES = ['parse', 'scan', 'process_config', 'get_extension_modules',
+          'get_entry_points', 'setup_cfg']
+
+
+def generate_config(directory, size):
+    """Writes a synthetic setup.cfg file of the given size to *directory*,
+    along with its description file, and returns its path.
+    """
+
+    def lines(template, count=size):
+        return ''.join('\n    ' + template % {'i': idx}
+                       for idx in range(count))
+
+    sections = [
+        '[metadata]\n'
+        'name = synthetic-%(size)d\n'
+        'version = 1.0\n'
+        'author = Synthetic Author\n'
+        'summary = A synthetic distribution with %(size)d of everything\n'
+        'description-file = README.txt\n'
+        'requires-dist =%(requires)s\n'
+        'classifier =%(classifiers)s\n' % {
+            'size': size,
+            'requires': lines('synthetic_dep_%(i)d (>=1.%(i)d)',
+                              max(size // 10, 1)),
+            'classifiers': lines('Topic :: Synthetic :: Classifier %(i)d')},
+
+        '[files]\n'
+        'packages = synthetic\n'
+        'package_data =%(package_data)s\n'
+        'data_files =%(data_files)s\n' % {
+            'package_data': lines('synthetic = data/%(i)d/*.txt'),
+            'data_files': lines('share/synthetic/%(i)d = data/%(i)d.txt')},
+
+        '[entry_points]\n'
+        'console_scripts =%(scripts)s\n'
+        'synthetic.plugins =%(plugins)s\n' % {
+            'scripts': lines('synthetic-%(i)d = synthetic.cli%(i)d:main'),
+            'plugins': lines('plugin%(i)d = synthetic.plugins:Plugin%(i)d')}
+    ]
+
+    for idx in range(size):
+        sections.append(
+            '[extension: synthetic.ext%(i)d]\n'
+            'sources =\n'
+            '    src/ext%(i)d.c\n'
+            '    src/common.c\n'
+            'include_dirs = include\n'
+            'define_macros =\n'
+            '    EXT_INDEX=%(i)d\n'
+            '    SYNTHETIC\n'
+            'extra_compile_args = -O2\n' % {'i': idx})
+
+    with open(os.path.join(directory, 'README.txt'), 'w') as f:
+        f.write('A synthetic distribution.\n')
+
+    path = os.path.join(directory, 'setup.cfg')
+    with open(path, 'w') as f:
+        f.write('\n'.join(sections))
+    return path
+
+
+def _run_stage(stage, path):
+    """Returns a function that prepares a cold run of the given stage on the
+    given setup.cfg file, and returns the function to time.
+
+    Each run starts from a freshly parsed config, so that the config caches
+    kept for the process (see `setup.cfg.config.read_config`) and the
+    results memoized on the parsed config do not carry over from one run,
+    or one stage, to the next.
+    """
+
+    from . import config as config_mod
+
+    def fresh_config():
+        config_mod._parsed_configs.clear()
+        return config_mod.read_config(path)
+
+    if stage in ('parse', 'scan'):
+        parser = stage == 'scan' and 'scanner' or 'configparser'
+
+        def prepare():
+            config_mod._parsed_configs.clear()
+            return lambda: config_mod.read_config(path, parser)
+        return prepare
+
+    if stage in ('process_config', 'get_extension_modules',
+                 'get_entry_points'):
+        func = getattr(config_mod, stage)
+
+        def prepare():
+            config = fresh_config()
+            return lambda: func(config)
+        return prepare
+    elif stage == 'setup_cfg':
+        from setuptools.dist import Distribution
+        from .core import setup_cfg
+
+        def prepare():
+            config_mod._parsed_configs.clear()
+            dist = Distribution()
+            return lambda: setup_cfg(dist, 'setup_cfg', path)
+        return prepare
+
+    raise ValueError('unknown stage: %r' % stage)
+
+
+def _time(prepare, repeat):
+    """Returns the times of *repeat* runs of the function returned by
+    *prepare* (which is called again before each run), in the order they
+    ran.
+    """
+
+    from .timing import timer
+
+    times = []
+    for _ in range(repeat):
+        func = prepare()
+        start = timer()
+        func()
+        times.append(timer() - start)
+    return times
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, stages=STAGES,
+                   log=None):
+    """Times each of the given stages on synthetic configs of the given
+    sizes, *repeat* times each, and returns the results as a JSON-compatible
+    dict.
+
+    The ``results`` item of the dict is a list with a ``{'stage', 'size',
+    'first', 'best', 'median'}`` dict for each stage and size (times are in
+    seconds, ``first`` being the time of the first run, in a process that
+    has not run the stage before); the other items describe the
+    environment.  *log*, if given,
+    is called with a message for each result.
+    """
+
+    results = []
+    temp_dir = tempfile.mkdtemp(prefix='setup.cfg-benchmark-')
+    old_cache_dir = os.environ.pop('SETUP_CFG_CACHE_DIR', None)
+    try:
+        for size in sizes:
+            size_dir = os.path.join(temp_dir, str(size))
+            os.mkdir(size_dir)
+            path = generate_config(size_dir, size)
+            with isolated(size_dir):
+                for stage in stages:
+                    times = _time(_run_stage(stage, path), repeat)
+                    first = times[0]
+                    times.sort()
+                    result = {'stage': stage, 'size': size,
+                              'first': first,
+                              'best': times[0],
+                              'median': times[len(times) // 2]}
+                    results.append(result)
+                    if log is not None:
+                        log('%-22s %6d  %10.6fs  (first %10.6fs)' %
+                            (stage, size, result['best'], first))
+    finally:
+        if old_cache_dir is not None:
+            os.environ['SETUP_CFG_CACHE_DIR'] = old_cache_dir
+        shutil.rmtree(temp_dir)
+
+    return {
+        'format': BENCHMARK_FORMAT,
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def _git_commit():
+    try:
+        proc = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, _ = proc.communicate()
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return out.decode('ascii').strip()
+
+
+def scaling(results):
+    """Returns the exponent of the growth of the best time of each stage with
+    the size of the config, between the smallest and the largest size
+    (about 1 for linear stages, 2 for quadratic ones), by stage.
+    """
+
+    by_stage = {}
+    for result in results['results']:
+        by_stage.setdefault(result['stage'], []).append(
+            (result['size'], result['best']))
+
+    exponents = {}
+    for stage, times in by_stage.items():
+        times.sort()
+        (size1, time1), (size2, time2) = times[0], times[-1]
+        if size1 == size2 or time1 <= 0 or time2 <= 0:
+            continue
+        exponents[stage] = (math.log(time2 / time1) /
+                            math.log(float(size2) / size1))
+    return exponents
+
+
+def compare_results(base, new, threshold=DEFAULT_THRESHOLD):
+    """Compares two sets of results from `run_benchmarks`, and returns a list
+    of ``(stage, size, base time, new time, ratio)`` tuples for the stages
+    and sizes present in both, and the list of those among them whose ratio
+    is above *threshold*.
+    """
+
+    base_times = dict(((r['stage'], r['size']), r['best'])
+                      for r in base['results'])
+
+    rows = []
+    for result in new['results']:
+        key = (result['stage'], result['size'])
+        if key not in base_times or base_times[key] <= 0:
+            continue
+        ratio = result['best'] / base_times[key]
+        rows.append(key + (base_times[key], result['best'], ratio))
+
+    return rows, [row for row in rows if row[4] > threshold]
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description='Times the processing of synthetic setup.cfg files of '
+                    'growing size, and writes the results as JSON.')
+    parser.add_option('-s', '--sizes', default=None,
+                      help='comma-separated sizes of the generated configs '
+                           '(default: %s)' %
+                           ','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_option('-n', '--repeat', type='int', default=DEFAULT_REPEAT,
+                      help='number of runs of each stage (default: '
+                           '%default)')
+    parser.add_option('--stage', dest='stages', action='append',
+                      metavar='STAGE', choices=STAGES,
+                      help='only run the given stage (one of %s); may be '
+                           'given more than once' % ', '.join(STAGES))
+    parser.add_option('-o', '--output', default=None,
+                      help='file to write the results to (default: stdout)')
+    parser.add_option('-c', '--compare', default=None, metavar='FILE',
+                      help='results of an earlier run to compare with; '
+                           'exits with an error if any stage got slower by '
+                           'more than the threshold')
+    parser.add_option('-t', '--threshold', type='float',
+                      default=DEFAULT_THRESHOLD,
+                      help='slowdown ratio reported by --compare (default: '
+                           '%default)')
+    options, args = parser.parse_args(argv)
+
+    if args:
+        parser.error('unexpected arguments: %s' % ' '.join(args))
+
+    sizes = DEFAULT_SIZES
+    if options.sizes:
+        try:
+            sizes = [int(size) for size in split_multiline(
+                     options.sizes.replace(',', '\n'))]
+        except ValueError:
+            parser.error('invalid sizes: %s' % options.sizes)
+
+    def log(msg):
+        sys.stderr.write(msg + '\n')
+
+    results = run_benchmarks(sizes, options.repeat,
+                             options.stages or STAGES, log=log)
+
+    for stage, exponent in sorted(scaling(results).items()):
+        log('%-22s grows as size ** %.2f' % (stage, exponent))
+
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        sys.stdout.write(data + '\n')
+
+    if not options.compare:
+        return 0
+
+    with open(options.compare) as f:
+        base = json.load(f)
+    rows, slower = compare_results(base, results, options.threshold)
+    for stage, size, base_time, new_time, ratio in rows:
+        log('%-22s %6d  %10.6fs -> %10.6fs  %5.2fx%s' %
+            (stage, size, base_time, new_time, ratio,
+             ratio > options.threshold and '  SLOWER' or ''))
+    return int(bool(slower))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
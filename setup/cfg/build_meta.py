@@ -0,0 +1,216 @@
+"""A PEP 517 build backend for distributions configured by setup.cfg.
+
+Use it by adding the following to the distribution's ``pyproject.toml``::
+
+    [build-system]
+    requires = ["setup.cfg", "setuptools", "wheel"]
+    build-backend = "setup.cfg.build_meta"
+
+``prepare_metadata_for_build_wheel``, which is all pip needs to resolve the
+dependencies of a distribution, writes the ``.dist-info`` directory straight
+from the parsed setup.cfg (see `setup.cfg.metadata.write_dist_info`), without
+running any setuptools commands.  ``build_wheel`` and ``build_sdist`` run the
+``bdist_wheel`` and ``sdist`` commands as ``./setup.py`` would, in the same
+process; if the distribution has no ``setup.py``, they run setup() with just
+the ``setup_cfg`` keyword.  If ``build_wheel`` is given the
+*metadata_directory* prepared earlier, the files of that ``.dist-info``
+directory replace those written by ``bdist_wheel``, so that the wheel has
+exactly the metadata the frontend was given.
+
+The `setup.cfg.config.SetupConfig` read from setup.cfg is kept for the whole
+process (as long as the file is unchanged), so that the hooks called by the
+same frontend process share a single parse of the file.
+
+The *config_settings* given to the hooks are currently ignored.
+"""
+
+from __future__ import with_statement
+
+import base64
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from .config import SetupConfig
+
+
+SETUP_CFG = 'setup.cfg'
+
+# Absolute path of each setup.cfg file read -> ((mtime, size), SetupConfig)
+_setup_configs = {}
+
+
+def _get_setup_config(path=SETUP_CFG):
+    """Returns the `SetupConfig` for the given setup.cfg file, which is only
+    read again if the file changed.
+    """
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (st.st_mtime, st.st_size)
+
+    cached = _setup_configs.get(path)
+    if cached is None or cached[0] != key:
+        cached = _setup_configs[path] = (key, SetupConfig.from_file(path))
+    return cached[1]
+
+
+def _setup_requires():
+    return list(_get_setup_config().get('setup_requires') or [])
+
+
+def get_requires_for_build_wheel(config_settings=None):
+    return _setup_requires() + ['wheel']
+
+
+def get_requires_for_build_sdist(config_settings=None):
+    return _setup_requires()
+
+
+def prepare_metadata_for_build_wheel(metadata_directory,
+                                     config_settings=None):
+    from .metadata import write_dist_info
+
+    return write_dist_info(metadata_directory, SETUP_CFG,
+                           setup_config=_get_setup_config())
+
+
+def build_wheel(wheel_directory, config_settings=None,
+                metadata_directory=None):
+    wheel = _build('bdist_wheel', [], wheel_directory, '.whl')
+    if metadata_directory is not None:
+        _use_prepared_metadata(
+            os.path.join(os.path.abspath(wheel_directory), wheel),
+            metadata_directory)
+    return wheel
+
+
+def build_sdist(sdist_directory, config_settings=None):
+    return _build('sdist', ['--formats', 'gztar'], sdist_directory,
+                  '.tar.gz')
+
+
+def _build(command, args, output_directory, suffix):
+    """Runs the given command, which writes a single file ending with
+    *suffix* to its ``--dist-dir``, and moves that file to
+    *output_directory*; returns its name.
+    """
+
+    output_directory = os.path.abspath(output_directory)
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    temp_dir = tempfile.mkdtemp(prefix='.setup.cfg-build-',
+                                dir=output_directory)
+    try:
+        _run_setup([command] + args + ['--dist-dir', temp_dir])
+        built = [name for name in os.listdir(temp_dir)
+                 if name.endswith(suffix)]
+        if len(built) != 1:
+            raise ValueError('%s did not build a single %s file: %s' %
+                             (command, suffix, ', '.join(built)))
+
+        filename = os.path.join(output_directory, built[0])
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(os.path.join(temp_dir, built[0]), filename)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return built[0]
+
+
+def _use_prepared_metadata(wheel_path, metadata_directory):
+    """Replaces the files of the ``.dist-info`` directory in the given wheel
+    by those of the same directory in *metadata_directory*, as written by
+    `prepare_metadata_for_build_wheel`, and rewrites the wheel's ``RECORD``.
+
+    Raises `ValueError` if *metadata_directory* does not contain the wheel's
+    ``.dist-info`` directory, as when the name or version differ.
+    """
+
+    src = zipfile.ZipFile(wheel_path)
+    try:
+        dist_info = None
+        for name in src.namelist():
+            top = name.split('/', 1)[0]
+            if top.endswith('.dist-info'):
+                dist_info = top
+                break
+
+        prepared_dir = os.path.join(metadata_directory, dist_info or '')
+        if dist_info is None or not os.path.isdir(prepared_dir):
+            raise ValueError(
+                'the metadata prepared in %s does not match the wheel %s' %
+                (metadata_directory, os.path.basename(wheel_path)))
+
+        prepared = {}
+        for filename in os.listdir(prepared_dir):
+            if filename == 'RECORD':
+                continue
+            with open(os.path.join(prepared_dir, filename), 'rb') as f:
+                prepared[dist_info + '/' + filename] = f.read()
+
+        record_name = dist_info + '/RECORD'
+        entries = []
+        for info in src.infolist():
+            if info.filename == record_name:
+                continue
+            data = prepared.pop(info.filename, None)
+            if data is None:
+                data = src.read(info)
+            entries.append((info, data))
+        for name in sorted(prepared):
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.external_attr = 0o644 << 16
+            entries.append((info, prepared[name]))
+    finally:
+        src.close()
+
+    record = []
+    for info, data in entries:
+        digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+        record.append('%s,sha256=%s,%d' % (
+            info.filename, digest.rstrip(b'=').decode('ascii'), len(data)))
+    record.append('%s,,' % record_name)
+    info = zipfile.ZipInfo(record_name, time.localtime()[:6])
+    info.external_attr = 0o644 << 16
+    entries.append((info, ('\n'.join(record) + '\n').encode('utf-8')))
+
+    temp_path = wheel_path + '.tmp'
+    dest = zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        for info, data in entries:
+            info.compress_type = zipfile.ZIP_DEFLATED
+            dest.writestr(info, data)
+    finally:
+        dest.close()
+    os.remove(wheel_path)
+    os.rename(temp_path, wheel_path)
+
+
+def _run_setup(args):
+    """Runs ``./setup.py`` with the given arguments in this process, or
+    setup() with just the ``setup_cfg`` keyword if there is no setup.py.
+    """
+
+    old_argv = sys.argv
+    old_path = sys.path[:]
+    sys.argv = ['setup.py'] + args
+    # As when running setup.py, so that its hooks can be imported
+    sys.path.insert(0, os.getcwd())
+    try:
+        if os.path.exists('setup.py'):
+            with open('setup.py') as f:
+                code = compile(f.read(), 'setup.py', 'exec')
+            exec(code, {'__name__': '__main__', '__file__': 'setup.py'})
+        else:
+            from setuptools import setup
+            setup(setup_cfg=SETUP_CFG)
+    finally:
+        sys.argv = old_argv
+        sys.path[:] = old_path
@@ -0,0 +1,240 @@
+"""Persistent on-disk cache for the results of processing a setup.cfg file.
+
+Each cache entry is a JSON file recording the data to cache along with the
+content hashes of all the files that data was computed from (the setup.cfg
+file itself, its description files, the modules containing its hooks and
+commands, etc.).  An entry is only used if all of those files are unchanged.
+
+Caching is disabled unless a cache directory is given explicitly, or through
+the ``SETUP_CFG_CACHE_DIR`` environment variable.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from distutils import log
+
+
+CACHE_DIR_ENV = 'SETUP_CFG_CACHE_DIR'
+
+# Bump this whenever the structure of cache entries changes in an
+# incompatible way
+CACHE_FORMAT = 2
+
+
+def get_cache_dir(cache_dir=None):
+    """Returns the cache directory to use, or `None` if caching is disabled."""
+
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+
+    if not cache_dir:
+        return None
+
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+
+def file_digest(path):
+    """Returns the SHA-1 hex digest of a file's contents, or `None` if the
+    file does not exist.
+    """
+
+    digest = hashlib.sha1()
+    try:
+        f = open(path, 'rb')
+    except (IOError, OSError):
+        return None
+
+    try:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    finally:
+        f.close()
+
+    return digest.hexdigest()
+
+
+def module_file(obj):
+    """Returns the source file of the module that defines the given object, if
+    it can be determined.
+    """
+
+    module = sys.modules.get(getattr(obj, '__module__', None))
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+
+    return os.path.abspath(filename)
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def atomic_write(path, data):
+    """Writes the given text to a file such that concurrent readers see either
+    the old contents or the new contents, never a partial write.
+    """
+
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        f = os.fdopen(fd, 'w')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, path)
+        else:
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class InputTracker(object):
+    """Records the state of the files that some computed data depends on, so
+    that it can be checked later whether any of them have changed.
+
+    Each input is recorded with its size and modification time as well as the
+    hash of its contents; the file is only re-hashed when the former change.
+    Files that did not exist are recorded as well, so that creating one
+    invalidates the data.
+    """
+
+    def __init__(self, inputs=None):
+        self.inputs = dict(inputs or {})
+
+    def add(self, path):
+        path = os.path.abspath(path)
+        if path not in self.inputs:
+            self.inputs[path] = [_stat_key(path), file_digest(path)]
+
+    def update(self, paths):
+        for path in paths:
+            if path:
+                self.add(path)
+
+    def is_current(self):
+        for path, (stat_key, digest) in self.inputs.items():
+            new_stat_key = _stat_key(path)
+            if new_stat_key == stat_key:
+                continue
+            if new_stat_key is None or digest is None:
+                return False
+            if file_digest(path) != digest:
+                return False
+        return True
+
+
+class SetupCache(object):
+    """Stores cache entries for setup.cfg files in a directory.
+
+    Entries are keyed on the absolute path to the setup.cfg file and on the
+    hash of its contents, so that switching between different versions of the
+    same file (e.g. on different branches) does not evict older entries.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def open(cls, cache_dir=None):
+        """Returns a `SetupCache` for the configured cache directory, or
+        `None` if caching is disabled.
+        """
+
+        cache_dir = get_cache_dir(cache_dir)
+        if cache_dir is None:
+            return None
+        return cls(cache_dir)
+
+    def entry_path(self, path, kind='setup'):
+        path = os.path.abspath(path)
+        key = hashlib.sha1(path.encode('utf-8'))
+        key.update(b'\0')
+        key.update((file_digest(path) or '').encode('ascii'))
+        return os.path.join(self.cache_dir,
+                            '%s-%s.json' % (kind, key.hexdigest()))
+
+    def data_path(self, kind, name):
+        """Returns the path to a file for storing other cached data of the
+        given kind, such as directory listings, that is keyed on *name*
+        alone.
+        """
+
+        key = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, '%s-%s.json' % (kind, key))
+
+    def load(self, path, kind='setup'):
+        """Returns the data cached for the given setup.cfg file, or `None` if
+        there is no entry for it or the entry is out of date.
+        """
+
+        from .. import __version__
+
+        entry_path = self.entry_path(path, kind)
+        try:
+            f = open(entry_path)
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (entry.get('format') != CACHE_FORMAT or
+                entry.get('version') != __version__ or
+                entry.get('python') != list(sys.version_info[:2])):
+            return None
+
+        if not InputTracker(entry['inputs']).is_current():
+            log.debug('[setup.cfg] cache entry %s is out of date' %
+                      entry_path)
+            return None
+
+        log.debug('[setup.cfg] using cache entry %s' % entry_path)
+        return entry['data']
+
+    def store(self, path, data, inputs, kind='setup'):
+        """Stores data computed from the given setup.cfg file.
+
+        *inputs* is an `InputTracker` recording all the other files the data
+        depends on; the setup.cfg file itself is always included.
+        """
+
+        from .. import __version__
+
+        inputs.add(path)
+        entry = {
+            'format': CACHE_FORMAT,
+            'version': __version__,
+            'python': list(sys.version_info[:2]),
+            'inputs': inputs.inputs,
+            'data': data
+        }
+
+        entry_path = self.entry_path(path, kind)
+        try:
+            atomic_write(entry_path, json.dumps(entry))
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not write cache entry %s: %s' %
+                     (entry_path, e))
@@ -0,0 +1 @@
+"""Commands provided by setup.cfg to distributions that use it."""
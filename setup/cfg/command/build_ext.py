@@ -0,0 +1,217 @@
+"""A build_ext command that builds extension modules in parallel, and only
+recompiles what changed.
+
+This is used by default for distributions with ``[extension:...]`` sections
+in their setup.cfg, unless they provide their own build_ext command.
+"""
+
+import os
+import sys
+
+from distutils import log
+from distutils.dep_util import newer_group
+from distutils.errors import CCompilerError, CompileError, DistutilsError
+
+from setuptools.command.build_ext import build_ext as _build_ext
+
+from ..compilers import OBJECT_CACHE_DIR_ENV, ObjectCache, enable_object_cache
+from ..depends import DEPENDS_CACHE_FILE, IncludeGraph
+
+
+def _cpu_count():
+    import multiprocessing
+
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+class build_ext(_build_ext):
+    """
+    Builds extension modules by compiling the sources of all of them
+    concurrently in a pool of ``jobs`` worker threads (by default one per
+    CPU); each extension module is linked as soon as all of its object files
+    are ready.
+
+    The number of jobs can be given with the ``--jobs`` option (``jobs`` in
+    the ``[build_ext]`` section of setup.cfg), or with the standard
+    ``--parallel``/``-j`` option.  With one job the extension modules are
+    built one after another, as normal.
+
+    The sources are scanned for the headers they include (see
+    `setup.cfg.depends`), and only the sources whose object files are older
+    than the source or any of those headers are recompiled, unless
+    ``--force`` is given.
+
+    With the ``--cache-objects`` option the object files are also cached in
+    a directory shared by all builds (see `setup.cfg.compilers`).
+    """
+
+    user_options = list(_build_ext.user_options)
+    user_options.append(('jobs=', None,
+                         'number of parallel compile jobs [default: number '
+                         'of CPUs]'))
+    if not [opt for opt in user_options if opt[0] == 'parallel=']:
+        # Not supported on older Pythons
+        user_options.append(('parallel=', 'j',
+                             'number of parallel build jobs'))
+    user_options.extend([
+        ('cache-objects', None,
+         'cache compiled object files in a directory shared by all builds'),
+        ('object-cache-dir=', None,
+         'directory for cached object files [default: $%s or '
+         '~/.cache/setup.cfg/objects]' % OBJECT_CACHE_DIR_ENV)
+    ])
+
+    boolean_options = list(_build_ext.boolean_options) + ['cache-objects']
+
+    def initialize_options(self):
+        _build_ext.initialize_options(self)
+        self.jobs = None
+        self.cache_objects = None
+        self.object_cache_dir = None
+        if not hasattr(self, 'parallel'):
+            self.parallel = None
+
+    def finalize_options(self):
+        _build_ext.finalize_options(self)
+        jobs = self.jobs or self.parallel
+        if jobs is None or jobs is True:
+            jobs = _cpu_count()
+        try:
+            self.jobs = max(int(jobs), 1)
+        except ValueError:
+            from distutils.errors import DistutilsOptionError
+            raise DistutilsOptionError('jobs must be an integer')
+
+    def build_extensions(self):
+        # First, sanity-check the 'extensions' list
+        self.check_extensions_list(self.extensions)
+
+        compiler = self.compiler
+        if self.cache_objects:
+            enable_object_cache(compiler,
+                                ObjectCache.open(self.object_cache_dir))
+
+        had_compile = 'compile' in vars(compiler)
+        orig_compile = compiler.compile
+
+        self._include_graph = IncludeGraph(
+            os.path.join(self.build_temp, DEPENDS_CACHE_FILE))
+
+        compile_pool = ext_pool = None
+        if self.jobs > 1 and len(self._get_all_sources()) > 1:
+            from multiprocessing.pool import ThreadPool
+
+            compile_pool = ThreadPool(self.jobs)
+            # Each extension module is built in its own thread, which hands
+            # its sources over to the compile pool and links it as soon as
+            # they are compiled
+            ext_pool = ThreadPool(min(self.jobs, len(self.extensions)))
+            compile = _parallel_compile(compile_pool, orig_compile)
+        else:
+            compile = orig_compile
+
+        compiler.compile = _incremental_compile(compiler, compile,
+                                                self._include_graph,
+                                                self.force)
+
+        try:
+            if ext_pool is None:
+                for ext in self.extensions:
+                    self._build_one(ext)
+            else:
+                results = [ext_pool.apply_async(self._build_one, (ext,))
+                           for ext in self.extensions]
+                for result in results:
+                    result.get()
+        finally:
+            if had_compile:
+                compiler.compile = orig_compile
+            else:
+                del compiler.compile
+            if ext_pool is not None:
+                ext_pool.close()
+                compile_pool.close()
+                ext_pool.join()
+                compile_pool.join()
+            self._include_graph.save()
+
+    def _get_all_sources(self):
+        sources = []
+        for ext in self.extensions:
+            sources.extend(ext.sources)
+        return sources
+
+    def _build_one(self, ext):
+        # Rebuild the extension module if any of the headers its sources
+        # include changed, not just the ones listed in its depends option
+        include_dirs = (list(ext.include_dirs or []) +
+                        list(self.compiler.include_dirs))
+        depends = list(ext.depends or [])
+        for source in ext.sources:
+            for header in self._include_graph.dependencies(source,
+                                                           include_dirs):
+                if header not in depends:
+                    depends.append(header)
+        ext.depends = depends
+
+        try:
+            self.build_extension(ext)
+        except (CCompilerError, DistutilsError, CompileError):
+            if not getattr(ext, 'optional', False):
+                raise
+            e = sys.exc_info()[1]
+            self.warn('building extension "%s" failed: %s' % (ext.name, e))
+
+
+def _incremental_compile(compiler, compile, graph, force=False):
+    """
+    Returns a replacement for a compiler's compile() method that only compiles
+    the sources whose object files are older than the sources themselves or
+    any of the headers they include (according to the given
+    `~setup.cfg.depends.IncludeGraph`), unless *force* is true.  The object
+    files for all the sources are returned either way.
+    """
+
+    def incremental_compile(sources, output_dir=None, macros=None,
+                            include_dirs=None, *args, **kwargs):
+        objects = compiler.object_filenames(sources, output_dir=output_dir)
+        search_dirs = list(include_dirs or []) + list(compiler.include_dirs)
+
+        stale = []
+        for source, obj in zip(sources, objects):
+            depends = [source] + graph.dependencies(source, search_dirs)
+            if force or newer_group(depends, obj):
+                stale.append(source)
+            else:
+                log.debug('skipping %s (%s up-to-date)' % (source, obj))
+
+        if stale:
+            compile(stale, output_dir, macros, include_dirs, *args, **kwargs)
+
+        return objects
+
+    return incremental_compile
+
+
+def _parallel_compile(pool, compile):
+    """
+    Returns a replacement for a compiler's compile() method that compiles each
+    source file as a separate task in the given pool, and returns once all of
+    them are compiled.
+    """
+
+    def parallel_compile(sources, *args, **kwargs):
+        if len(sources) <= 1:
+            return compile(sources, *args, **kwargs)
+
+        results = [pool.apply_async(compile, ([source],) + args, kwargs)
+                   for source in sources]
+        objects = []
+        for result in results:
+            objects.extend(result.get())
+        return objects
+
+    return parallel_compile
@@ -0,0 +1,34 @@
+"""A build_py command that looks for package data in the shared file index.
+
+This is used by default for distributions with a ``package_data`` option in
+their setup.cfg, unless they provide their own build_py command.
+"""
+
+from setuptools.command.build_py import build_py as _build_py
+
+from ..fileindex import get_file_index
+
+
+class build_py(_build_py):
+    """
+    Finds the files matching the ``package_data`` patterns with
+    `setup.cfg.fileindex.FileIndex.glob`, so that the directories of the
+    packages are not listed again for every pattern.
+    """
+
+    def find_data_files(self, package, src_dir):
+        get_patterns = getattr(self, '_get_platform_patterns', None)
+        if get_patterns is None:
+            # Older setuptools
+            return _build_py.find_data_files(self, package, src_dir)
+
+        file_index = get_file_index()
+        files = list(self.manifest_files.get(package, []))
+        seen = set(files)
+        for pattern in get_patterns(self.package_data, package, src_dir):
+            for path in file_index.glob(pattern):
+                if path not in seen and file_index.isfile(path):
+                    seen.add(path)
+                    files.append(path)
+
+        return self.exclude_data_files(package, src_dir, files)
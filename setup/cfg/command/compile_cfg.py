@@ -0,0 +1,35 @@
+"""A command that compiles setup.cfg into precomputed setup() arguments.
+
+``./setup.py compile_cfg`` writes the ``setup.cfg.json`` file described in
+`setup.cfg.compiled`, which later runs load instead of processing setup.cfg
+for as long as it is up to date.  To ship it with source distributions, add
+it to the ``extra_files`` option in the ``[files]`` section of setup.cfg.
+"""
+
+from distutils import log
+
+from setuptools import Command
+
+from ..config import compile_setup
+
+
+class compile_cfg(Command):
+    description = 'compile setup.cfg into precomputed setup() arguments'
+
+    user_options = [
+        ('setup-cfg=', None,
+         'the setup.cfg file to compile [default: setup.cfg]')
+    ]
+
+    def initialize_options(self):
+        self.setup_cfg = None
+
+    def finalize_options(self):
+        if self.setup_cfg is None:
+            self.setup_cfg = 'setup.cfg'
+
+    def run(self):
+        log.info('compiling %s' % self.setup_cfg)
+        if not self.dry_run:
+            filename = compile_setup(self.setup_cfg, self.distribution)
+            log.info('wrote %s' % filename)
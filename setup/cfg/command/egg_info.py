@@ -0,0 +1,181 @@
+"""An egg_info command that adds the ``extra_files`` to the manifest, and
+caches the manifest between runs.
+
+This is used by default for the distributions using setup.cfg that have
+``extra_files`` or whose results are cached (see `setup.cfg.config.to_setup`),
+unless they provide their own egg_info command.
+"""
+
+import hashlib
+import json
+import os
+
+from distutils import log
+
+from setuptools.command.egg_info import (egg_info as _egg_info,
+                                         manifest_maker as _manifest_maker,
+                                         FileList)
+
+from ..cache import SetupCache, InputTracker
+from ..fileindex import get_file_index
+from ..util import split_multiline
+
+
+# Files whose changes may change the files reported by the version control
+# file finders (such as setuptools_scm) without changing any directory
+_VCS_STATE_FILES = [
+    os.path.join('.git', 'index'),
+    os.path.join('.hg', 'dirstate'),
+    os.path.join('.svn', 'wc.db')
+]
+
+
+class egg_info(_egg_info):
+    """
+    Like the normal egg_info command, but the files from the ``[files]
+    extra_files`` option of setup.cfg (given to this command as its
+    ``extra_files`` option) are added to the manifest, and the manifest is
+    cached (see `manifest_maker`).
+    """
+
+    user_options = _egg_info.user_options + [
+        ('extra-files=', None,
+         'additional files to include in the manifest')
+    ]
+
+    def initialize_options(self):
+        _egg_info.initialize_options(self)
+        self.extra_files = None
+
+    def finalize_options(self):
+        _egg_info.finalize_options(self)
+        if self.extra_files is None:
+            self.extra_files = []
+        elif isinstance(self.extra_files, str):
+            self.extra_files = split_multiline(self.extra_files)
+
+    def find_sources(self):
+        """Generate SOURCES.txt manifest file"""
+
+        mm = manifest_maker(self.distribution)
+        mm.ignore_egg_info_dir = getattr(self, 'ignore_egg_info_in_manifest',
+                                         False)
+        mm.manifest = os.path.join(self.egg_info, 'SOURCES.txt')
+        mm.extra_files = self.extra_files
+        mm.run()
+        self.filelist = mm.filelist
+
+
+class manifest_maker(_manifest_maker):
+    """
+    Builds the manifest like the normal manifest_maker, but looks for files
+    in the shared `setup.cfg.fileindex.FileIndex`, adds the `extra_files`,
+    and caches the result.
+
+    The cached manifest is used as long as MANIFEST.in, setup.py, the
+    distutils config files (including setup.cfg), the state of the version
+    control system and the contents of the project's directories are
+    unchanged, as well as the distribution's packages, modules, data files
+    and so on.  The cache is kept in the ``SETUP_CFG_CACHE_DIR`` if it is
+    set, and in the build directory otherwise.
+    """
+
+    extra_files = ()
+
+    def run(self):
+        cache = self._open_cache()
+        key = self._distribution_key()
+        template = os.path.abspath(self.template)
+
+        cached = cache.load(template, kind='manifest')
+        if cached is not None and cached['distribution'] == key:
+            log.info("reading cached manifest for '%s'" % self.manifest)
+            self.filelist = FileList()
+            self.filelist.files = list(cached['files'])
+            if cached['egg_info']:
+                self.filelist.extend(self._egg_info_files())
+            self.filelist.sort()
+            self.filelist.remove_duplicates()
+            self.write_manifest()
+            return
+
+        self._walked = False
+        _manifest_maker.run(self)
+
+        if not self._walked:
+            # Some other files than those in the file index were looked at
+            return
+
+        # The files in the egg-info directory are rewritten on every run, so
+        # they are listed again when the cached manifest is used
+        egg_info_files = set(self._egg_info_files())
+        files = [filename for filename in self.filelist.files
+                 if filename not in egg_info_files]
+
+        inputs = InputTracker()
+        inputs.update(['setup.py'] + _VCS_STATE_FILES)
+        inputs.update(self.distribution.find_config_files())
+        inputs.update(get_file_index().scanned_dirs)
+        data = {'distribution': key, 'files': files,
+                'egg_info': len(files) < len(self.filelist.files)}
+        cache.store(template, data, inputs, kind='manifest')
+
+    def add_defaults(self):
+        # Look for the files matching the patterns in MANIFEST.in in the
+        # shared file index, rather than walking the whole tree again.  The
+        # build directory (which holds the cache) is pruned from the manifest
+        # anyway, and the egg-info directory is listed separately.
+        if self.filelist.allfiles is None:
+            build = self.get_finalized_command('build')
+            egg_info = self.get_finalized_command('egg_info')
+            self.filelist.allfiles = get_file_index().findall(
+                exclude=[build.build_base, egg_info.egg_info])
+            self.filelist.allfiles.extend(self._egg_info_files())
+            self._walked = True
+
+        _manifest_maker.add_defaults(self)
+
+        files = set(self.filelist.files)
+        for filename in self.extra_files:
+            if filename not in files:
+                files.add(filename)
+                self.filelist.append(filename)
+
+    def _egg_info_files(self):
+        egg_info = self.get_finalized_command('egg_info').egg_info
+        try:
+            names = sorted(os.listdir(egg_info))
+        except OSError:
+            return []
+        paths = [os.path.join(egg_info, name) for name in names]
+        return [path for path in paths if os.path.isfile(path)]
+
+    def _open_cache(self):
+        cache = SetupCache.open()
+        if cache is None:
+            build = self.get_finalized_command('build')
+            cache = SetupCache(os.path.abspath(os.path.join(build.build_base,
+                                                            'setup.cfg')))
+            # Create it before the project's directories are looked at, so
+            # that doing so later does not invalidate the cached manifest
+            self.mkpath(cache.cache_dir)
+        return cache
+
+    def _distribution_key(self):
+        """Returns a hash of everything about the distribution, other than
+        the config files, that affects which files are in the manifest.
+        """
+
+        dist = self.distribution
+        ext_modules = [(ext.name, ext.sources, getattr(ext, 'depends', None))
+                       for ext in dist.ext_modules or []]
+        data = [dist.get_fullname(), dist.packages, dist.py_modules,
+                dist.package_dir, dist.package_data, dist.data_files,
+                dist.scripts, ext_modules, getattr(dist, 'libraries', None),
+                getattr(dist.metadata, 'license_files', None),
+                getattr(dist, 'include_package_data', None),
+                sorted(dist.cmdclass), list(self.extra_files),
+                self.ignore_egg_info_dir]
+        return hashlib.sha1(json.dumps(data, sort_keys=True,
+                                       default=repr).encode('utf-8')
+                            ).hexdigest()
@@ -0,0 +1,157 @@
+"""Precompiled setup() arguments stored next to setup.cfg.
+
+The ``compile_cfg`` command (see `setup.cfg.command.compile_cfg`) processes a
+setup.cfg file once, running its setup hooks, and writes the resulting
+setup() arguments (split and converted, in the format of
+`setup.cfg.serialize.dump_kwargs`) to ``setup.cfg.json`` next to it, along
+with the setup.cfg version that wrote it and the content hashes of all the
+files they were computed from.  From then on `setup.cfg.config.to_setup`
+loads the arguments from that file as long as all those files are unchanged,
+without parsing setup.cfg or running any hooks.
+
+Unlike the cache enabled with ``SETUP_CFG_CACHE_DIR`` (see `setup.cfg.cache`),
+the compiled file is meant to be shipped with the source of the distribution,
+for example in release builds or deployment images: the files in the
+distribution's directory are recorded by their relative paths and checked by
+their contents only, so it remains valid when the directory is copied or
+unpacked elsewhere.  Since the setup hooks may compute different arguments
+for different interpreters, it is only used by the same Python version and
+implementation that wrote it.  The distutils config files that did not exist
+are recorded as well, so that creating one of them invalidates it.  The
+directories listed to expand glob patterns are recorded by the names of the
+files in them, ignoring build products (see `IGNORED_NAMES`).
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import platform
+import sys
+
+from distutils import log
+
+from .cache import atomic_write, file_digest
+from .util import absolute_path, relative_path
+
+
+# Bump this whenever the structure of compiled files changes in an
+# incompatible way
+COMPILED_FORMAT = 2
+
+# Patterns of file names that are ignored when hashing the contents of a
+# directory, so that building the distribution does not invalidate the
+# compiled file
+IGNORED_NAMES = ['.*', '*.cfg.json', '*.pyc', '*.pyo', '*.egg-info',
+                 '__pycache__', 'build', 'dist']
+
+
+def compiled_path(path):
+    """Returns the path to the compiled file for the given setup.cfg file."""
+
+    return os.path.abspath(path) + '.json'
+
+
+def input_digest(path):
+    """Returns the hash of a file's contents, of the names of the files in a
+    directory (except for those matching `IGNORED_NAMES`), or `None` if there
+    is no such file or directory.
+    """
+
+    if os.path.isdir(path):
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            return None
+        digest = hashlib.sha1()
+        for name in names:
+            if [p for p in IGNORED_NAMES if fnmatch.fnmatch(name, p)]:
+                continue
+            digest.update(name.encode('utf-8') + b'\0')
+        return 'dir:' + digest.hexdigest()
+
+    return file_digest(path)
+
+
+def _relative_inputs(inputs, base_dir):
+    """Returns the given absolute input paths, relative to *base_dir* if they
+    are in it (see `setup.cfg.util.relative_path`), mapped to their digests.
+    """
+
+    return dict((relative_path(path, base_dir), input_digest(path))
+                for path in inputs)
+
+
+def write_compiled(path, data, inputs):
+    """Writes the given data for the given setup.cfg file to its compiled
+    file, and returns the path to that.
+
+    *inputs* are the absolute paths of the files the data was computed from;
+    the setup.cfg file itself is always included.
+    """
+
+    from .. import __version__
+
+    path = os.path.abspath(path)
+    inputs = set(inputs)
+    inputs.add(path)
+
+    compiled = {
+        'format': COMPILED_FORMAT,
+        'version': __version__,
+        'python': list(sys.version_info[:2]),
+        'implementation': platform.python_implementation(),
+        'inputs': _relative_inputs(inputs, os.path.dirname(path)),
+        'data': data
+    }
+
+    filename = compiled_path(path)
+    atomic_write(filename, json.dumps(compiled, indent=2, sort_keys=True))
+    return filename
+
+
+def load_compiled(path):
+    """Returns the data compiled for the given setup.cfg file, or `None` if
+    there is no compiled file or it is out of date.
+    """
+
+    from .. import __version__
+
+    filename = compiled_path(path)
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        f = open(filename)
+        try:
+            compiled = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        e = sys.exc_info()[1]
+        log.warn('[setup.cfg] ignoring unreadable %s: %s' % (filename, e))
+        return None
+
+    if (compiled.get('format') != COMPILED_FORMAT or
+            compiled.get('version') != __version__):
+        log.info('[setup.cfg] ignoring %s, which was written by another '
+                 'version of setup.cfg' % filename)
+        return None
+
+    if (compiled.get('python') != list(sys.version_info[:2]) or
+            compiled.get('implementation') !=
+            platform.python_implementation()):
+        log.info('[setup.cfg] ignoring %s, which was written by another '
+                 'Python version or implementation' % filename)
+        return None
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for name, digest in compiled['inputs'].items():
+        if input_digest(absolute_path(name, base_dir)) != digest:
+            log.info('[setup.cfg] ignoring %s, since %s changed' %
+                     (filename, name))
+            return None
+
+    log.debug('[setup.cfg] using compiled setup() arguments from %s' %
+              filename)
+    return compiled['data']
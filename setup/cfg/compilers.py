@@ -0,0 +1,395 @@
+"""A compiler that caches compiled object files, similarly to ccache.
+
+Object files are stored in a cache directory shared by all builds, keyed on
+the hash of the preprocessed source, the compiler command line and the
+identity of the compiler executable, so that identical sources are only
+compiled once even across different branches or checkouts.  As with ccache's
+``base_dir`` setting, absolute paths inside the directory being built (the
+current directory, such as in ``-I`` options and in the line markers of the
+preprocessed source) are made relative before hashing, so that checkouts in
+different directories share their objects; the debugging information in the
+objects then refers to the checkout that compiled them first.  When the
+cache grows past its maximum size, the least recently used objects are
+removed.
+
+The cache can be enabled in either of two ways in setup.cfg: by registering
+the ``cached`` compiler and selecting it::
+
+    [global]
+    compilers = setup.cfg.compilers.CachingCompiler
+
+    [build_ext]
+    compiler = cached
+
+or with the ``cache-objects`` option of setup.cfg's build_ext command::
+
+    [build_ext]
+    cache-objects = 1
+
+The cache directory defaults to ``~/.cache/setup.cfg/objects`` and can be
+changed with the ``SETUP_CFG_OBJECT_CACHE_DIR`` environment variable (or the
+``object-cache-dir`` option of build_ext).  Its maximum size defaults to 1G
+and can be changed with ``SETUP_CFG_OBJECT_CACHE_SIZE``.
+
+Only compilers that compile one source file at a time with a gcc-compatible
+command line (such as the ``unix``, ``cygwin`` and ``mingw32`` compilers) can
+be cached; other compilers are used as they are.
+"""
+
+from __future__ import with_statement
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from distutils import log
+
+
+OBJECT_CACHE_DIR_ENV = 'SETUP_CFG_OBJECT_CACHE_DIR'
+OBJECT_CACHE_SIZE_ENV = 'SETUP_CFG_OBJECT_CACHE_SIZE'
+
+DEFAULT_MAX_SIZE = 1 << 30
+
+# Bump this whenever the way object files are keyed changes
+OBJECT_CACHE_FORMAT = 2
+
+_SIZE_SUFFIXES = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+# ObjectCache instances shared by all compilers, by cache directory
+_object_caches = {}
+
+# Identities of the compiler executables already looked up, by name
+_compiler_identities = {}
+
+# Caching subclasses of the compiler classes, by base class
+_caching_classes = {}
+
+
+def get_object_cache_dir(cache_dir=None):
+    """Returns the object cache directory to use: the one given, the one set
+    in the environment, or the default in the user's cache directory.
+    """
+
+    if not cache_dir:
+        cache_dir = os.environ.get(OBJECT_CACHE_DIR_ENV)
+
+    if not cache_dir:
+        cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                      os.path.join('~', '.cache'))
+        cache_dir = os.path.join(cache_home, 'setup.cfg', 'objects')
+
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+
+def parse_size(size):
+    """Parses a size in bytes, optionally with a K, M, G or T suffix."""
+
+    size = str(size).strip().upper()
+    if size.endswith('B'):
+        size = size[:-1]
+    multiplier = 1
+    if size and size[-1] in _SIZE_SUFFIXES:
+        multiplier = _SIZE_SUFFIXES[size[-1]]
+        size = size[:-1]
+    return int(float(size) * multiplier)
+
+
+class ObjectCache(object):
+    """A directory of object files keyed on the hash of their inputs, with
+    size-based LRU eviction.
+
+    The modification time of each cached object is updated whenever it is
+    used, and the cache is trimmed to *max_size* by removing the objects used
+    least recently.  The cache may be shared by several threads and
+    processes.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._stored = 0
+        self._trimmed = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, cache_dir=None):
+        """Returns the shared `ObjectCache` for the given cache directory (see
+        `get_object_cache_dir`).
+        """
+
+        cache_dir = get_object_cache_dir(cache_dir)
+        try:
+            return _object_caches[cache_dir]
+        except KeyError:
+            pass
+
+        max_size = os.environ.get(OBJECT_CACHE_SIZE_ENV)
+        if max_size:
+            max_size = parse_size(max_size)
+        else:
+            max_size = DEFAULT_MAX_SIZE
+
+        return _object_caches.setdefault(cache_dir, cls(cache_dir, max_size))
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key[2:])
+
+    def fetch(self, key, obj):
+        """Copies the object file cached under the given key to *obj*;
+        returns `False` if there is no such object file.
+        """
+
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return False
+
+        try:
+            _copy_file(path, obj)
+            os.utime(path, None)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, obj):
+        """Stores a copy of the object file *obj* under the given key."""
+
+        path = self.path(key)
+        try:
+            _copy_file(obj, path)
+            size = os.path.getsize(path)
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not store %s in the object cache: '
+                     '%s' % (obj, e))
+            return
+
+        # Trim the cache the first time anything is stored, and then every
+        # time another tenth of its maximum size has been stored
+        with self._lock:
+            self._stored += size
+            trim = not self._trimmed or self._stored > self.max_size // 10
+            if trim:
+                self._trimmed = True
+                self._stored = 0
+
+        if trim:
+            self.trim()
+
+    def trim(self):
+        """Removes the least recently used objects until the total size of
+        the cache is at most its maximum size.
+        """
+
+        entries = []
+        total_size = 0
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total_size += st.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+
+def _copy_file(src, dst):
+    """Copies a file such that *dst* never exists with partial contents."""
+
+    dirname = os.path.dirname(dst)
+    if dirname and not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # Possibly created concurrently
+            if not os.path.isdir(dirname):
+                raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=dirname or '.', prefix='.tmp-')
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp_path)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, dst)
+        else:
+            if os.name == 'nt' and os.path.exists(dst):
+                os.remove(dst)
+            os.rename(tmp_path, dst)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _compiler_identity(executable):
+    """Identifies a compiler executable by its path, size and modification
+    time, so that upgrading the compiler invalidates the cached objects.
+    """
+
+    try:
+        return _compiler_identities[executable]
+    except KeyError:
+        pass
+
+    from distutils.spawn import find_executable
+
+    path = find_executable(executable) or executable
+    try:
+        st = os.stat(path)
+        identity = '%s:%d:%d' % (path, st.st_mtime, st.st_size)
+    except OSError:
+        identity = path
+
+    return _compiler_identities.setdefault(executable, identity)
+
+
+def _relative_to_base_dir(data, base_dir):
+    """Replaces the absolute paths inside *base_dir* in the given string (or
+    bytes) with relative paths, and *base_dir* itself with ``.``.
+    """
+
+    base_dir = re.escape(base_dir.rstrip(os.sep))
+    inside = base_dir + '[/%s]+' % re.escape(os.sep)
+    itself = base_dir + r'(?=["\s]|$)'
+
+    if isinstance(data, bytes):
+        encoding = sys.getfilesystemencoding()
+        data = re.sub(inside.encode(encoding), b'', data)
+        return re.sub(itself.encode(encoding), b'.', data)
+
+    data = re.sub(inside, '', data)
+    return re.sub(itself, '.', data)
+
+
+class CachingCompilerMixin(object):
+    """Mixin for CCompiler classes that caches the object files produced by
+    their ``_compile`` method in an `ObjectCache`.
+    """
+
+    object_cache = None
+
+    def _compile(self, obj, src, ext, cc_args, extra_postargs, pp_opts):
+        base = super(CachingCompilerMixin, self)
+
+        key = None
+        if self.object_cache is not None:
+            key = self._object_key(obj, src, cc_args, extra_postargs)
+
+        if key is not None and self.object_cache.fetch(key, obj):
+            log.info('using cached object for %s' % src)
+            return
+
+        base._compile(obj, src, ext, cc_args, extra_postargs, pp_opts)
+
+        if key is not None:
+            self.object_cache.store(key, obj)
+
+    def _object_key(self, obj, src, cc_args, extra_postargs):
+        """Returns the key of the object file compiled from the given source
+        with the given arguments, or `None` if it cannot be cached (for
+        example because the source fails to preprocess).
+        """
+
+        compiler_so = list(self.compiler_so)
+        args = [arg for arg in cc_args if arg != '-c']
+        cmd = compiler_so + args + ['-E', src] + list(extra_postargs or [])
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            preprocessed, _ = proc.communicate()
+        except OSError:
+            return None
+
+        if proc.returncode != 0:
+            return None
+
+        # Paths inside the directory being built do not depend on where it is
+        base_dir = os.getcwd()
+
+        key = hashlib.sha1()
+        key.update(('%d\0' % OBJECT_CACHE_FORMAT).encode('ascii'))
+        key.update(_compiler_identity(compiler_so[0]).encode('utf-8'))
+        for arg in compiler_so + list(cc_args) + list(extra_postargs or []):
+            arg = _relative_to_base_dir(arg, base_dir)
+            key.update(b'\0' + arg.encode('utf-8'))
+        key.update(b'\0' + os.path.splitext(obj)[1].encode('utf-8') + b'\0')
+        key.update(_relative_to_base_dir(preprocessed, base_dir))
+        return key.hexdigest()
+
+
+def caching_compiler_class(base):
+    """Returns a subclass of the given CCompiler class that caches its object
+    files.
+    """
+
+    try:
+        return _caching_classes[base]
+    except KeyError:
+        pass
+
+    if issubclass(base, CachingCompilerMixin):
+        cls = base
+    else:
+        cls = type(base.__name__, (CachingCompilerMixin, base), {})
+
+    return _caching_classes.setdefault(base, cls)
+
+
+def enable_object_cache(compiler, object_cache=None):
+    """Makes the given compiler instance cache its object files in the given
+    `ObjectCache` (by default the one for `get_object_cache_dir`).
+
+    Compilers that do not compile sources with ``_compile`` are left as they
+    are.
+    """
+
+    if object_cache is None:
+        object_cache = ObjectCache.open()
+
+    if not hasattr(compiler, '_compile') or not hasattr(compiler,
+                                                        'compiler_so'):
+        log.warn('[setup.cfg] the %s compiler does not support the object '
+                 'cache' % compiler.compiler_type)
+        return compiler
+
+    compiler.__class__ = caching_compiler_class(compiler.__class__)
+    compiler.object_cache = object_cache
+    return compiler
+
+
+class CachingCompiler(object):
+    """The default compiler for the platform, with its object files cached;
+    for use in the ``[global] compilers`` option of setup.cfg.
+    """
+
+    name = 'cached'
+    description = ('the default compiler for the platform, with cached object '
+                   'files')
+
+    def __new__(cls, verbose=0, dry_run=0, force=0):
+        from distutils.ccompiler import get_default_compiler, new_compiler
+
+        compiler = new_compiler(compiler=get_default_compiler(),
+                                verbose=verbose,
+                                dry_run=dry_run, force=force)
+        return enable_object_cache(compiler)
@@ -1,32 +1,39 @@
-"""Main setup.cfg file processing and distutils setup."""
+"""Main setup.cfg file processing and distutils setup.
 
-# These first two imports are not used, but are needed to get around an
-# irritating Python bug that can crop up when using ./setup.py test.
-# See: http://www.eby-sarna.com/pipermail/peak/2010-May/003355.html
-import multiprocessing
-import logging
+Note: The compiler, extension and manifest machinery from distutils and
+setuptools is imported only by the functions that need it, so that simple
+metadata queries (``./setup.py --name`` and the like) stay fast.
+"""
+
+from __future__ import with_statement
 
 import os
 import re
 import sys
-import traceback
-
-import distutils.ccompiler
 
 from distutils import log
 from distutils.errors import (DistutilsOptionError, DistutilsModuleError,
-                              DistutilsFileError)
-
-from setuptools.command.egg_info import manifest_maker
-from setuptools.dist import Distribution
-from setuptools.extension import Extension
-
-from .extern.six import moves
+                              DistutilsFileError, DistutilsSetupError)
+
+from .cache import SetupCache, InputTracker, get_cache_dir, module_file
+from .compiled import load_compiled, write_compiled
+from .extern.six import moves, string_types, text_type
+from .fileindex import expand_globs, get_file_index
+from .frozenconfig import ConfigView, FrozenConfig
+from .hooks import run_hooks, run_setup_hooks
+from .profiling import get_profiler, profile_phase
+from .serialize import dump_kwargs, load_kwargs
+from .timing import get_hook_times
 from .util import (resolve_name, has_get_option, split_multiline, split_csv,
-                   monkeypatch_method)
+                   fold_options, index_options, monkeypatch_method,
+                   absolute_path, relative_path)
 
 RawConfigParser = moves.configparser.RawConfigParser
 
+# Environment variable selecting the parser used by read_config by default:
+# 'configparser' or 'scanner'
+PARSER_ENV = 'SETUP_CFG_PARSER'
+
 # Mappings from setup() keyword arguments to setup.cfg options;
 # The values are (section, option) tuples, or simply (section,) tuples if
 # the option has the same name as the setup() argument
@@ -107,193 +114,958 @@ EXTENSION_FIELDS = set([
 ])
 
 
+# Commands provided by setup.cfg, used by default for the distributions that
+# need them unless they provide their own; given as (command name, import
+# reference, setup() argument the command is needed for, or None if it is
+# always used).  The egg_info command is only needed for the extra_files
+# option and for caching the manifest, see add_default_commands().
+DEFAULT_COMMANDS = [
+    ('build_ext', 'setup.cfg.command.build_ext.build_ext', 'ext_modules'),
+    ('build_py', 'setup.cfg.command.build_py.build_py', 'package_data'),
+    ('egg_info', 'setup.cfg.command.egg_info.egg_info', None),
+    ('compile_cfg', 'setup.cfg.command.compile_cfg.compile_cfg', None)
+]
+
+# Commands that need the workaround in _import_test_workaround()
+_TEST_COMMANDS = set(['test', 'nosetests'])
+
 # A simplified RE for this; just checks that the line ends with version
 # predicates in ()
 _VERSION_SPEC_RE = re.compile(r'\s*(.*?)\s*\((.*)\)\s*$')
 
 
-def to_setup(path='setup.cfg'):
+def to_setup(path='setup.cfg', cache_dir=None, dist=None, parser=None):
     """
     Reads given setup.cfg file and returns keyword arguments to setup().
 
     Also installs plugins and patches to distutils as needed to support some
     of the features supported by setup.cfg (pre/post-command hooks, etc.)
+
+    If given, *dist* is the `Distribution` the arguments are for; it is used
+    to find the distutils config files and command classes.  Each config file
+    is only parsed once per process (see `read_config`, which is also where
+    *parser* is described).
+
+    If *cache_dir* is given (or the ``SETUP_CFG_CACHE_DIR`` environment
+    variable is set) the results are cached in that directory, and reused by
+    later calls for as long as the setup.cfg file and everything it depends on
+    (its description files and the modules defining its hooks, commands and
+    compilers) remain unchanged.  Note that setup_hooks are not run at all
+    when the cached results are used; caching can be disabled for a
+    distribution by setting ``cache = false`` in the ``[global]`` section.
+
+    If the setup() arguments were compiled to a ``setup.cfg.json`` file by
+    the ``compile_cfg`` command, and none of the files they were computed
+    from changed since, they are loaded from there instead (see
+    `setup.cfg.compiled`).
     """
 
     # The method source code really starts here.
-    parser = RawConfigParser()
     if not os.path.exists(path):
         raise DistutilsFileError("file '%s' does not exist" %
                                  os.path.abspath(path))
-    parser.read(path)
-    config = {}
-    for section in parser.sections():
-        config[section] = dict(parser.items(section))
 
-    # Run setup_hooks, if configured
-    setup_hooks = has_get_option(config, 'global', 'setup_hooks')
-    package_dir = has_get_option(config, 'files', 'packages_root')
+    _import_test_workaround()
+
+    # The hook times are reported next to the setup.cfg being used
+    get_hook_times().base_dir = os.path.dirname(os.path.abspath(path))
+
+    profiler = get_profiler()
+    with profiler.phase('compiled'):
+        compiled = load_compiled(path)
+        if compiled is not None:
+            return _load_cached(compiled, path)
+
+    cache = SetupCache.open(cache_dir)
+    file_index = get_file_index()
+    if cache is not None:
+        with profiler.phase('cache'):
+            cached = cache.load(path)
+            if cached is not None:
+                return _load_cached(cached, path)
+            if file_index.cache_file is None:
+                file_index.load(cache.data_path('files', file_index.root))
+
+    kwargs, setup_config, config_files = _to_setup(path, dist, parser)
+    config = setup_config.config
+
+    if cache is not None and _is_cacheable(config):
+        with profiler.phase('cache'):
+            entry = _cache_entry(path, config, kwargs,
+                                 setup_config.package_dir,
+                                 setup_config.setup_hooks, config_files,
+                                 file_index.scanned_dirs)
+            if entry is not None:
+                data, inputs = entry
+                tracker = InputTracker()
+                tracker.update(inputs)
+                cache.store(path, data, tracker)
+            file_index.save()
+
+    return kwargs
+
+
+def compile_setup(path='setup.cfg', dist=None, parser=None):
+    """
+    Processes the given setup.cfg file like `to_setup`, and writes the
+    resulting setup() arguments to its compiled file (see
+    `setup.cfg.compiled`), whose path is returned.
+
+    Raises `DistutilsSetupError` if the arguments cannot be stored, for
+    example because a setup hook set one of them to an arbitrary object.
+    """
+
+    if not os.path.exists(path):
+        raise DistutilsFileError("file '%s' does not exist" %
+                                 os.path.abspath(path))
+
+    file_index = get_file_index()
+    kwargs, setup_config, config_files = _to_setup(path, dist, parser)
+    entry = _cache_entry(path, setup_config.config, kwargs,
+                         setup_config.package_dir, setup_config.setup_hooks,
+                         config_files, file_index.scanned_dirs)
+    if entry is None:
+        raise DistutilsSetupError(
+            'the setup() arguments for %s cannot be compiled' % path)
+
+    data, inputs = entry
+    return write_compiled(path, data, inputs)
+
+
+def _to_setup(path, dist, parser):
+    """
+    Does the actual work of `to_setup`; returns the setup() arguments, the
+    `SetupConfig` and the paths of the distutils config files the arguments
+    depend on (see `config_file_candidates`).
+    """
+
+    profiler = get_profiler()
+    with profiler.phase('parse'):
+        setup_config = SetupConfig.from_file(path, parser)
+    config = setup_config.config
+    package_dir = setup_config.package_dir
+    profiler.enable(has_get_option(config, 'global', 'profile'))
 
     # Add the source package directory to sys.path in case it contains
     # additional hooks, and to make sure it's on the path before any existing
     # installations of the package
     if package_dir:
-        package_dir = os.path.abspath(package_dir)
         sys.path.insert(0, package_dir)
 
+    if dist is None:
+        from setuptools.dist import Distribution
+        dist = Distribution()
+
     try:
-        if setup_hooks:
-            setup_hooks = split_multiline(setup_hooks)
-            for hook in setup_hooks:
-                hook_fn = resolve_name(hook)
-                try :
-                    hook_fn(config)
-                except SystemExit:
-                    log.error('setup hook %s terminated the installation')
-                except:
-                    e = sys.exc_info()[1]
-                    log.error('setup hook %s raised exception: %s\n' %
-                              (hook, e))
-                    log.error(traceback.format_exc())
-                    sys.exit(1)
-
-        kwargs = process_config(config)
-
-        register_custom_compilers(config)
-
-        ext_modules = get_extension_modules(config)
-        if ext_modules:
-            kwargs['ext_modules'] = ext_modules
-
-        entry_points = get_entry_points(config)
-        if entry_points:
-            kwargs['entry_points'] = entry_points
-
-        wrap_commands(kwargs)
-
-        # Handle the [files]/extra_files option
-        extra_files = has_get_option(config, 'files', 'extra_files')
-        if extra_files:
-            extra_files = split_multiline(extra_files)
-            # Let's do a sanity check
-            for filename in extra_files:
-                if not os.path.exists(filename):
-                    raise DistutilsFileError(
-                        '%s from the extra_files option in setup.cfg does not '
-                        'exist' % filename)
-
-            # Unfortunately the only really sensible way to do this is to
-            # monkey-patch the manifest_maker class
-            @monkeypatch_method(manifest_maker)
-            def add_defaults(self, extra_files=extra_files, log=log):
-                log.info('[setup.cfg] running patched manifest_maker command '
-                          'with extra_files support')
-                add_defaults._orig(self)
-                self.filelist.extend(extra_files)
+        with profiler.phase('setup_hooks'):
+            setup_config.run_setup_hooks()
+
+        with profiler.phase('process_config'):
+            kwargs = setup_config.to_dict()
+
+        with profiler.phase('cmdclass'):
+            add_default_commands(kwargs, config)
 
+        with profiler.phase('register_custom_compilers'):
+            register_custom_compilers(config)
+
+        with profiler.phase('wrap_commands'):
+            wrap_commands(kwargs, dist.find_config_files(), dist,
+                          {path: config})
+            config_files = config_file_candidates(dist)
+
+        with profiler.phase('extra_files'):
+            add_extra_files(config, kwargs)
     finally:
         # Perform cleanup if any paths were added to sys.path
         if package_dir:
             sys.path.pop(0)
 
+    return kwargs, setup_config, config_files
+
+
+def _import_test_workaround():
+    """
+    Imports multiprocessing and logging if a test command is going to be run.
+
+    These imports are not used, but are needed to get around an irritating
+    Python bug that can crop up when using ./setup.py test.
+    See: http://www.eby-sarna.com/pipermail/peak/2010-May/003355.html
+    """
+
+    if _TEST_COMMANDS.intersection(sys.argv[1:]):
+        import multiprocessing
+        import logging
+
+
+def _is_cacheable(config):
+    value = has_get_option(config, 'global', 'cache')
+    return not value or value.lower() not in ('false', 'f', '0', 'no', 'n')
+
+
+def config_file_candidates(dist):
+    """
+    Returns the paths of all the distutils config files that the given
+    `Distribution` reads if they exist, whether or not they do, so that
+    creating one of them later can be noticed.
+    """
+
+    gen_paths = getattr(dist, '_gen_paths', None)
+    if gen_paths is not None:
+        candidates = [str(path) for path in gen_paths()]
+    else:
+        # The files looked for by Distribution.find_config_files in older
+        # versions of distutils
+        distutils_dir = os.path.dirname(sys.modules['distutils'].__file__)
+        candidates = [os.path.join(distutils_dir, 'distutils.cfg')]
+        if getattr(dist, 'want_user_cfg', True):
+            user_filename = (os.name == 'posix' and '.pydistutils.cfg' or
+                             'pydistutils.cfg')
+            candidates.append(os.path.join(os.path.expanduser('~'),
+                                           user_filename))
+        candidates.append('setup.cfg')
+
+    for filename in dist.find_config_files():
+        if filename not in candidates:
+            candidates.append(filename)
+    return candidates
+
+
+def _cache_entry(path, config, kwargs, package_dir, hook_fns, config_files,
+                 scanned_dirs=()):
+    """Returns the data to cache for the results of `to_setup` (including the
+    subset of the config that is needed to re-apply its side-effects) and the
+    list of files that data depends on, or `None` if the results cannot be
+    cached.
+
+    *scanned_dirs* are the directories listed to expand glob patterns; adding
+    or removing files in them invalidates the cache entry.
+    """
+
+    # Paths are stored relative to the directory of setup.cfg, so that the
+    # compiled file stays valid when the directory is moved
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if package_dir:
+        package_dir = relative_path(package_dir, base_dir)
+
+    try:
+        data = {
+            'kwargs': dump_kwargs(kwargs, base_dir),
+            'package_dir': package_dir,
+            'config': {
+                'global': {
+                    'compilers': has_get_option(config, 'global',
+                                                'compilers') or '',
+                    'hook_time_budget': has_get_option(
+                        config, 'global', 'hook_time_budget') or '',
+                    'hook_times': has_get_option(config, 'global',
+                                                 'hook_times') or '',
+                    'profile': has_get_option(config, 'global',
+                                              'profile') or ''
+                },
+                'files': {
+                    'extra_files': has_get_option(config, 'files',
+                                                  'extra_files') or ''
+                }
+            }
+        }
+    except ValueError:
+        e = sys.exc_info()[1]
+        log.debug('[setup.cfg] not caching setup() arguments: %s' % e)
+        return None
+
+    inputs = set([os.path.abspath(path)])
+    long_description = kwargs.get('long_description')
+    if (long_description is not None and
+            not isinstance(long_description, LazyDescription)):
+        # The long_description was read from the description files by a
+        # setup hook; otherwise they are only read when needed
+        description_files = has_get_option(config, 'metadata',
+                                           'description_file')
+        if description_files:
+            inputs.update(split_multiline(description_files))
+
+    objs = list(hook_fns)
+    cmdclass = kwargs.get('cmdclass', {})
+    for cmd in cmdclass:
+        # Commands given by name are not tied to the contents of their modules
+        if not (isinstance(cmdclass, LazyCmdclass) and
+                cmdclass.get_reference(cmd)):
+            objs.append(cmdclass[cmd])
+    compilers = has_get_option(config, 'global', 'compilers')
+    if compilers:
+        objs.extend(resolve_name(c) for c in split_multiline(compilers))
+    inputs.update(module_file(getattr(obj, '_setup_cfg_wrapped', obj))
+                  for obj in objs)
+
+    # The pre/post hooks found by wrap_commands may come from any of the
+    # distutils config files, including those created later
+    inputs.update(config_files)
+    inputs.update(scanned_dirs)
+
+    return data, set(os.path.abspath(p) for p in inputs if p)
+
+
+def _load_cached(cached, path):
+    """Rebuilds the results of `to_setup` for the given setup.cfg file from
+    the cache, and re-applies its side-effects.
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    package_dir = cached['package_dir']
+    if package_dir:
+        package_dir = absolute_path(package_dir, base_dir)
+        sys.path.insert(0, package_dir)
+
+    try:
+        kwargs = load_kwargs(cached['kwargs'], base_dir)
+        get_profiler().enable(cached['config']['global'].get('profile'))
+        hook_times = get_hook_times()
+        hook_times.enable(cached['config']['global'].get('hook_times'))
+        hook_times.set_budget(
+            cached['config']['global'].get('hook_time_budget'))
+        register_custom_compilers(cached['config'])
+        add_extra_files(cached['config'], kwargs)
+    finally:
+        if package_dir:
+            sys.path.pop(0)
+
     return kwargs
 
 
+# Parsed config files, keyed on their absolute paths
+_parsed_configs = {}
+
+
+def read_config(path, parser=None):
+    """
+    Parses a config file into a mapping of each section to a mapping of its
+    options, which behave like dicts.
+
+    Each file is only parsed once per process, unless it changes, and kept as
+    a compact `setup.cfg.frozenconfig.FrozenConfig`; a new copy-on-write view
+    of it is returned each time, so it can be modified freely.
+
+    *parser* may be ``'scanner'`` to parse the file with the faster
+    `setup.cfg.scanner.scan_config` (falling back to `RawConfigParser` for
+    files it does not support), or ``'configparser'``; by default it is taken
+    from the ``SETUP_CFG_PARSER`` environment variable.
+    """
+
+    if parser is None:
+        parser = os.environ.get(PARSER_ENV) or 'configparser'
+    if parser not in ('configparser', 'scanner'):
+        raise DistutilsOptionError('unknown config parser: %r' % parser)
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (st.st_mtime, st.st_size)
+
+    cached = _parsed_configs.get(path)
+    if cached is None or cached[0] != key:
+        config = None
+        if parser == 'scanner':
+            from .scanner import scan_config, UnsupportedSyntax
+            try:
+                config = scan_config(path)
+            except UnsupportedSyntax:
+                e = sys.exc_info()[1]
+                log.debug('[setup.cfg] using RawConfigParser: %s' % e)
+        if config is None:
+            config_parser = RawConfigParser()
+            config_parser.read(path)
+            config = FrozenConfig.from_parser(config_parser)
+        cached = _parsed_configs[path] = (key, config)
+
+    return cached[1].view()
+
+
+class SetupConfig(object):
+    """
+    The arguments to setup() for a parsed setup.cfg file.
+
+    This works like a read-only mapping of setup() argument names to their
+    values, except that each value is only computed from the config the first
+    time it is read (and then remembered).  This way, reading a few arguments
+    (such as ``name`` and ``version``) does not pay for processing all the
+    others, like reading description files or resolving command classes.
+
+    In addition to the arguments in `SETUP_ARGS_TO_CFG`, ``ext_modules`` and
+    ``entry_points`` are provided.  Only arguments that are actually given by
+    the config are present.
+
+    Note that setup_hooks are not run unless `run_setup_hooks` is called.
+    """
+
+    # Extra setup() arguments that are computed from the config as a whole
+    _EXTRA_ARGS = {
+        'ext_modules': lambda config: get_extension_modules(config),
+        'entry_points': lambda config: get_entry_points(config)
+    }
+
+    def __init__(self, config):
+        self.config = config
+        self.setup_hooks = []
+        self._index = None
+        self._values = {}
+
+    @classmethod
+    def from_file(cls, path='setup.cfg', parser=None):
+        """Parses the given setup.cfg file (see `read_config`)."""
+
+        if not os.path.exists(path):
+            raise DistutilsFileError("file '%s' does not exist" %
+                                     os.path.abspath(path))
+
+        return cls(read_config(path, parser))
+
+    @property
+    def package_dir(self):
+        """The absolute path to the packages_root directory, if any."""
+
+        package_dir = has_get_option(self.config, 'files', 'packages_root')
+        if package_dir:
+            return os.path.abspath(package_dir)
+        return None
+
+    def run_setup_hooks(self):
+        """
+        Runs the setup_hooks from the ``[global]`` section, if any, which may
+        modify the config.  The resolved hook functions are stored in
+        `setup_hooks`.
+        """
+
+        hook_times = get_hook_times()
+        hook_times.enable(has_get_option(self.config, 'global', 'hook_times'))
+        hook_times.set_budget(has_get_option(self.config, 'global',
+                                             'hook_time_budget'))
+
+        setup_hooks = has_get_option(self.config, 'global', 'setup_hooks')
+        if not setup_hooks:
+            return
+
+        jobs = has_get_option(self.config, 'global', 'setup_hooks_jobs')
+        try:
+            jobs = int(jobs or 1)
+        except ValueError:
+            raise DistutilsOptionError(
+                'setup-hooks-jobs must be an integer, not %r' % jobs)
+
+        self.setup_hooks.extend(
+            run_setup_hooks(split_multiline(setup_hooks), self.config, jobs))
+
+        # The hooks may have changed anything
+        self._index = None
+        self._values.clear()
+
+    @property
+    def index(self):
+        """
+        The config with the options in each section keyed on their canonical
+        names (see `setup.cfg.util.fold_options`).  This is built once, the
+        first time it is needed.
+        """
+
+        if self._index is None:
+            if isinstance(self.config, ConfigView):
+                # Unless the config was modified, this is shared by all the
+                # reads of the same file
+                self._index = self.config.freeze().fold()
+            else:
+                self._index = index_options(self.config)
+        return self._index
+
+    def __getitem__(self, arg):
+        try:
+            value = self._values[arg]
+        except KeyError:
+            if arg in _ARG_SOURCES:
+                try:
+                    value = _convert_arg(self.index, arg)
+                except DistutilsOptionError:
+                    self._reraise_with_location(arg)
+            elif arg in self._EXTRA_ARGS:
+                value = self._EXTRA_ARGS[arg](self.config) or _MISSING
+            else:
+                raise KeyError(arg)
+            self._values[arg] = value
+
+        if value is _MISSING:
+            raise KeyError(arg)
+
+        return value
+
+    def _reraise_with_location(self, arg):
+        """Re-raises the current error in converting the given argument with
+        the location of its option, if it is known.
+        """
+
+        e = sys.exc_info()[1]
+        location = None
+        if isinstance(self.config, ConfigView):
+            for section, option, _ in _ARG_SOURCES[arg]:
+                if self.index.get(section, {}).get(option):
+                    location = self.config.location(section, option)
+                    break
+        if location is None:
+            raise
+        raise DistutilsOptionError('%s: %s' % (location, e))
+
+    def __contains__(self, arg):
+        try:
+            self[arg]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for arg in self._config_args():
+            yield arg
+
+        for arg in self._EXTRA_ARGS:
+            if arg in self:
+                yield arg
+
+    def _config_args(self):
+        """
+        Yields the `SETUP_ARGS_TO_CFG` arguments given by the config.  Only the
+        options actually present in the config are looked at.
+        """
+
+        seen = set()
+        for section, options in self.index.items():
+            for option in options:
+                arg = _OPTION_ARGS.get((section, option))
+                if arg is not None and arg not in seen:
+                    seen.add(arg)
+                    if arg in self:
+                        yield arg
+
+    def keys(self):
+        return list(self)
+
+    def get(self, arg, default=None):
+        try:
+            return self[arg]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Returns all the setup() arguments as a dict."""
+
+        return dict((arg, self[arg]) for arg in self)
+
+
 def process_config(config):
     """
     Processes the setup.cfg options and converts them to arguments accepted by
     setuptools' setup() function.
     """
 
-    kwargs = {}
+    setup_config = SetupConfig(config)
+    return dict((arg, setup_config[arg])
+                for arg in setup_config._config_args())
 
-    for arg in SETUP_ARGS_TO_CFG:
-        if len(SETUP_ARGS_TO_CFG[arg]) == 2:
-            # The distutils field name is different than distutils2's.
-            section, option = SETUP_ARGS_TO_CFG[arg]
 
-        elif len(SETUP_ARGS_TO_CFG[arg]) == 1:
-            # The distutils field name is the same thant distutils2's.
-            section, option = SETUP_ARGS_TO_CFG[arg][0], arg
-
-        in_cfg_value = has_get_option(config, section, option)
-        if not in_cfg_value:
-            # There is no such option in the setup.cfg
-            if arg == "long_description":
-                in_cfg_value = has_get_option(config, section,
-                                              "description_file")
-                if in_cfg_value:
-                    in_cfg_value = split_multiline(in_cfg_value)
-                    value = ''
-                    for filename in in_cfg_value:
-                        description_file = open(filename)
-                        try:
-                            value += description_file.read().strip() + '\n\n'
-                        finally:
-                            description_file.close()
-                    in_cfg_value = value
-            else:
-                continue
+# Marks setup() arguments that are not present in the config
+_MISSING = object()
 
-        if arg in CSV_FIELDS:
-            in_cfg_value = split_csv(in_cfg_value)
-        if arg in MULTI_FIELDS:
-            in_cfg_value = split_multiline(in_cfg_value)
-        elif arg in BOOL_FIELDS:
-            # Provide some flexibility here...
-            if in_cfg_value.lower() in ('true', 't', '1', 'yes', 'y'):
-                in_cfg_value = True
+
+def _convert_arg(index, arg):
+    """
+    Converts the setup.cfg option(s) for a single setup() argument, given the
+    config as indexed by `setup.cfg.util.index_options`; returns `_MISSING` if
+    the option is not present.
+    """
+
+    for section, option, converter in _ARG_SOURCES[arg]:
+        value = index.get(section, {}).get(option)
+        if value:
+            return converter(value)
+
+    return _MISSING
+
+
+def _convert_bool(value):
+    # Provide some flexibility here...
+    return value.lower() in ('true', 't', '1', 'yes', 'y')
+
+
+def _convert_requirements(value):
+    # Replaces PEP345-style version specs with the sort expected by setuptools
+    return [_VERSION_SPEC_RE.sub(r'\1\2', pred) for pred in value]
+
+
+def _convert_package_dir(value):
+    return {'': value}
+
+
+def _convert_package_data(value):
+    package_data = {}
+    firstline = True
+    prev = None
+    for line in value:
+        if '=' in line:
+            key, value = line.split('=', 1)
+            key, value = (key.strip(), value.strip())
+            if key in package_data:
+                # Multiple duplicates of the same package name; this is for
+                # backwards compatibility of the old format prior to d2to1
+                # 0.2.6.
+                prev = package_data[key]
+                prev.extend(value.split())
             else:
-                in_cfg_value = False
-
-        if in_cfg_value:
-            if arg in ('install_requires', 'tests_require'):
-                # Replaces PEP345-style version specs with the sort expected by
-                # setuptools
-                in_cfg_value = [_VERSION_SPEC_RE.sub(r'\1\2', pred)
-                                for pred in in_cfg_value]
-            elif arg == 'package_dir':
-                in_cfg_value = {'': in_cfg_value}
-            elif arg in ('package_data', 'data_files'):
-                data_files = {}
-                firstline = True
-                prev = None
-                for line in in_cfg_value:
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key, value = (key.strip(), value.strip())
-                        if key in data_files:
-                            # Multiple duplicates of the same package name;
-                            # this is for backwards compatibility of the old
-                            # format prior to d2to1 0.2.6.
-                            prev = data_files[key]
-                            prev.extend(value.split())
-                        else:
-                            prev = data_files[key.strip()] = value.split()
-                    elif firstline:
-                        raise DistutilsOptionError(
-                            'malformed package_data first line %r (misses '
-                            '"=")' % line)
-                    else:
-                        prev.extend(line.strip().split())
-                    firstline = False
-                if arg == 'data_files':
-                    # the data_files value is a pointlessly different structure
-                    # from the package_data value
-                    data_files = list(data_files.items())
-                in_cfg_value = data_files
-            elif arg == 'cmdclass':
-                cmdclass = {}
-                dist = Distribution()
-                for cls in in_cfg_value:
+                prev = package_data[key.strip()] = value.split()
+        elif firstline:
+            raise DistutilsOptionError(
+                'malformed package_data first line %r (misses "=")' % line)
+        else:
+            prev.extend(line.strip().split())
+        firstline = False
+
+    return package_data
+
+
+def _convert_data_files(value):
+    # the data_files value is a pointlessly different structure from the
+    # package_data value; unlike package_data, distutils does not support
+    # glob patterns in data_files, so they are expanded here
+    return [(dirname, expand_globs(files, required=True))
+            for dirname, files in _convert_package_data(value).items()]
+
+
+def _convert_cmdclass(value):
+    # Commands may be given either as "command_name = module.class", in which
+    # case the class is only imported when the command is used, or just as
+    # "module.class", in which case it has to be imported right away to find
+    # out its name
+    cmdclass = LazyCmdclass()
+    for line in value:
+        if '=' in line:
+            cmd, cls = [part.strip() for part in line.split('=', 1)]
+        else:
+            cls = resolve_name(line)
+            # This is what Command.get_command_name() returns
+            cmd = getattr(cls, 'command_name', cls.__name__)
+        cmdclass[cmd] = cls
+
+    return cmdclass
+
+
+class LazyCmdclass(dict):
+    """
+    A cmdclass dict in which the command classes can also be given as import
+    references (strings), which are only resolved when the command is looked
+    up.  This way a command's module (which may itself import heavy modules)
+    is only imported when the command is actually used.
+
+    Commands can also be wrapped with pre/post hooks (see `wrap_command`)
+    without resolving them first, using `wrap`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LazyCmdclass, self).__init__(*args, **kwargs)
+        # Hooks for commands that have not been resolved yet
+        self.hooks = {}
+
+    def __getitem__(self, cmd):
+        cls = super(LazyCmdclass, self).__getitem__(cmd)
+        if isinstance(cls, string_types):
+            try:
+                with profile_phase('cmdclass'):
                     cls = resolve_name(cls)
-                    cmd = cls(dist)
-                    cmdclass[cmd.get_command_name()] = cls
-                in_cfg_value = cmdclass
+            except ImportError:
+                e = sys.exc_info()[1]
+                raise DistutilsModuleError(
+                    'cannot find command class %s for command %s: %s' %
+                    (cls, cmd, e))
+            if cmd in self.hooks:
+                cls = wrap_command(cmd, cls, self.hooks.pop(cmd))
+            super(LazyCmdclass, self).__setitem__(cmd, cls)
+        return cls
+
+    def __setitem__(self, cmd, cls):
+        self.hooks.pop(cmd, None)
+        super(LazyCmdclass, self).__setitem__(cmd, cls)
+
+    def __delitem__(self, cmd):
+        self.hooks.pop(cmd, None)
+        super(LazyCmdclass, self).__delitem__(cmd)
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def get(self, cmd, default=None):
+        if cmd in self:
+            return self[cmd]
+        return default
+
+    def setdefault(self, cmd, default=None):
+        if cmd not in self:
+            self[cmd] = default
+        return self[cmd]
+
+    def pop(self, cmd, *args):
+        if cmd in self:
+            cls = self[cmd]
+            del self[cmd]
+            return cls
+        return super(LazyCmdclass, self).pop(cmd, *args)
+
+    def values(self):
+        return [self[cmd] for cmd in self]
+
+    def items(self):
+        return [(cmd, self[cmd]) for cmd in self]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def copy(self):
+        new = LazyCmdclass(super(LazyCmdclass, self).items())
+        new.hooks = dict(self.hooks)
+        return new
+
+    def get_reference(self, cmd):
+        """
+        Returns the import reference for the given command's class if it has
+        not been resolved yet, or `None` otherwise.
+        """
+
+        cls = super(LazyCmdclass, self).__getitem__(cmd)
+        if isinstance(cls, string_types):
+            return cls
+        return None
+
+    def wrap(self, cmd, hooks):
+        """Wraps the given command with the given pre/post hooks."""
+
+        if self.get_reference(cmd) is not None:
+            self.hooks[cmd] = hooks
+        else:
+            self[cmd] = wrap_command(cmd, self[cmd], hooks)
 
-        kwargs[arg] = in_cfg_value
 
-    return kwargs
+def _read_description_files(value):
+    return LazyDescription(split_multiline(value))
+
+
+class LazyDescription(object):
+    """
+    A long_description made from the contents of the description files.
+
+    The files are only read when the description is actually used (for
+    example when the package metadata is written), so commands like
+    ``./setup.py --version`` or ``build_ext`` never touch them.  Once read,
+    the description behaves like (and is compared equal to) the equivalent
+    string.  Use `iter_chunks` to stream the description without holding all
+    of it in memory at once.
+    """
+
+    # Size of the chunks read from the description files
+    chunk_size = 1 << 16
+
+    def __init__(self, filenames):
+        self.filenames = [os.path.abspath(filename) for filename in filenames]
+        self._value = None
+
+    def iter_chunks(self):
+        """
+        Yields the description in chunks, reading the files incrementally.
+
+        Each file's contents are stripped of leading and trailing whitespace,
+        and followed by a blank line.
+        """
+
+        for filename in self.filenames:
+            description_file = open(filename)
+            try:
+                for chunk in _iter_stripped(description_file,
+                                            self.chunk_size):
+                    yield chunk
+            finally:
+                description_file.close()
+            yield '\n\n'
+
+    @property
+    def value(self):
+        """The full description, read the first time it is needed."""
+
+        if self._value is None:
+            self._value = ''.join(self.iter_chunks())
+        return self._value
+
+    def __str__(self):
+        return self.value
+
+    def __unicode__(self):
+        return text_type(self.value)
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.filenames)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, LazyDescription):
+            other = other.value
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __add__(self, other):
+        return self.value + other
+
+    def __radd__(self, other):
+        return other + self.value
+
+    def __mod__(self, other):
+        return self.value % other
+
+    def __getattr__(self, attr):
+        # Everything else is delegated to the description string
+        if attr.startswith('__') or attr == '_value':
+            raise AttributeError(attr)
+        return getattr(self.value, attr)
+
+
+def _iter_stripped(f, size):
+    """
+    Yields the contents of a file in chunks of about the given size, with
+    leading and trailing whitespace stripped.
+    """
+
+    # Whitespace is held back until it's known not to be trailing
+    pending = ''
+    started = False
+    for chunk in iter(lambda: f.read(size), ''):
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        stripped = chunk.rstrip()
+        if stripped:
+            yield pending + stripped
+            pending = chunk[len(stripped):]
+        else:
+            pending += chunk
+
+
+def _convert_macros(value):
+    macros = []
+    for macro in value:
+        macro = macro.split('=', 1)
+        if len(macro) == 1:
+            macro = (macro[0].strip(), None)
+        else:
+            macro = (macro[0].strip(), macro[1].strip())
+        macros.append(macro)
+
+    return macros
+
+
+# Conversions specific to individual setup() arguments; these are applied
+# after multi-valued options are split, and only if the result is not empty
+_ARG_CONVERTERS = {
+    'install_requires': _convert_requirements,
+    'tests_require': _convert_requirements,
+    'package_dir': _convert_package_dir,
+    'package_data': _convert_package_data,
+    'data_files': _convert_data_files,
+    'cmdclass': _convert_cmdclass
+}
+
+
+def _make_converter(arg):
+    """Returns a function converting the setup.cfg value for a setup()
+    argument.
+    """
+
+    steps = []
+    if arg in CSV_FIELDS:
+        steps.append(split_csv)
+    if arg in MULTI_FIELDS:
+        steps.append(split_multiline)
+    elif arg in BOOL_FIELDS:
+        steps.append(_convert_bool)
+    special = _ARG_CONVERTERS.get(arg)
+
+    def converter(value):
+        for step in steps:
+            value = step(value)
+        if value and special is not None:
+            value = special(value)
+        return value
+
+    return converter
+
+
+def _build_option_tables():
+    """
+    Builds the tables used to map setup.cfg options to setup() arguments from
+    `SETUP_ARGS_TO_CFG`, using canonical option names.
+
+    Returns a dict mapping each setup() argument to the (section, option,
+    converter) tuples it can be read from, in order of precedence, and a dict
+    mapping each (section, option) pair to its setup() argument.
+    """
+
+    arg_sources = {}
+    option_args = {}
+    for arg, cfg in SETUP_ARGS_TO_CFG.items():
+        if len(cfg) == 2:
+            # The distutils field name is different than distutils2's.
+            section, option = cfg
+        else:
+            # The distutils field name is the same thant distutils2's.
+            section, option = cfg[0], arg
+        option = option.replace('-', '_')
+        arg_sources[arg] = [(section, option, _make_converter(arg))]
+        option_args[(section, option)] = arg
+
+    # If there is no description the long_description is read from the
+    # description files instead
+    arg_sources['long_description'].append(
+        ('metadata', 'description_file', _read_description_files))
+    option_args[('metadata', 'description_file')] = 'long_description'
+
+    return arg_sources, option_args
+
+
+_ARG_SOURCES, _OPTION_ARGS = _build_option_tables()
+
+# Conversions for the options of [extension:...] sections, other than simply
+# splitting their values (which is done for all of them)
+_EXTENSION_CONVERTERS = {
+    'define_macros': _convert_macros,
+    'sources': lambda value: expand_globs(value, required=True),
+    'depends': expand_globs,
+    'extra_objects': expand_globs
+}
 
 
 def register_custom_compilers(config):
@@ -304,6 +1076,8 @@ def register_custom_compilers(config):
 
     compilers = has_get_option(config, 'global', 'compilers')
     if compilers:
+        import distutils.ccompiler
+
         compilers = split_multiline(compilers)
         for compiler in compilers:
             compiler = resolve_name(compiler)
@@ -326,13 +1100,100 @@ def register_custom_compilers(config):
             cc[name] = (module_name, compiler.__name__, desc)
 
             # HACK!!!!  Distutils assumes all compiler modules are in the
-            # distutils package
+            # distutils package (so it also imports their parent packages from
+            # there)
+            parts = module_name.split('.')
+            for idx in range(1, len(parts)):
+                parent = '.'.join(parts[:idx])
+                sys.modules.setdefault('distutils.' + parent,
+                                       sys.modules[parent])
             sys.modules['distutils.' + module_name] = sys.modules[module_name]
 
 
+def add_default_commands(kwargs, config=None):
+    """Adds the commands in `DEFAULT_COMMANDS` to the cmdclass argument, as
+    needed.
+
+    The egg_info command is only added if the given *config* has the
+    ``[files] extra_files`` option, or the results are cached (see
+    `to_setup`); otherwise setuptools' own egg_info command is left alone.
+    """
+
+    for cmd, cls, arg in DEFAULT_COMMANDS:
+        if arg is not None and not kwargs.get(arg):
+            continue
+        if cmd == 'egg_info' and not _needs_egg_info(config or {}):
+            continue
+        cmdclass = kwargs.setdefault('cmdclass', LazyCmdclass())
+        if cmd in cmdclass:
+            continue
+        if not isinstance(cmdclass, LazyCmdclass):
+            cmdclass = kwargs['cmdclass'] = LazyCmdclass(cmdclass)
+        cmdclass[cmd] = cls
+
+
+def _needs_egg_info(config):
+    return bool(has_get_option(config, 'files', 'extra_files') or
+                (get_cache_dir() is not None and _is_cacheable(config)))
+
+
+def add_extra_files(config, kwargs):
+    """Handle the [files]/extra_files option.
+
+    The files are passed to setup.cfg's egg_info command (see `egg_info
+    <setup.cfg.command.egg_info.egg_info>`) as its ``extra_files`` option in
+    ``kwargs['options']``, so that they are only added to the manifest of
+    this distribution.  If the distribution has its own egg_info command,
+    the manifest_maker class is patched instead.
+    """
+
+    extra_files = has_get_option(config, 'files', 'extra_files')
+    if not extra_files:
+        return
+
+    file_index = get_file_index()
+    extra_files = expand_globs(split_multiline(extra_files), file_index,
+                               required=True)
+    # Let's do a sanity check
+    for filename in extra_files:
+        if not file_index.exists(filename):
+            raise DistutilsFileError(
+                '%s from the extra_files option in setup.cfg does not '
+                'exist' % filename)
+
+    cmdclass = kwargs.get('cmdclass')
+    egg_info_ref = [ref for cmd, ref, _ in DEFAULT_COMMANDS
+                    if cmd == 'egg_info'][0]
+    if (isinstance(cmdclass, LazyCmdclass) and 'egg_info' in cmdclass and
+            cmdclass.get_reference('egg_info') == egg_info_ref):
+        options = kwargs.setdefault('options', {})
+        options.setdefault('egg_info', {})['extra_files'] = extra_files
+        return
+
+    # Otherwise the only really sensible way to do this is to monkey-patch
+    # the manifest_maker class
+    from setuptools.command.egg_info import manifest_maker
+
+    @monkeypatch_method(manifest_maker)
+    def add_defaults(self, extra_files=extra_files, log=log):
+        log.info('[setup.cfg] running patched manifest_maker command '
+                  'with extra_files support')
+        # Look for the files matching the patterns in MANIFEST.in in the
+        # shared file index, rather than walking the whole tree again
+        if self.filelist.allfiles is None:
+            self.filelist.allfiles = file_index.findall()
+        add_defaults._orig(self)
+        self.filelist.extend(extra_files)
+
+
 def get_extension_modules(config):
     """Handle extension modules"""
 
+    with profile_phase('get_extension_modules'):
+        return _get_extension_modules(config)
+
+
+def _get_extension_modules(config):
     ext_modules = []
     for section in config:
         if ':' in section:
@@ -343,25 +1204,18 @@ def get_extension_modules(config):
         labels = [l.strip() for l in labels]
         if (len(labels) == 2) and (labels[0] == 'extension'):
             ext_args = {}
-            for field in EXTENSION_FIELDS:
-                value = has_get_option(config, section, field)
+            for field, value in fold_options(config[section]).items():
+                if field not in EXTENSION_FIELDS or not value:
+                    continue
                 # All extension module options besides name can have multiple
                 # values
-                if not value:
-                    continue
                 value = split_multiline(value)
-                if field == 'define_macros':
-                    macros = []
-                    for macro in value:
-                        macro = macro.split('=', 1)
-                        if len(macro) == 1:
-                            macro = (macro[0].strip(), None)
-                        else:
-                            macro = (macro[0].strip(), macro[1].strip())
-                        macros.append(macro)
-                    value = macros
+                if field in _EXTENSION_CONVERTERS:
+                    value = _EXTENSION_CONVERTERS[field](value)
                 ext_args[field] = value
             if ext_args:
+                from setuptools.extension import Extension
+
                 if 'name' not in ext_args:
                     ext_args['name'] = labels[1]
                 ext_modules.append(Extension(ext_args.pop('name'),
@@ -383,29 +1237,59 @@ def get_entry_points(config):
                 for option, value in config['entry_points'].items())
 
 
-def wrap_commands(kwargs):
-    dist = Distribution()
-
-    # This should suffice to get the same config values and command classes
-    # that the actual Distribution will see (not counting cmdclass, which is
-    # handled below)
-    dist.parse_config_files()
+def wrap_commands(kwargs, config_files=None, dist=None, configs=None):
+    """
+    Wraps the command classes of all commands that have pre/post hooks
+    configured in any of the distutils config files.
+
+    By default the same config files are used as for a new `Distribution`
+    (that is, the same ones the actual Distribution will see), and command
+    classes are looked up from a new `Distribution` as well, unless given in
+    ``kwargs['cmdclass']`` already.  *configs* may map the paths of any of
+    the config files to their already parsed (and possibly modified)
+    contents; other files are read with `read_config`.
+    """
 
-    for cmd, _ in dist.get_command_list():
-        hooks = {}
-        for opt, val in dist.get_option_dict(cmd).items():
-            val = val[1]
-            if opt.startswith('pre_hook.') or opt.startswith('post_hook.'):
-                hook_type, alias = opt.split('.', 1)
-                hook_dict = hooks.setdefault(hook_type, {})
-                hook_dict[alias] = val
-        if not hooks:
+    if dist is None:
+        from setuptools.dist import Distribution
+        dist = Distribution()
+
+    if config_files is None:
+        config_files = dist.find_config_files()
+
+    parsed = {}
+    for filename, config in (configs or {}).items():
+        parsed[os.path.abspath(filename)] = config
+
+    # Later config files override earlier ones, as in
+    # Distribution.parse_config_files
+    all_hooks = {}
+    for filename in config_files:
+        config = parsed.get(os.path.abspath(filename))
+        if config is None:
+            config = read_config(filename)
+        for cmd, options in config.items():
+            for opt, val in options.items():
+                opt = opt.replace('-', '_')
+                if opt.startswith('pre_hook.') or opt.startswith('post_hook.'):
+                    hook_type, alias = opt.split('.', 1)
+                    hooks = all_hooks.setdefault(cmd, {})
+                    hooks.setdefault(hook_type, {})[alias] = val
+
+    for cmd, hooks in all_hooks.items():
+        cmdclass = kwargs.get('cmdclass')
+        if isinstance(cmdclass, LazyCmdclass) and cmd in cmdclass:
+            # Don't import the command class before it's needed
+            cmdclass.wrap(cmd, hooks)
             continue
-
-        if 'cmdclass' in kwargs and cmd in kwargs['cmdclass']:
-            cmdclass = kwargs['cmdclass'][cmd]
+        elif cmdclass is not None and cmd in cmdclass:
+            cmdclass = cmdclass[cmd]
         else:
-            cmdclass = dist.get_command_class(cmd)
+            try:
+                cmdclass = dist.get_command_class(cmd)
+            except DistutilsModuleError:
+                # Not a command
+                continue
 
         new_cmdclass = wrap_command(cmd, cmdclass, hooks)
         kwargs.setdefault('cmdclass', {})[cmd] = new_cmdclass
@@ -419,6 +1303,7 @@ def wrap_command(cmd, cmdclass, hooks):
 
     return type(cmd, (cmdclass, object),
                 {'run': run, 'run_command_hooks': run_command_hooks,
+                 '_setup_cfg_wrapped': cmdclass, '_hook_chains': {},
                  'pre_hook': hooks.get('pre_hook'),
                  'post_hook': hooks.get('post_hook')})
 
@@ -438,8 +1323,25 @@ def run_command_hooks(cmd_obj, hook_kind):
     if hooks is None:
         return
 
+    # The resolved hooks are remembered by commands wrapped with wrap_command,
+    # so that they are only resolved once
+    chains = getattr(cmd_obj, '_hook_chains', None)
+    chain = chains is not None and chains.get(hook_kind)
+
+    resolved = run_hooks(chain or _resolve_hooks(hooks), cmd_obj, hook_kind,
+                         cmd_obj.get_command_name())
+
+    if chains is not None:
+        chains[hook_kind] = resolved
+
+
+def _resolve_hooks(hooks):
+    """Yields each hook in the given dict of hooks along with the object it
+    resolves to.
+    """
+
     for hook in hooks.values():
-        if isinstance(hook, str):
+        if isinstance(hook, string_types):
             try:
                 hook_obj = resolve_name(hook)
             except ImportError:
@@ -452,13 +1354,4 @@ def run_command_hooks(cmd_obj, hook_kind):
         if not hasattr(hook_obj, '__call__'):
             raise DistutilsOptionError('hook %r is not callable' % hook)
 
-        log.info('running %s %s for command %s',
-                 hook_kind, hook, cmd_obj.get_command_name())
-
-        try :
-            hook_obj(cmd_obj)
-        except:
-            e = sys.exc_info()[1]
-            log.error('hook %s raised exception: %s\n' % (hook, e))
-            log.error(traceback.format_exc())
-            sys.exit(1)
+        yield hook, hook_obj
@@ -1,23 +1,22 @@
+from __future__ import with_statement
+
 import os
 import sys
 import warnings
 
 from distutils import log
-from distutils.core import Distribution as _Distribution
 from distutils.errors import DistutilsFileError, DistutilsSetupError
-from setuptools.dist import _get_unpatched
 
 from .extern import six
 from .config import to_setup
+from .profiling import get_profiler, profile_phase
+from .timing import get_hook_times
 from .util import DefaultGetDict, IgnoreDict
 
 
 log.set_verbosity(log.INFO)
 
 
-_Distribution = _get_unpatched(_Distribution)
-
-
 
 def setup_cfg(dist, attr, value):
     """
@@ -50,7 +49,7 @@ def setup_cfg(dist, attr, value):
 
     # Converts the setup.cfg file to setup() arguments
     try:
-        attrs = to_setup(path)
+        attrs = to_setup(path, dist=dist)
     except:
         e = sys.exc_info()[1]
         raise DistutilsSetupError(
@@ -59,11 +58,16 @@ def setup_cfg(dist, attr, value):
 
     # Repeat some of the Distribution initialization code with the newly
     # provided attrs
+    options = {}
     if attrs:
-        # Skips 'options' and 'licence' support which are rarely used; may add
-        # back in later if demanded
+        # Skips 'licence' support which is rarely used; may add back in later
+        # if demanded
         for key, val in six.iteritems(attrs):
-            if hasattr(dist.metadata, 'set_' + key):
+            if key == 'options':
+                # Command options set by setup.cfg itself, such as the
+                # extra_files of the egg_info command
+                options = val
+            elif hasattr(dist.metadata, 'set_' + key):
                 getattr(dist.metadata, 'set_' + key)(val)
             elif hasattr(dist.metadata, key):
                 setattr(dist.metadata, key, val)
@@ -73,14 +77,35 @@ def setup_cfg(dist, attr, value):
                 msg = 'Unknown distribution option: %s' % repr(key)
                 warnings.warn(msg)
 
-    # Re-finalize the underlying Distribution
-    _Distribution.finalize_options(dist)
+    # Note: There is no need to re-finalize the underlying Distribution (we
+    # are being called from its finalize_options() in the first place); all
+    # distutils' finalize_options() does is split the keywords and platforms
+    # strings, which are already lists here
 
     # This bit comes out of distribute/setuptools
     if isinstance(dist.metadata.version, six.integer_types + (float,)):
         # Some people apparently take "version number" too literally :)
         dist.metadata.version = str(dist.metadata.version)
 
+    # Report the times taken by the setup hooks and command hooks, and the
+    # profile of the run if enabled, once the commands have run
+    run_commands = dist.run_commands
+    run_command = dist.run_command
+
+    def run_commands_and_report():
+        try:
+            run_commands()
+        finally:
+            get_hook_times().report()
+            get_profiler().report()
+
+    def run_command_profiled(command):
+        with profile_phase('command:%s' % command):
+            run_command(command)
+
+    dist.run_commands = run_commands_and_report
+    dist.run_command = run_command_profiled
+
     # This bit of hackery is necessary so that the Distribution will ignore
     # normally unsupport command options (namely pre-hooks and post-hooks).
     # dist.command_options is normally a dict mapping command names to dicts of
@@ -88,3 +113,6 @@ def setup_cfg(dist, attr, value):
     # the each command's options so we can pass through the unsupported options
     ignore = ['pre_hook.*', 'post_hook.*']
     dist.command_options = DefaultGetDict(lambda: IgnoreDict(ignore))
+    for command, opts in six.iteritems(options):
+        for opt, val in six.iteritems(opts):
+            dist.command_options[command][opt] = ('setup.cfg', val)
@@ -0,0 +1,219 @@
+"""Scanning of C/C++ sources for the headers they depend on.
+
+This is used by the `setup.cfg.command.build_ext.build_ext` command to find
+out which object files need to be recompiled, so that the headers an extension
+module depends on do not have to be listed by hand in its ``depends`` option.
+
+The ``#include`` directives of each file are cached on disk, so that only
+files that changed since the last build are scanned again.  Conditional
+compilation is not taken into account: every header a file includes is
+considered a dependency, which can only cause extra recompilation, never too
+little.  Included files that cannot be found (such as system headers) are
+ignored, and so are the headers in the include directories of the Python
+interpreter, which only change along with it.
+"""
+
+from __future__ import with_statement
+
+import json
+import os
+import re
+import sys
+import threading
+
+from distutils import log
+
+from .cache import atomic_write
+
+
+# Bump this whenever the structure of the cache file changes in an
+# incompatible way
+DEPENDS_FORMAT = 1
+
+DEPENDS_CACHE_FILE = 'setup-cfg-depends.json'
+
+_INCLUDE_RE = re.compile(br'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\r\n]+)[>"]',
+                         re.MULTILINE)
+
+
+def scan_includes(path):
+    """Returns the files included by the given source file, as a list of
+    ``(quoted, name)`` pairs where *quoted* is `True` for ``#include "name"``
+    and `False` for ``#include <name>``.
+    """
+
+    f = open(path, 'rb')
+    try:
+        contents = f.read()
+    finally:
+        f.close()
+
+    includes = []
+    for match in _INCLUDE_RE.finditer(contents):
+        quoted = match.group(1) == b'"'
+        name = match.group(2).strip().decode('utf-8', 'replace')
+        includes.append((quoted, name))
+
+    return includes
+
+
+_python_include_dirs = None
+
+
+def python_include_dirs():
+    """Returns the set of the include directories of the running Python
+    interpreter, normalized as absolute paths.
+    """
+
+    global _python_include_dirs
+
+    if _python_include_dirs is None:
+        from distutils import sysconfig
+
+        _python_include_dirs = set(
+            os.path.normcase(os.path.abspath(sysconfig.get_python_inc(plat)))
+            for plat in (False, True))
+    return _python_include_dirs
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+class IncludeGraph(object):
+    """The graph of ``#include`` directives between source files and headers.
+
+    If *cache_file* is given the directives found in each file are loaded
+    from it, and written back to it by `save`; a file is only scanned again
+    if its size or modification time changed.  The graph may be shared by
+    several threads.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self._files = {}
+        self._stats = {}
+        self._resolved = {}
+        self._changed = False
+        self._lock = threading.RLock()
+
+        if cache_file is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            f = open(self.cache_file)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return
+
+        if data.get('format') != DEPENDS_FORMAT:
+            return
+
+        for path, (stat_key, includes) in data['files'].items():
+            self._files[path] = (stat_key,
+                                 [(quoted, name) for quoted, name in includes])
+
+    def save(self):
+        """Writes the scanned ``#include`` directives to the cache file, if
+        any of them changed.
+        """
+
+        if self.cache_file is None or not self._changed:
+            return
+
+        with self._lock:
+            files = {}
+            for path, (stat_key, includes) in self._files.items():
+                files[path] = [stat_key, [list(inc) for inc in includes]]
+            data = json.dumps({'format': DEPENDS_FORMAT, 'files': files})
+            self._changed = False
+
+        try:
+            atomic_write(self.cache_file, data)
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not write %s: %s' %
+                     (self.cache_file, e))
+
+    def includes(self, path):
+        """Returns the ``#include`` directives in the given file (see
+        `scan_includes`), scanning it only if it changed.
+        """
+
+        path = os.path.abspath(path)
+        with self._lock:
+            stat_key = self._stats.get(path)
+            if stat_key is None:
+                stat_key = self._stats[path] = _stat_key(path)
+
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+
+            try:
+                includes = scan_includes(path)
+            except (IOError, OSError):
+                includes = []
+            self._files[path] = (stat_key, includes)
+            self._changed = True
+            return includes
+
+    def resolve(self, including_dir, quoted, name, include_dirs):
+        """Returns the path to the file included as *name* from a file in
+        *including_dir*, or `None` if it is not found in *include_dirs*.
+        """
+
+        if quoted:
+            search_dirs = (including_dir,) + tuple(include_dirs)
+        else:
+            search_dirs = tuple(include_dirs)
+
+        key = (search_dirs, name)
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+
+            found = None
+            for dirname in search_dirs:
+                path = os.path.abspath(os.path.join(dirname, name))
+                if os.path.isfile(path):
+                    found = path
+                    break
+            self._resolved[key] = found
+            return found
+
+    def dependencies(self, source, include_dirs=()):
+        """Returns the sorted list of all the headers the given source file
+        includes, directly or indirectly, searching for them in the directory
+        of the including file (for ``#include "..."``) and *include_dirs*.
+        The Python include directories (see `python_include_dirs`) are not
+        searched.
+        """
+
+        python_dirs = python_include_dirs()
+        include_dirs = tuple(os.path.abspath(d) for d in include_dirs
+                             if os.path.normcase(os.path.abspath(d))
+                             not in python_dirs)
+        source = os.path.abspath(source)
+        seen = set([source])
+        stack = [source]
+        while stack:
+            path = stack.pop()
+            dirname = os.path.dirname(path)
+            for quoted, name in self.includes(path):
+                header = self.resolve(dirname, quoted, name, include_dirs)
+                if header is not None and header not in seen:
+                    seen.add(header)
+                    stack.append(header)
+
+        seen.discard(source)
+        return sorted(seen)
+
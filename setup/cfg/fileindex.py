@@ -0,0 +1,363 @@
+"""An index of the files in a project, built from cached directory listings.
+
+A single `FileIndex` per project directory is shared (see `get_file_index`)
+by everything in setup.cfg that looks for files: the expansion of glob
+patterns in setup.cfg, the ``extra_files`` option, the manifest, and the
+build_py command's search for package data.  Setup hooks and command hooks
+can use it too, rather than walking the directory tree themselves.
+
+Patterns are matched like the patterns of the standard `glob` module (names
+beginning with a dot are only matched by patterns that begin with a dot as
+well), and may also contain a ``**`` path component, which matches any number
+of directories (including none), as in ``src/**/*.c``.
+
+Each directory is only listed once for as long as its modification time
+stays the same; the listings can also be saved to a file, so that they are
+reused by later runs.
+"""
+
+from __future__ import with_statement
+
+import fnmatch
+import json
+import os
+import re
+import sys
+import threading
+
+from distutils import log
+from distutils.errors import DistutilsFileError
+
+from .cache import atomic_write
+
+
+# Bump this whenever the structure of the cache file changes in an
+# incompatible way
+FILE_INDEX_FORMAT = 1
+
+_MAGIC_RE = re.compile(r'[*?[]')
+
+# Shared FileIndex instances, by absolute root directory
+_file_indexes = {}
+
+
+def has_magic(pattern):
+    """Returns `True` if the given string is a glob pattern rather than a
+    plain filename.
+    """
+
+    return _MAGIC_RE.search(pattern) is not None
+
+
+def get_file_index(root='.'):
+    """Returns the `FileIndex` shared by everything that looks for files under
+    the given directory in this process.
+    """
+
+    root = os.path.abspath(root)
+    try:
+        return _file_indexes[root]
+    except KeyError:
+        return _file_indexes.setdefault(root, FileIndex(root))
+
+
+def _stat_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+if hasattr(os, 'scandir'):
+    def _scan_dir(path):
+        dirs = []
+        files = []
+        for entry in os.scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+        return dirs, files
+else:
+    def _scan_dir(path):
+        dirs = []
+        files = []
+        for name in os.listdir(path):
+            if os.path.isdir(os.path.join(path, name)):
+                dirs.append(name)
+            else:
+                files.append(name)
+        return dirs, files
+
+
+class FileIndex(object):
+    """Answers glob queries for the files under a root directory (relative
+    patterns are relative to it) from cached directory listings.
+
+    If *cache_file* is given the listings are loaded from it, and written
+    back to it by `save`.  The directories listed since the index was created
+    are recorded in `scanned_dirs`.
+    """
+
+    def __init__(self, root='.', cache_file=None):
+        self.root = os.path.abspath(root)
+        self.cache_file = None
+        self.scanned_dirs = set()
+        self._listings = {}
+        self._names = {}
+        self._changed = False
+        self._lock = threading.RLock()
+
+        if cache_file is not None:
+            self.load(cache_file)
+
+    def load(self, cache_file):
+        """Loads the directory listings saved in the given file, and saves
+        them there from now on.
+        """
+
+        self.cache_file = cache_file
+        try:
+            f = open(cache_file)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return
+
+        if data.get('format') != FILE_INDEX_FORMAT:
+            return
+
+        with self._lock:
+            for path, (mtime, dirs, files) in data['dirs'].items():
+                self._listings.setdefault(path, (mtime, dirs, files))
+
+    def save(self):
+        """Writes the directory listings to the cache file, if any of them
+        changed.
+        """
+
+        if self.cache_file is None or not self._changed:
+            return
+
+        with self._lock:
+            dirs = {}
+            for path, listing in self._listings.items():
+                dirs[path] = list(listing)
+            data = json.dumps({'format': FILE_INDEX_FORMAT, 'dirs': dirs})
+            self._changed = False
+
+        try:
+            atomic_write(self.cache_file, data)
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not write %s: %s' %
+                     (self.cache_file, e))
+
+    def listdir(self, path):
+        """Returns the names of the subdirectories and of the other files in
+        the given directory, as two sorted lists (both empty if it is not a
+        directory).
+        """
+
+        path = os.path.normpath(os.path.join(self.root, path))
+        mtime = _stat_mtime(path)
+        with self._lock:
+            self.scanned_dirs.add(path)
+            listing = self._listings.get(path)
+            if listing is not None and listing[0] == mtime:
+                return listing[1], listing[2]
+
+            try:
+                dirs, files = _scan_dir(path)
+            except OSError:
+                dirs, files = [], []
+            dirs.sort()
+            files.sort()
+            self._listings[path] = (mtime, dirs, files)
+            self._names.pop(path, None)
+            self._changed = True
+            return dirs, files
+
+    def exists(self, path):
+        """Returns `True` if the given file or directory exists."""
+
+        dirs, files = self._lookup(path)
+        return dirs or files
+
+    def isfile(self, path):
+        """Returns `True` if the given path exists and is not a directory."""
+
+        return self._lookup(path)[1]
+
+    def _lookup(self, path):
+        path = os.path.normpath(os.path.join(self.root, path))
+        dirname, name = os.path.split(path)
+        if not name:
+            return os.path.isdir(path), False
+
+        dirs, files = self.listdir(dirname)
+        with self._lock:
+            names = self._names.get(dirname)
+            if names is None:
+                names = self._names[dirname] = (frozenset(dirs),
+                                                frozenset(files))
+        return name in names[0], name in names[1]
+
+    def walk(self, top=os.curdir):
+        """Yields a ``(dirpath, dirnames, filenames)`` tuple for each directory
+        under *top*, like `os.walk`.
+
+        Symbolic links to directories are followed, but each directory is only
+        visited once.  The *dirnames* lists may be modified to skip
+        directories, as with `os.walk`.
+        """
+
+        seen = set()
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            realpath = os.path.realpath(os.path.join(self.root, dirpath))
+            if realpath in seen:
+                continue
+            seen.add(realpath)
+
+            dirs, files = self.listdir(dirpath)
+            dirs = list(dirs)
+            yield dirpath, dirs, list(files)
+            for dirname in reversed(dirs):
+                stack.append(os.path.join(dirpath, dirname))
+
+    def findall(self, top=os.curdir, exclude=()):
+        """Returns the paths of all the files under *top*, like
+        `distutils.filelist.findall`, skipping the directories in *exclude*.
+        """
+
+        prefix = os.curdir + os.sep
+        exclude = set(os.path.normpath(os.path.join(self.root, path))
+                      for path in exclude)
+        files = []
+        for dirpath, dirnames, filenames in self.walk(top):
+            if exclude:
+                dirnames[:] = [
+                    dirname for dirname in dirnames
+                    if os.path.normpath(os.path.join(self.root, dirpath,
+                                                     dirname))
+                    not in exclude]
+            if top == os.curdir:
+                if dirpath == os.curdir:
+                    dirpath = ''
+                elif dirpath.startswith(prefix):
+                    dirpath = dirpath[len(prefix):]
+            for filename in filenames:
+                files.append(os.path.join(dirpath, filename))
+
+        return files
+
+    def glob(self, pattern):
+        """Returns the sorted paths matching the given glob pattern.
+
+        The paths start with the part of the pattern before its first
+        wildcard, so relative patterns give relative paths.
+        """
+
+        parts = pattern.replace(os.sep, '/').split('/')
+
+        # The literal leading directories are not matched against anything
+        prefix = []
+        while len(parts) > 1 and not has_magic(parts[0]) and parts[0] != '**':
+            prefix.append(parts.pop(0))
+        base = os.path.normpath('/'.join(prefix) or '/') if prefix else ''
+
+        results = set()
+        self._glob(base, parts, results)
+        return sorted(results)
+
+    def _glob(self, base, parts, results):
+        part = parts[0]
+        rest = parts[1:]
+
+        if part == '**':
+            if rest:
+                self._glob(base, rest, results)
+            for dirname in self._match(base, '*', dirs=True):
+                self._glob(os.path.join(base, dirname), parts, results)
+            if not rest:
+                for filename in self._match(base, '*', dirs=False):
+                    results.add(os.path.join(base, filename))
+            return
+
+        if not rest:
+            if not has_magic(part):
+                path = os.path.join(base, part)
+                if os.path.exists(os.path.join(self.root, path)):
+                    results.add(path)
+                return
+            for name in self._match(base, part, dirs=None):
+                results.add(os.path.join(base, name))
+            return
+
+        if has_magic(part):
+            dirnames = self._match(base, part, dirs=True)
+        else:
+            dirnames = [part]
+        for dirname in dirnames:
+            self._glob(os.path.join(base, dirname), rest, results)
+
+    def _match(self, base, pattern, dirs=None):
+        """Returns the names in directory *base* matching *pattern*; only
+        those of subdirectories if *dirs* is `True`, only those of other
+        files if it is `False`, and both if it is `None`.
+        """
+
+        subdirs, files = self.listdir(base or os.curdir)
+        if dirs is None:
+            names = subdirs + files
+        elif dirs:
+            names = subdirs
+        else:
+            names = files
+
+        if not pattern.startswith('.'):
+            names = [name for name in names if not name.startswith('.')]
+
+        return fnmatch.filter(names, pattern)
+
+
+def expand_globs(patterns, index=None, required=False):
+    """Replaces the glob patterns in the given list of filenames by the paths
+    they match (see `FileIndex.glob`); plain filenames are kept as they are.
+
+    A pattern that matches nothing is kept as it is if it is the name of an
+    existing file (such as ``data[1].txt``); otherwise a warning is given,
+    or `DistutilsFileError` raised if *required*.
+    """
+
+    if index is None:
+        index = get_file_index()
+
+    expanded = []
+    seen = set()
+    for pattern in patterns:
+        if not has_magic(pattern):
+            matches = [pattern]
+        else:
+            matches = index.glob(pattern)
+            if not matches and index.exists(pattern):
+                matches = [pattern]
+            elif not matches:
+                msg = 'no files match the pattern %r' % pattern
+                if required:
+                    raise DistutilsFileError(msg)
+                log.warn('[setup.cfg] %s' % msg)
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                expanded.append(path)
+
+    return expanded
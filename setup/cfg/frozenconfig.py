@@ -0,0 +1,352 @@
+"""Compact, read-only storage for parsed config files.
+
+Parsed configs are kept by `setup.cfg.config.read_config` for the whole
+process, which adds up when many configs (or configs with thousands of
+options) are processed at once.  A `FrozenConfig` stores them compactly:
+
+* section and option names are interned;
+* sections with the same options, in the same order (such as the
+  ``[extension:...]`` sections of a config), share a single table mapping
+  each option to the index of its value, and only keep a tuple of values;
+* equal values, such as the classifiers of related distributions, are stored
+  only once.
+
+Code that may modify a config, such as setup hooks, is given a `ConfigView`,
+which behaves like a dict of dicts, and only copies a section the first time
+it is modified.
+"""
+
+import sys
+
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
+
+from .util import fold_options
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern
+
+
+# Tables mapping option names to the index of their values, shared by all the
+# sections with the same options in the same order
+_key_tables = {}
+
+# Values shared by all configs; this is emptied once it gets this large, so
+# that a long running process does not keep every value it has seen
+_shared_values = {}
+_MAX_SHARED_VALUES = 100000
+
+
+def _intern_name(name):
+    if type(name) is str:
+        return _intern(name)
+    return name
+
+
+def _share(value):
+    try:
+        return _shared_values.setdefault(value, value)
+    except TypeError:
+        # Hook-provided values may be unhashable
+        return value
+
+
+class FrozenSection(Mapping):
+    """The options of a config section, as a read-only mapping."""
+
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, options=()):
+        if hasattr(options, 'items'):
+            options = options.items()
+
+        keys = []
+        values = []
+        for key, value in options:
+            keys.append(_intern_name(key))
+            values.append(_share(value))
+
+        keys = tuple(keys)
+        table = _key_tables.get(keys)
+        if table is None:
+            table = _key_tables.setdefault(
+                keys, dict((key, idx) for idx, key in enumerate(keys)))
+
+        if len(_shared_values) > _MAX_SHARED_VALUES:
+            _shared_values.clear()
+
+        self._keys = table
+        self._values = tuple(values)
+
+    def __getitem__(self, key):
+        return self._values[self._keys[key]]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def get(self, key, default=None):
+        idx = self._keys.get(key)
+        if idx is None:
+            return default
+        return self._values[idx]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+
+class FrozenConfig(Mapping):
+    """A read-only mapping of section names to `FrozenSection` objects.
+
+    *filename* and *locations* (a dict mapping ``(section, option)`` pairs to
+    line numbers) may be given to report where options were read from.
+    """
+
+    __slots__ = ('_sections', '_folded', 'filename', '_locations')
+
+    def __init__(self, sections=(), filename=None, locations=None):
+        if hasattr(sections, 'items'):
+            sections = sections.items()
+
+        self._sections = {}
+        for name, options in sections:
+            if not isinstance(options, FrozenSection):
+                options = FrozenSection(options)
+            self._sections[_intern_name(name)] = options
+        self._folded = None
+        self.filename = filename
+        self._locations = locations
+
+    @classmethod
+    def from_parser(cls, parser):
+        """Returns the sections of the given `RawConfigParser`."""
+
+        return cls((section, parser.items(section))
+                   for section in parser.sections())
+
+    def __getitem__(self, name):
+        return self._sections[name]
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+    def fold(self):
+        """Returns the config with the options keyed on their canonical names
+        (see `setup.cfg.util.index_options`); this is only computed once.
+        """
+
+        if self._folded is None:
+            self._folded = FrozenConfig(
+                ((name, fold_options(options))
+                 for name, options in self._sections.items()),
+                self.filename, self._locations)
+        return self._folded
+
+    def location(self, section, option):
+        """Returns where the given option was read from, as
+        ``filename:line``, or `None` if that is not known.
+        """
+
+        if not self._locations:
+            return None
+        lineno = self._locations.get((section, option))
+        if lineno is None:
+            # Also find options given by their canonical names
+            for (sect, opt), lineno in self._locations.items():
+                if (sect == section and
+                        opt.replace('-', '_') == option.replace('-', '_')):
+                    break
+            else:
+                return None
+        return '%s:%d' % (self.filename, lineno)
+
+    def view(self):
+        """Returns a new modifiable view of the config."""
+
+        return ConfigView(self)
+
+
+class SectionView(MutableMapping):
+    """A modifiable view of a `FrozenSection`; the options are copied the
+    first time they are modified.
+    """
+
+    __slots__ = ('_base', '_options')
+
+    def __init__(self, base=None):
+        self._base = base
+        self._options = None
+
+    @property
+    def modified(self):
+        return self._options is not None
+
+    def _current(self):
+        if self._options is not None:
+            return self._options
+        if self._base is None:
+            return {}
+        return self._base
+
+    def _own(self):
+        if self._options is None:
+            self._options = dict(self._current().items())
+        return self._options
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __contains__(self, key):
+        return key in self._current()
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def __iter__(self):
+        return iter(self._current())
+
+    def __len__(self):
+        return len(self._current())
+
+    def __setitem__(self, key, value):
+        self._own()[key] = value
+
+    def __delitem__(self, key):
+        del self._own()[key]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def freeze(self):
+        """Returns the current options as a `FrozenSection`."""
+
+        if self._options is None and self._base is not None:
+            return self._base
+        return FrozenSection(self._current())
+
+
+class ConfigView(MutableMapping):
+    """A modifiable view of a `FrozenConfig`, which behaves like a dict
+    mapping section names to dicts of options.  Sections are only copied the
+    first time they are modified; the frozen config is never changed.
+    """
+
+    __slots__ = ('_base', '_views', '_removed')
+
+    def __init__(self, base):
+        self._base = base
+        # Section name -> SectionView, for the sections accessed or added
+        self._views = {}
+        # Names of the sections of the base config that were deleted
+        self._removed = set()
+
+    def __getitem__(self, name):
+        view = self._views.get(name)
+        if view is None:
+            if name in self._removed or name not in self._base:
+                raise KeyError(name)
+            view = self._views[name] = SectionView(self._base[name])
+        return view
+
+    def __contains__(self, name):
+        return (name in self._views or
+                (name in self._base and name not in self._removed))
+
+    def __iter__(self):
+        for name in self._base:
+            if name not in self._removed:
+                yield name
+        for name in self._views:
+            if name not in self._base or name in self._removed:
+                yield name
+
+    def __len__(self):
+        count = len(self._base) - len(self._removed)
+        for name in self._views:
+            if name not in self._base or name in self._removed:
+                count += 1
+        return count
+
+    def __setitem__(self, name, options):
+        view = self._views[name] = SectionView()
+        # Keep the dict itself, as a dict of dicts would, so that changes
+        # made to it afterwards are kept as well
+        if not isinstance(options, dict):
+            options = dict(options)
+        view._options = options
+
+    def setdefault(self, name, options=None):
+        # Return the view rather than *options*, so that changes made to the
+        # result are kept
+        if name not in self:
+            self[name] = options or {}
+        return self[name]
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._views.pop(name, None)
+        if name in self._base:
+            self._removed.add(name)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    @property
+    def modified(self):
+        """Whether the config differs from the frozen config it views."""
+
+        if self._removed:
+            return True
+        for name, view in self._views.items():
+            if view.modified or name not in self._base:
+                return True
+        return False
+
+    def location(self, section, option):
+        """See `FrozenConfig.location`."""
+
+        return self._base.location(section, option)
+
+    def freeze(self):
+        """Returns the current contents of the config as a `FrozenConfig`;
+        this is the frozen config itself unless the config was modified.
+        """
+
+        if not self.modified:
+            return self._base
+
+        sections = []
+        for name in self:
+            view = self._views.get(name)
+            if view is None:
+                sections.append((name, self._base[name]))
+            else:
+                sections.append((name, view.freeze()))
+        return FrozenConfig(sections, self._base.filename,
+                            self._base._locations)
+
+    def copy(self):
+        """Returns a new view with the same contents, which can be modified
+        independently.
+        """
+
+        return ConfigView(self.freeze())
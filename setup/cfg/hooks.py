@@ -0,0 +1,376 @@
+"""Running the setup hooks from the ``[global] setup_hooks`` option.
+
+By default the setup hooks run one after another, in the order they are
+listed.  A hook can declare with the `setup_hook` decorator that it is safe
+to run concurrently with other hooks, and which other hooks it requires to
+have run first::
+
+    from setup.cfg.hooks import setup_hook
+
+    @setup_hook(parallel=True,
+                requires=['my_package.hooks.generate_version_file'])
+    def run_code_generators(config):
+        ...
+
+If the ``setup-hooks-jobs`` option in the ``[global]`` section of setup.cfg
+is greater than 1, consecutive parallel-safe hooks then run concurrently in a
+pool of that many threads, except that each hook waits for the hooks it
+requires, and never runs ahead of a hook listed before it.  Each of them is
+given its own copy of the config, and the changes they make to it are merged
+back in the order the hooks are listed, so the result does not depend on
+which hook finishes first; if two hooks set the same option to different
+values, the one listed last wins.  Hooks that are
+not declared parallel-safe still run on their own, after all the hooks
+listed before them and before all those listed after them.
+
+A hook may only require hooks listed before it in ``setup_hooks``, so that
+the requirements also hold when the hooks run one after another.
+
+Setup hooks as well as pre/post command hooks may also be coroutine
+functions (``async def``).  Consecutive coroutine hooks of the same phase
+(the setup hooks, or the pre or post hooks of a command) are awaited
+concurrently in a single event loop, unless one of them requires another;
+the hooks run before them have finished, and those listed after them only
+start once they have all finished.  Errors in coroutine hooks are handled
+the same way as in other hooks.
+"""
+
+from __future__ import with_statement
+
+import functools
+import inspect
+import sys
+import traceback
+
+from distutils import log
+from distutils.errors import DistutilsOptionError
+
+from .frozenconfig import ConfigView
+from .timing import get_hook_times, timer
+from .util import resolve_name
+
+
+def setup_hook(parallel=False, requires=()):
+    """Decorator declaring whether a setup hook is safe to run concurrently
+    with other hooks, and the names of the hooks it requires (as given in
+    ``setup_hooks``, or as the full ``module.function`` name of the hook).
+    """
+
+    def decorator(hook_fn):
+        hook_fn.setup_hook_parallel = parallel
+        hook_fn.setup_hook_requires = list(requires)
+        return hook_fn
+
+    return decorator
+
+
+def is_async_hook(hook_fn):
+    """Returns `True` if the given hook is a coroutine function."""
+
+    iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+    return iscoroutinefunction is not None and iscoroutinefunction(hook_fn)
+
+
+def _hook_names(hook, hook_fn):
+    names = set([hook, hook.replace(':', '.')])
+    module = getattr(hook_fn, '__module__', None)
+    name = getattr(hook_fn, '__name__', None)
+    if module and name:
+        names.add('%s.%s' % (module, name))
+    return names
+
+
+def plan_hooks(hooks):
+    """Groups the given ``(name, function)`` pairs of setup hooks into
+    batches that can run concurrently, and returns the list of batches in
+    the order they have to run.
+
+    A hook is never put in an earlier batch than the hooks listed before
+    it, so that merging the batches one after another still applies the
+    changes of the hooks in the order they are listed.
+
+    Raises `DistutilsOptionError` if a hook requires a hook that is not
+    listed before it.
+    """
+
+    batches = []
+    # The names of the hooks seen so far, mapped to their index
+    seen = {}
+    # The batch each hook in the current run of parallel-safe hooks is in,
+    # by index; and the earliest batch the next hook may be put in
+    levels = {}
+    last = 0
+
+    for idx, (hook, hook_fn) in enumerate(hooks):
+        deps = []
+        for req in getattr(hook_fn, 'setup_hook_requires', ()):
+            if req not in seen:
+                raise DistutilsOptionError(
+                    'setup hook %s requires %s, which is not listed before '
+                    'it in setup_hooks' % (hook, req))
+            deps.append(seen[req])
+
+        if (not getattr(hook_fn, 'setup_hook_parallel', False) or
+                is_async_hook(hook_fn)):
+            # Coroutine hooks run in the event loop rather than in a thread
+            batches.append([(hook, hook_fn)])
+            levels = {}
+            last = len(batches)
+        else:
+            level = max([levels[dep] + 1 for dep in deps if dep in levels] +
+                        [last])
+            levels[idx] = last = level
+            if level == len(batches):
+                batches.append([])
+            batches[level].append((hook, hook_fn))
+
+        for name in _hook_names(hook, hook_fn):
+            seen.setdefault(name, idx)
+
+    return batches
+
+
+def run_setup_hooks(hooks, config, jobs=1):
+    """Runs the setup hooks with the given names on the given config, and
+    returns the hook functions.
+
+    With more than one job the hooks declared parallel-safe run concurrently
+    as far as possible, in up to *jobs* threads (see `plan_hooks`);
+    otherwise each hook is only resolved once the hooks before it have run.
+    """
+
+    if jobs <= 1:
+        resolved = run_hooks(((hook, resolve_name(hook)) for hook in hooks),
+                             config)
+        return [hook_fn for _, hook_fn in resolved]
+
+    hook_fns = [resolve_name(hook) for hook in hooks]
+    batches = plan_hooks(list(zip(hooks, hook_fns)))
+    size = max(len(batch) for batch in batches)
+    pool = None
+    if size > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, size))
+
+    try:
+        # Consecutive hooks that run on their own are run together by
+        # run_hooks, so that coroutine hooks among them are still awaited
+        # concurrently
+        single = []
+        for batch in batches:
+            if len(batch) == 1:
+                single.extend(batch)
+                continue
+            run_hooks(single, config)
+            single = []
+            _run_batch(pool, batch, config)
+        run_hooks(single, config)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return hook_fns
+
+
+def run_hooks(hooks, arg, kind='setup_hook', command=None):
+    """Calls the given ``(name, function)`` pairs of hooks with *arg* one
+    after another, except that consecutive coroutine hooks are awaited
+    concurrently, and returns the list of pairs.
+
+    *kind* is the kind of the hooks (``setup_hook``, ``pre_hook`` or
+    ``post_hook``), and *command* the name of the command they run for, if
+    any.  *hooks* may be any iterable; each hook is only taken from it once
+    the hooks before it have run (or, for coroutine hooks, been started).
+    """
+
+    resolved = []
+    group = []
+    for hook, hook_fn in hooks:
+        resolved.append((hook, hook_fn))
+        if is_async_hook(hook_fn):
+            if group and _requires_any(hook, hook_fn, group):
+                _run_async_hooks(group, arg, kind, command)
+                group = []
+            group.append((hook, hook_fn))
+            continue
+
+        if group:
+            _run_async_hooks(group, arg, kind, command)
+            group = []
+        _run_hook(hook, hook_fn, arg, kind, command)
+
+    if group:
+        _run_async_hooks(group, arg, kind, command)
+
+    return resolved
+
+
+def _requires_any(hook, hook_fn, hooks):
+    requires = set(getattr(hook_fn, 'setup_hook_requires', ()))
+    for other, other_fn in hooks:
+        if requires.intersection(_hook_names(other, other_fn)):
+            return True
+    return False
+
+
+def _log_running(hook, kind, command):
+    if command is not None:
+        log.info('running %s %s for command %s', kind, hook, command)
+
+
+def _handle_error(hook, kind, error):
+    """Logs the given ``(exception, formatted traceback)`` raised by a hook,
+    and exits unless a setup hook called `sys.exit`.
+    """
+
+    e, tb = error
+    if kind == 'setup_hook':
+        if isinstance(e, SystemExit):
+            log.error('setup hook %s terminated the installation' % hook)
+            return
+        log.error('setup hook %s raised exception: %s\n' % (hook, e))
+    else:
+        log.error('hook %s raised exception: %s\n' % (hook, e))
+    log.error(tb)
+    sys.exit(1)
+
+
+def _run_hook(hook, hook_fn, arg, kind='setup_hook', command=None):
+    _log_running(hook, kind, command)
+    with get_hook_times().timed(kind, hook, command):
+        try :
+            hook_fn(arg)
+        except:
+            _handle_error(hook, kind,
+                          (sys.exc_info()[1], traceback.format_exc()))
+
+
+def _run_async_hooks(hooks, arg, kind='setup_hook', command=None):
+    """Awaits the coroutines of the given hooks concurrently in a new event
+    loop, and then handles their errors and records their times in the order
+    the hooks are listed.
+    """
+
+    # Only imported when there are coroutine hooks, since it is slow to
+    # import
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    errors = [None] * len(hooks)
+    ends = [None] * len(hooks)
+
+    def hook_done(idx, task):
+        ends[idx] = timer()
+
+    try:
+        start = timer()
+        tasks = []
+        for idx, (hook, hook_fn) in enumerate(hooks):
+            _log_running(hook, kind, command)
+            try:
+                task = loop.create_task(hook_fn(arg))
+            except:
+                errors[idx] = (sys.exc_info()[1], traceback.format_exc())
+                ends[idx] = timer()
+                continue
+            task.add_done_callback(functools.partial(hook_done, idx))
+            tasks.append((idx, task))
+
+        if tasks:
+            gathered = asyncio.gather(*[task for _, task in tasks],
+                                      return_exceptions=True)
+            while not gathered.done():
+                try:
+                    loop.run_until_complete(gathered)
+                except SystemExit:
+                    # Raised out of the event loop by the task that called
+                    # sys.exit(); let the others finish
+                    pass
+
+            for (idx, _), result in zip(tasks, gathered.result()):
+                if isinstance(result, BaseException):
+                    tb = ''.join(traceback.format_exception(
+                        type(result), result, result.__traceback__))
+                    errors[idx] = (result, tb)
+    finally:
+        loop.close()
+
+    hook_times = get_hook_times()
+    for idx, (hook, _) in enumerate(hooks):
+        if errors[idx] is not None:
+            _handle_error(hook, kind, errors[idx])
+        hook_times.record(kind, hook, command, ends[idx] - start)
+
+
+def _run_batch(pool, batch, config):
+    def call_hook(hook_and_fn):
+        hook, hook_fn = hook_and_fn
+        hook_config = _copy_config(config)
+        error = None
+        start = timer()
+        try:
+            hook_fn(hook_config)
+        except:
+            error = (sys.exc_info()[1], traceback.format_exc())
+        return hook_config, timer() - start, error
+
+    base = _copy_config(config)
+    results = pool.map(call_hook, batch)
+
+    hook_times = get_hook_times()
+    changed_by = {}
+    for (hook, _), (hook_config, duration, error) in zip(batch, results):
+        if error is not None:
+            _handle_error(hook, 'setup_hook', error)
+        _merge_config(config, base, hook_config, hook, changed_by)
+        hook_times.record('setup_hook', hook, None, duration)
+
+
+def _copy_config(config):
+    if isinstance(config, ConfigView):
+        # Only the sections that get modified are copied
+        return config.copy()
+    return dict((section, dict(options))
+                for section, options in config.items())
+
+
+def _merge_config(config, base, hook_config, hook, changed_by):
+    """Applies the changes the given hook made to its copy of the *base*
+    config to the shared config.
+
+    *changed_by* maps each option already changed by another hook in the
+    same batch to that hook and the new value, to warn about conflicts.
+    """
+
+    changes = []
+    for section, options in hook_config.items():
+        orig = base.get(section, {})
+        for option, value in options.items():
+            if orig.get(option) != value:
+                changes.append((section, option, value))
+        for option in orig:
+            if option not in options:
+                changes.append((section, option, None))
+    deleted_sections = [section for section in base
+                        if section not in hook_config]
+    for section in deleted_sections:
+        for option in base[section]:
+            changes.append((section, option, None))
+
+    for section, option, value in changes:
+        key = (section, option)
+        if key in changed_by and changed_by[key][1] != value:
+            log.warn('[setup.cfg] setup hooks %s and %s both changed the '
+                     '%s option in [%s]; using the value from %s' %
+                     (changed_by[key][0], hook, option, section, hook))
+        changed_by[key] = (hook, value)
+
+        if value is not None:
+            config.setdefault(section, {})[option] = value
+        elif section in config:
+            config[section].pop(option, None)
+
+    for section in deleted_sections:
+        if section in config and not config[section]:
+            del config[section]
@@ -0,0 +1,324 @@
+"""Writing the core metadata of a distribution directly from setup.cfg.
+
+Tools such as pip only need the metadata of a distribution (its name,
+version, requirements, ...) to resolve dependencies, but getting it the
+normal way means running ``./setup.py egg_info``, and with it all of the
+setuptools command machinery.  The functions here write the ``METADATA`` (or
+``PKG-INFO``) and ``entry_points.txt`` files straight from the setup()
+arguments computed by `setup.cfg.config.SetupConfig`, without importing
+setuptools at all.
+
+That is only possible when the metadata comes from setup.cfg alone: if the
+config has setup hooks, or the commands that write the metadata are replaced
+by its ``commands`` option or have pre/post hooks (in setup.cfg or in any of
+the other distutils config files), those may change anything, so
+`write_dist_info` and `write_pkg_info` run the normal ``dist_info`` or
+``egg_info`` command instead.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import subprocess
+import sys
+
+from distutils import log
+from distutils.errors import DistutilsExecError
+
+from .config import SetupConfig, config_file_candidates, read_config
+from .fileindex import get_file_index
+from .util import has_get_option, resolve_name, split_multiline
+
+try:
+    from packaging.version import Version, InvalidVersion
+except ImportError:
+    Version = None
+
+
+METADATA_VERSION = '2.1'
+
+# The core metadata fields written for each setup() argument, in the order
+# they are written; the arguments with multiple values get a field for each
+METADATA_FIELDS = [
+    ('name', 'Name'),
+    ('version', 'Version'),
+    ('description', 'Summary'),
+    ('url', 'Home-page'),
+    ('download-url', 'Download-URL'),
+    ('author', 'Author'),
+    ('author_email', 'Author-email'),
+    ('maintainer', 'Maintainer'),
+    ('maintainer_email', 'Maintainer-email'),
+    ('license', 'License'),
+    ('keywords', 'Keywords'),
+    ('platforms', 'Platform'),
+    ('classifiers', 'Classifier'),
+    ('install_requires', 'Requires-Dist'),
+    ('provides', 'Provides-Dist'),
+    ('obsoletes', 'Obsoletes-Dist')
+]
+
+# Files added as License-File fields, as by default in setuptools
+LICENSE_FILES = ['LICEN[CS]E*', 'COPYING*', 'NOTICE*', 'AUTHORS*']
+
+# Commands whose pre/post hooks may change the metadata
+_METADATA_COMMANDS = ('egg_info', 'dist_info')
+
+
+def can_write_directly(config, config_files=(), base_dir=None):
+    """Returns `True` if the metadata of the given parsed setup.cfg can be
+    written directly; that is, unless it has setup hooks, or the commands
+    that write the metadata are replaced by its ``commands`` option or have
+    hooks in it or in any of the other distutils *config_files*.
+
+    The command classes given in the ``commands`` option without a command
+    name are imported from *base_dir* (the directory of setup.cfg; by
+    default the current directory) to find out their names.
+    """
+
+    if has_get_option(config, 'global', 'setup_hooks'):
+        return False
+
+    for cmd in _command_names(config, base_dir):
+        if cmd is None or cmd in _METADATA_COMMANDS:
+            return False
+
+    for cfg in [config] + [read_config(f) for f in config_files]:
+        for cmd in _METADATA_COMMANDS:
+            for option in cfg.get(cmd, {}):
+                option = option.replace('-', '_')
+                if (option.startswith('pre_hook.') or
+                        option.startswith('post_hook.')):
+                    return False
+
+    return True
+
+
+def _command_names(config, base_dir=None):
+    """Returns the names of the commands in the ``commands`` option of the
+    given config, with `None` for those whose class cannot be imported.
+    """
+
+    commands = has_get_option(config, 'global', 'commands')
+    if not commands:
+        return []
+
+    # As in setup.cfg.config._convert_cmdclass
+    names = []
+    sys.path.insert(0, os.path.abspath(base_dir or os.curdir))
+    try:
+        for line in split_multiline(commands):
+            if '=' in line:
+                names.append(line.split('=', 1)[0].strip())
+                continue
+            try:
+                cls = resolve_name(line)
+            except ImportError:
+                names.append(None)
+            else:
+                names.append(getattr(cls, 'command_name', cls.__name__))
+    finally:
+        sys.path.pop(0)
+    return names
+
+
+def _other_config_files(path):
+    """Returns the existing distutils config files other than the given
+    setup.cfg file, as read when running its ``setup.py``.
+    """
+
+    from distutils.dist import Distribution
+
+    path = os.path.abspath(path)
+    # The local setup.cfg is the one next to setup.py, that is *path*
+    return [filename for filename in config_file_candidates(Distribution())
+            if filename != 'setup.cfg' and os.path.isfile(filename) and
+            os.path.abspath(filename) != path]
+
+
+def _can_write_directly(setup_config, path):
+    return can_write_directly(setup_config.config, _other_config_files(path),
+                              os.path.dirname(os.path.abspath(path)))
+
+
+def safe_name(name):
+    """Returns the name as written by setuptools in the metadata."""
+
+    return re.sub(r'[^A-Za-z0-9.]+', '-', name)
+
+
+def safe_version(version):
+    """Returns the version as written by setuptools in the metadata:
+    normalized if the ``packaging`` library is available.
+    """
+
+    if Version is not None:
+        try:
+            return str(Version(version))
+        except InvalidVersion:
+            pass
+    return re.sub(r'[^A-Za-z0-9.]+', '-', version.replace(' ', '.'))
+
+
+def _filename_component(value):
+    return value.replace('-', '_')
+
+
+def _escape(value):
+    # Continuation lines of multi-line header values are indented
+    return '\n        '.join(value.strip().splitlines())
+
+
+def iter_metadata(setup_config, path='setup.cfg'):
+    """Yields the lines of the core metadata for the given `SetupConfig`,
+    read from the given setup.cfg file, followed by the long description (if
+    any) in chunks.
+    """
+
+    yield 'Metadata-Version: %s\n' % METADATA_VERSION
+
+    for arg, field in METADATA_FIELDS:
+        value = setup_config.get(arg)
+        if not value:
+            continue
+        if arg == 'name':
+            value = safe_name(value)
+        elif arg == 'version':
+            value = safe_version(value)
+        elif arg == 'keywords':
+            value = ','.join(value)
+        if isinstance(value, list):
+            for item in value:
+                yield '%s: %s\n' % (field, _escape(item))
+        else:
+            yield '%s: %s\n' % (field, _escape(value))
+
+    file_index = get_file_index(os.path.dirname(os.path.abspath(path)))
+    license_files = set()
+    for pattern in LICENSE_FILES:
+        license_files.update(path for path in file_index.glob(pattern)
+                             if file_index.isfile(path))
+    for path in sorted(license_files):
+        yield 'License-File: %s\n' % path
+
+    description = setup_config.get('long_description')
+    if description is not None:
+        yield '\n'
+        if hasattr(description, 'iter_chunks'):
+            for chunk in description.iter_chunks():
+                yield chunk
+        else:
+            yield description
+
+
+def write_metadata_file(setup_config, filename, path='setup.cfg'):
+    """Writes the core metadata for the given `SetupConfig`, read from the
+    given setup.cfg file, to a ``METADATA`` or ``PKG-INFO`` file.
+    """
+
+    with open(filename, 'w') as f:
+        for chunk in iter_metadata(setup_config, path):
+            f.write(chunk)
+
+
+def write_entry_points(setup_config, filename):
+    """Writes the entry points of the given `SetupConfig` to an
+    ``entry_points.txt`` file, if it has any.
+    """
+
+    entry_points = setup_config.get('entry_points')
+    if not entry_points:
+        return
+
+    with open(filename, 'w') as f:
+        for group in sorted(entry_points):
+            f.write('[%s]\n' % group)
+            for line in entry_points[group]:
+                if '=' in line:
+                    name, value = line.split('=', 1)
+                    line = '%s = %s' % (name.strip(), value.strip())
+                f.write(line + '\n')
+            f.write('\n')
+
+
+def write_dist_info(metadata_directory, path='setup.cfg', setup_config=None):
+    """Writes a ``.dist-info`` directory with the metadata of the
+    distribution configured by the given setup.cfg file to
+    *metadata_directory*, and returns its name.
+
+    The metadata is written directly when possible (see
+    `can_write_directly`), or else by the setuptools ``dist_info`` command.
+    *setup_config* may be given to reuse a `SetupConfig` already read from
+    the file.
+    """
+
+    if setup_config is None:
+        setup_config = SetupConfig.from_file(path)
+    if not _can_write_directly(setup_config, path):
+        log.info('[setup.cfg] %s has hooks or commands that may change the '
+                 'metadata; running dist_info' % path)
+        return _run_setup_py(path, 'dist_info', metadata_directory,
+                             '.dist-info')
+
+    dist_info = '%s-%s.dist-info' % (
+        _filename_component(safe_name(setup_config['name'])),
+        _filename_component(safe_version(setup_config['version'])))
+    dist_info_dir = os.path.join(metadata_directory, dist_info)
+    if not os.path.isdir(dist_info_dir):
+        os.makedirs(dist_info_dir)
+
+    write_metadata_file(setup_config,
+                        os.path.join(dist_info_dir, 'METADATA'), path)
+    write_entry_points(setup_config,
+                       os.path.join(dist_info_dir, 'entry_points.txt'))
+    return dist_info
+
+
+def write_pkg_info(directory, path='setup.cfg'):
+    """Writes a ``PKG-INFO`` file with the metadata of the distribution
+    configured by the given setup.cfg file to *directory*, and returns its
+    path.
+
+    The metadata is written directly when possible (see
+    `can_write_directly`), or else by the setuptools ``egg_info`` command.
+    """
+
+    setup_config = SetupConfig.from_file(path)
+    if not _can_write_directly(setup_config, path):
+        log.info('[setup.cfg] %s has hooks or commands that may change the '
+                 'metadata; running egg_info' % path)
+        egg_info = _run_setup_py(path, 'egg_info', directory, '.egg-info')
+        return os.path.join(directory, egg_info, 'PKG-INFO')
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filename = os.path.join(directory, 'PKG-INFO')
+    write_metadata_file(setup_config, filename, path)
+    return filename
+
+
+def _run_setup_py(path, command, output_dir, suffix):
+    """Runs the given metadata command of the ``setup.py`` next to the given
+    setup.cfg file, and returns the name of the directory it created in
+    *output_dir*.
+    """
+
+    package_dir = os.path.dirname(os.path.abspath(path))
+    output_dir = os.path.abspath(output_dir)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    before = set(os.listdir(output_dir))
+
+    option = command == 'egg_info' and '--egg-base' or '--output-dir'
+    args = [sys.executable, 'setup.py', '-q', command, option, output_dir]
+    if subprocess.call(args, cwd=package_dir) != 0:
+        raise DistutilsExecError('%s failed for %s' % (command, path))
+
+    created = [name for name in os.listdir(output_dir)
+               if name.endswith(suffix) and name not in before]
+    if not created:
+        # Already existed
+        created = [name for name in os.listdir(output_dir)
+                   if name.endswith(suffix)]
+    return created[0]
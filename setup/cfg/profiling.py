@@ -0,0 +1,227 @@
+"""Profiling of the phases of a setup.py run.
+
+When profiling is enabled, setup.cfg reports how long each phase of the run
+took: parsing setup.cfg, running the setup hooks, converting the config to
+setup() arguments (``process_config``, which includes
+``get_extension_modules``), adding and resolving the command classes
+(``cmdclass``), ``register_custom_compilers``, ``wrap_commands``, adding the
+``extra_files``, using the cache, and each command that runs (as
+``command:<name>``).
+
+Profiling is enabled with the ``SETUP_CFG_PROFILE`` environment variable, or
+the ``profile`` option in the ``[global]`` section of setup.cfg.  With a
+value of ``cprofile`` each phase is also run under `cProfile`; any other true
+value (such as ``1``) only times the phases.
+
+At the end of the run the phases, ranked by the time spent in each of them
+(excluding the time spent in the phases nested in them, such as commands run
+by other commands), are printed to stderr and written to ``report.txt`` in
+``build/setup.cfg/profile`` (or in the directory named by the
+``SETUP_CFG_PROFILE_DIR`` environment variable), along with a `pstats` file
+for each phase when cProfile is used.
+"""
+
+from __future__ import with_statement
+
+import atexit
+import os
+import re
+import sys
+import threading
+
+from contextlib import contextmanager
+
+from distutils import log
+
+from .timing import timer
+
+
+PROFILE_ENV = 'SETUP_CFG_PROFILE'
+PROFILE_DIR_ENV = 'SETUP_CFG_PROFILE_DIR'
+DEFAULT_PROFILE_DIR = os.path.join('build', 'setup.cfg', 'profile')
+
+_FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def parse_profile_mode(value):
+    """Returns the profiling mode for the given value of the
+    ``SETUP_CFG_PROFILE`` variable or ``profile`` option: `None`, ``'time'``
+    or ``'cprofile'``.
+    """
+
+    value = (value or '').strip().lower()
+    if value in _FALSE_VALUES:
+        return None
+    if value == 'cprofile':
+        return 'cprofile'
+    return 'time'
+
+
+def get_profiler():
+    """Returns the `PhaseProfiler` shared by everything in this process,
+    enabled according to the ``SETUP_CFG_PROFILE`` environment variable.
+
+    Its report is written when the process exits, unless it was written
+    earlier.
+    """
+
+    global _profiler
+
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = PhaseProfiler(
+                parse_profile_mode(os.environ.get(PROFILE_ENV)))
+            atexit.register(_profiler.report)
+        return _profiler
+
+
+def profile_phase(name):
+    """Shortcut for ``get_profiler().phase(name)``."""
+
+    return get_profiler().phase(name)
+
+
+class PhaseProfiler(object):
+    """Times the phases of a run, and profiles them with cProfile if the mode
+    is ``'cprofile'``.
+
+    The phases are always timed, so that the phases that ran before profiling
+    was enabled by setup.cfg itself are reported as well; only phases of the
+    main thread are recorded.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode
+        # Phase name -> [number of runs, total time, time excluding nested
+        # phases]
+        self.stats = {}
+        # Phase name -> cProfile.Profile
+        self.profiles = {}
+        self._stack = []
+        self._main_thread = threading.current_thread()
+
+    def enable(self, mode):
+        """Enables profiling in the given mode (see `parse_profile_mode`),
+        unless it is already enabled; the environment variable takes
+        precedence over setup.cfg.
+        """
+
+        if self.mode is None:
+            self.mode = parse_profile_mode(mode)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager that records the time spent in the given
+        phase.
+        """
+
+        if threading.current_thread() is not self._main_thread:
+            yield
+            return
+
+        if self._stack:
+            # The profile of the enclosing phase is paused, since cProfile
+            # does not support more than one active profiler
+            self._stop_profile(self._stack[-1][0])
+
+        frame = [name, 0.0]
+        self._stack.append(frame)
+        self._start_profile(name)
+        start = timer()
+        try:
+            yield
+        finally:
+            duration = timer() - start
+            self._stop_profile(name)
+            self._stack.pop()
+
+            stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            if not [f for f in self._stack if f[0] == name]:
+                # Do not count recursive phases twice
+                stats[1] += duration
+            stats[2] += duration - frame[1]
+
+            if self._stack:
+                self._stack[-1][1] += duration
+                self._start_profile(self._stack[-1][0])
+
+    def _start_profile(self, name):
+        if self.mode != 'cprofile':
+            return
+
+        profile = self.profiles.get(name)
+        if profile is None:
+            import cProfile
+            profile = self.profiles[name] = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active
+            pass
+
+    def _stop_profile(self, name):
+        profile = self.profiles.get(name)
+        if profile is not None:
+            profile.disable()
+
+    def summary(self):
+        """Returns a table of the phases, ranked by the time spent in each
+        of them excluding their nested phases.
+        """
+
+        rows = [('phase', 'runs', 'self', 'total')]
+        ranked = sorted(self.stats.items(), key=lambda item: -item[1][2])
+        for name, (count, total, own) in ranked:
+            rows.append((name, str(count), '%.3fs' % own, '%.3fs' % total))
+
+        width = max(len(row[0]) for row in rows)
+        lines = []
+        for row in rows:
+            lines.append('%s  %4s  %9s  %9s' % ((row[0].ljust(width),) +
+                                                row[1:]))
+        return '\n'.join(lines)
+
+    def report(self, directory=None):
+        """Prints the summary and writes it and the pstats files to the
+        profile directory, then forgets the recorded phases.  Only the
+        latter is done unless profiling is enabled.
+        """
+
+        if self._stack:
+            # Still running
+            return
+
+        if self.mode is None or not self.stats:
+            self.stats = {}
+            return
+
+        if directory is None:
+            directory = (os.environ.get(PROFILE_DIR_ENV) or
+                         DEFAULT_PROFILE_DIR)
+        directory = os.path.abspath(directory)
+
+        summary = self.summary()
+        sys.stderr.write('[setup.cfg] profile:\n%s\n' % summary)
+
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            f = open(os.path.join(directory, 'report.txt'), 'w')
+            try:
+                f.write(summary + '\n')
+            finally:
+                f.close()
+            for name, profile in self.profiles.items():
+                filename = re.sub(r'[^\w.-]', '-', name) + '.pstats'
+                profile.dump_stats(os.path.join(directory, filename))
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not write the profile to %s: %s' %
+                     (directory, e))
+
+        self.stats = {}
+        self.profiles = {}
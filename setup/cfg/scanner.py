@@ -0,0 +1,130 @@
+"""A fast single-pass scanner for setup.cfg files.
+
+setup.cfg files only use a small part of the syntax supported by
+`RawConfigParser`: ``[section]`` headers, ``key = value`` lines, values
+continued on indented lines, and comment lines.  `scan_config` parses just
+that, in a single pass over the lines of the file, and records the line
+number of each option, for error messages.
+
+Anything else (including syntax that `RawConfigParser` handles differently
+between Python versions, such as blank or comment lines in the middle of a
+value) makes it raise `UnsupportedSyntax`, in which case the file should be
+parsed with `RawConfigParser` instead; `setup.cfg.config.read_config` does
+that automatically.
+"""
+
+from __future__ import with_statement
+
+from .frozenconfig import FrozenConfig
+
+
+class UnsupportedSyntax(Exception):
+    """Raised for files that the scanner cannot parse exactly like
+    `RawConfigParser`.
+    """
+
+    def __init__(self, path, lineno, reason):
+        Exception.__init__(self, '%s:%d: %s' % (path, lineno, reason))
+
+
+def scan_config(path):
+    """Parses the given config file into a `FrozenConfig`, which also knows
+    the line number of each option (see `FrozenConfig.location`).
+
+    Raises `UnsupportedSyntax` if the file uses syntax the scanner does not
+    support.
+    """
+
+    # Read the file the same way as RawConfigParser.read
+    with open(path) as f:
+        lines = f.read().split('\n')
+
+    sections = []
+    seen_sections = set()
+    locations = {}
+
+    options = None
+    option = None
+    # The lines of the current value, if it may still be continued
+    value = None
+    # Set by blank and comment lines, after which the current value may no
+    # longer be continued
+    interrupted = False
+
+    def finish_value():
+        options.append((option, '\n'.join(value)))
+
+    for lineno, line in enumerate(lines):
+        lineno += 1
+        stripped = line.strip()
+
+        if not stripped:
+            interrupted = True
+            continue
+
+        if line[0] in ' \t':
+            if value is None:
+                raise UnsupportedSyntax(path, lineno, 'unexpected indented '
+                                        'line')
+            if interrupted or stripped[0] in '#;':
+                raise UnsupportedSyntax(path, lineno, 'blank or comment '
+                                        'line within a value')
+            value.append(stripped)
+            continue
+
+        if stripped[0] in '#;':
+            interrupted = True
+            continue
+
+        if (stripped[:3].lower() == 'rem' and
+                (len(stripped) == 3 or stripped[3].isspace())):
+            # A comment in the Python 2 parser only
+            raise UnsupportedSyntax(path, lineno, 'REM line')
+
+        if value is not None:
+            finish_value()
+            value = None
+        interrupted = False
+
+        if stripped[0] == '[':
+            name = stripped[1:-1]
+            if (stripped[-1] != ']' or not name or '[' in name or
+                    ']' in name):
+                raise UnsupportedSyntax(path, lineno, 'unusual section '
+                                        'header')
+            if name == 'DEFAULT' or name in seen_sections:
+                raise UnsupportedSyntax(path, lineno, 'DEFAULT or duplicate '
+                                        'section')
+            seen_sections.add(name)
+            options = []
+            option_names = set()
+            sections.append((name, options))
+            continue
+
+        if options is None:
+            raise UnsupportedSyntax(path, lineno, 'option outside of a '
+                                    'section')
+
+        idx = [i for i in (stripped.find('='), stripped.find(':'))
+               if i >= 0]
+        if not idx:
+            raise UnsupportedSyntax(path, lineno, 'line without a value')
+        idx = min(idx)
+
+        option = stripped[:idx].rstrip().lower()
+        first = stripped[idx + 1:].lstrip()
+        if not option or option in option_names:
+            raise UnsupportedSyntax(path, lineno, 'empty or duplicate '
+                                    'option')
+        if ';' in first or first == '""':
+            # Handled differently by the Python 2 parser
+            raise UnsupportedSyntax(path, lineno, 'inline comment or empty '
+                                    'quotes')
+        option_names.add(option)
+        locations[(name, option)] = lineno
+        value = [first]
+
+    if value is not None:
+        finish_value()
+
+    return FrozenConfig(sections, filename=path, locations=locations)
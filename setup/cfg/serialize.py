@@ -0,0 +1,166 @@
+"""Conversion of setup() keyword arguments to and from JSON-compatible data.
+
+Most of the arguments produced by `setup.cfg.config.to_setup` are already
+plain strings, lists and dicts.  The exceptions are command classes, which
+are stored as import references (along with their pre/post hooks if they were
+wrapped by `setup.cfg.config.wrap_command`) and loaded lazily, `Extension`
+objects, which are stored as the arguments used to create them, and a
+long_description that has not been read from its description files yet, which
+is stored as the names of those files.
+
+If a base directory is given, the paths to the description files inside it
+are stored relative to it (see `setup.cfg.util.relative_path`), so that the
+data remains valid when the directory is moved.
+"""
+
+from .util import absolute_path, relative_path, resolve_name
+
+
+def import_reference(obj):
+    """Returns a dotted name that `resolve_name` resolves to the given object.
+
+    Raises `ValueError` if there is no such name.
+    """
+
+    name = '%s.%s' % (obj.__module__,
+                      getattr(obj, '__qualname__', obj.__name__))
+    try:
+        resolved = resolve_name(name)
+    except ImportError:
+        resolved = None
+
+    if resolved is not obj:
+        raise ValueError('%r cannot be referred to by its import name' % obj)
+
+    return name
+
+
+def dump_kwargs(kwargs, base_dir=None):
+    """Returns a JSON-compatible representation of the given setup() keyword
+    arguments, with paths relative to *base_dir* if given.
+
+    Raises `ValueError` if any of the arguments cannot be represented.
+    """
+
+    data = {}
+    for key, value in kwargs.items():
+        if key == 'cmdclass':
+            value = _dump_cmdclass(value)
+        elif key == 'ext_modules':
+            value = [_dump_extension(ext) for ext in value]
+        elif key == 'data_files':
+            value = [[dirname, list(files)] for dirname, files in value]
+        elif key == 'long_description':
+            value = _dump_description(value, base_dir)
+        data[key] = value
+
+    return data
+
+
+def load_kwargs(data, base_dir=None):
+    """Rebuilds the setup() keyword arguments from the output of
+    `dump_kwargs`, with relative paths resolved against *base_dir* if given.
+    """
+
+    kwargs = {}
+    for key, value in data.items():
+        if key == 'cmdclass':
+            value = _load_cmdclass(value)
+        elif key == 'ext_modules':
+            value = [_load_extension(ext) for ext in value]
+        elif key == 'data_files':
+            value = [(dirname, files) for dirname, files in value]
+        elif key == 'long_description':
+            value = _load_description(value, base_dir)
+        kwargs[key] = value
+
+    return kwargs
+
+
+def _dump_cmdclass(cmdclass):
+    from .config import LazyCmdclass
+
+    data = {}
+    for cmd in cmdclass:
+        if isinstance(cmdclass, LazyCmdclass):
+            ref = cmdclass.get_reference(cmd)
+            if ref is not None:
+                # Not resolved yet, so don't
+                data[cmd] = {'class': ref}
+                data[cmd].update(cmdclass.hooks.get(cmd, {}))
+                continue
+
+        cls = cmdclass[cmd]
+        base = getattr(cls, '_setup_cfg_wrapped', None)
+        if base is None:
+            data[cmd] = {'class': import_reference(cls)}
+        else:
+            data[cmd] = {'class': import_reference(base),
+                         'pre_hook': cls.pre_hook,
+                         'post_hook': cls.post_hook}
+
+    return data
+
+
+def _load_cmdclass(data):
+    from .config import LazyCmdclass
+
+    # The command classes are only imported when they are used
+    cmdclass = LazyCmdclass()
+    for cmd, cls_data in data.items():
+        cmdclass[cmd] = cls_data['class']
+        hooks = {}
+        for hook_kind in ('pre_hook', 'post_hook'):
+            if cls_data.get(hook_kind):
+                hooks[hook_kind] = cls_data[hook_kind]
+        if hooks:
+            cmdclass.wrap(cmd, hooks)
+
+    return cmdclass
+
+
+def _dump_description(description, base_dir=None):
+    from .config import LazyDescription
+
+    if isinstance(description, LazyDescription):
+        filenames = description.filenames
+        if base_dir is not None:
+            filenames = [relative_path(filename, base_dir)
+                         for filename in filenames]
+        return {'description_files': filenames}
+    return description
+
+
+def _load_description(data, base_dir=None):
+    from .config import LazyDescription
+
+    if isinstance(data, dict):
+        filenames = data['description_files']
+        if base_dir is not None:
+            filenames = [absolute_path(filename, base_dir)
+                         for filename in filenames]
+        return LazyDescription(filenames)
+    return data
+
+
+def _dump_extension(ext):
+    from .config import EXTENSION_FIELDS
+
+    data = {'name': ext.name}
+    for field in EXTENSION_FIELDS:
+        value = getattr(ext, field, None)
+        if value:
+            data[field] = value
+
+    return data
+
+
+def _load_extension(data):
+    from setuptools.extension import Extension
+
+    data = dict(data)
+    if 'define_macros' in data:
+        data['define_macros'] = [tuple(macro)
+                                 for macro in data['define_macros']]
+
+    return Extension(data.pop('name'), **data)
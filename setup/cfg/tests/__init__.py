@@ -89,6 +89,14 @@ class D2to1TestCase(object):
         monkeypatch_method.unpatch_all()
 
     def run_setup(self, *args):
+        # The setuptools sandbox re-imports setuptools and distutils for each
+        # run, so the modules that subclass or import from them at import
+        # time have to be re-imported as well
+        for k in list(sys.modules):
+            if (k.startswith('setup.cfg.command.') or
+                    k in ('setup.cfg.compilers', 'setup.cfg.depends')):
+                del sys.modules[k]
+
         old_stdout = sys.stdout
         old_stderr = sys.stderr
         stdout = sys.stdout = StringIO()
@@ -0,0 +1,70 @@
+from __future__ import with_statement
+
+import os
+import shutil
+
+from . import D2to1TestCase
+from .util import open_config
+from ..batch import export_metadata
+from ..timing import get_hook_times
+
+
+class TestBatch(D2to1TestCase):
+    def test_export_metadata(self):
+        """
+        Test exporting the metadata of several distributions at once, each
+        from its own directory.
+        """
+
+        other_dir = os.path.join(self.temp_dir, 'otherpackage')
+        shutil.copytree(self.package_dir, other_dir)
+        with open_config(os.path.join(other_dir, 'setup.cfg')) as cfg:
+            cfg.set('metadata', 'name', 'otherpackage')
+        missing_dir = os.path.join(self.temp_dir, 'missing')
+
+        results = list(export_metadata(
+            [self.package_dir, other_dir, missing_dir], jobs=2,
+            fields=['name', 'cmdclass']))
+
+        results = dict((r['path'], r) for r in results)
+        package_cfg = os.path.join(self.package_dir, 'setup.cfg')
+        other_cfg = os.path.join(other_dir, 'setup.cfg')
+        assert (results[package_cfg]['kwargs']['name'] ==
+                'setup_cfg_testpackage')
+        assert results[other_cfg]['kwargs']['name'] == 'otherpackage'
+        build_py = results[other_cfg]['kwargs']['cmdclass']['build_py']
+        assert build_py == {
+            'class': 'setup_cfg_testpackage._setup_hooks.test_command'}
+        assert 'DistutilsFileError' in results[missing_dir]['error']
+        assert os.getcwd() == self.package_dir
+
+    def test_export_hook_times(self):
+        """
+        Test that the hook times of each distribution exported by the same
+        worker are only reported if enabled by its own setup.cfg.
+        """
+
+        with open_config(os.path.join(self.package_dir, 'setup.cfg')) as cfg:
+            cfg.set('global', 'setup-hooks',
+                    'setup_cfg_testpackage._setup_hooks.test_hook_1')
+        other_dir = os.path.join(self.temp_dir, 'otherpackage')
+        shutil.copytree(self.package_dir, other_dir)
+        with open_config(os.path.join(other_dir, 'setup.cfg')) as cfg:
+            cfg.set('metadata', 'name', 'otherpackage')
+            cfg.set('global', 'hook-times', 'true')
+
+        hook_times = get_hook_times()
+        records = list(hook_times.records)
+        results = list(export_metadata([other_dir, self.package_dir],
+                                       jobs=1, fields=['name']))
+        assert [r['kwargs']['name'] for r in results] == [
+            'otherpackage', 'setup_cfg_testpackage']
+
+        hook_times_file = os.path.join('build', 'setup.cfg',
+                                       'hook-times.json')
+        assert os.path.exists(os.path.join(other_dir, hook_times_file))
+        assert not os.path.exists(os.path.join(self.package_dir,
+                                               hook_times_file))
+        assert get_hook_times() is hook_times
+        assert hook_times.records == records
+        assert not hook_times.enabled
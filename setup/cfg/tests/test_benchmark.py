@@ -0,0 +1,48 @@
+from __future__ import with_statement
+
+import json
+import os
+
+from . import D2to1TestCase
+from ..benchmark import (STAGES, compare_results, generate_config,
+                         run_benchmarks, scaling)
+from ..config import get_extension_modules, read_config
+from ..util import split_multiline
+
+
+class TestBenchmark(D2to1TestCase):
+    def test_generate_config(self):
+        """
+        Test that the synthetic configs have the requested number of
+        extensions and entry points.
+        """
+
+        config = read_config(generate_config(self.temp_dir, 7))
+        assert len(get_extension_modules(config)) == 7
+        assert len(split_multiline(config['metadata']['classifier'])) == 7
+
+    def test_run_benchmarks(self):
+        """
+        Test that every stage is timed for every size, and that results can
+        be compared.
+        """
+
+        results = run_benchmarks(sizes=[2, 4], repeat=1)
+        results = json.loads(json.dumps(results))
+        assert os.getcwd() == self.package_dir
+
+        timed = [(r['stage'], r['size']) for r in results['results']]
+        assert sorted(timed) == sorted((stage, size) for stage in STAGES
+                                       for size in (2, 4))
+        for result in results['results']:
+            assert 0 <= result['best'] <= result['median']
+            assert result['best'] <= result['first']
+        assert set(scaling(results)) <= set(STAGES)
+
+        slower = json.loads(json.dumps(results))
+        for result in slower['results']:
+            result['best'] = result['best'] * 2 + 1
+        rows, regressions = compare_results(results, slower)
+        assert len(rows) == len(regressions) == len(timed)
+        rows, regressions = compare_results(slower, results)
+        assert not regressions
@@ -0,0 +1,129 @@
+from __future__ import with_statement
+
+import base64
+import hashlib
+import os
+import sys
+import tarfile
+import zipfile
+
+from . import D2to1TestCase
+from .util import open_config
+from .. import build_meta
+
+
+class TestBuildMeta(D2to1TestCase):
+    def setup(self):
+        super(TestBuildMeta, self).setup()
+        build_meta._setup_configs.clear()
+
+    def test_get_requires(self):
+        with open_config('setup.cfg') as cfg:
+            cfg.set('metadata', 'setup-requires-dist', 'setup.cfg\nfoo')
+
+        assert build_meta.get_requires_for_build_sdist() == ['setup.cfg',
+                                                              'foo']
+        assert (build_meta.get_requires_for_build_wheel() ==
+                ['setup.cfg', 'foo', 'wheel'])
+
+    def test_prepare_metadata_for_build_wheel(self):
+        """
+        Test that the metadata is written from the same parse of setup.cfg
+        as the other hooks.
+        """
+
+        build_meta.get_requires_for_build_wheel()
+        setup_config = build_meta._get_setup_config()
+
+        metadata_dir = os.path.join(self.package_dir, 'metadata')
+        dist_info = build_meta.prepare_metadata_for_build_wheel(metadata_dir)
+        assert dist_info == 'setup_cfg_testpackage-0.1.dev0.dist-info'
+        assert os.path.exists(os.path.join(metadata_dir, dist_info,
+                                           'METADATA'))
+        assert build_meta._get_setup_config() is setup_config
+
+        # The config is read again once it changes
+        with open_config('setup.cfg') as cfg:
+            cfg.set('metadata', 'version', '0.2')
+        assert build_meta._get_setup_config() is not setup_config
+        dist_info = build_meta.prepare_metadata_for_build_wheel(metadata_dir)
+        assert dist_info == 'setup_cfg_testpackage-0.2.dist-info'
+
+    def test_use_prepared_metadata(self):
+        """
+        Test that the metadata prepared for the frontend replaces the one in
+        the built wheel, and that the wheel's RECORD is updated.
+        """
+
+        metadata_dir = os.path.join(self.package_dir, 'metadata')
+        dist_info = build_meta.prepare_metadata_for_build_wheel(metadata_dir)
+        with open(os.path.join(metadata_dir, dist_info, 'METADATA'),
+                  'rb') as f:
+            metadata = f.read()
+        with open(os.path.join(metadata_dir, dist_info, 'entry_points.txt'),
+                  'w') as f:
+            f.write('[console_scripts]\nfoo = foo:main\n')
+
+        wheel = os.path.join(self.package_dir,
+                             'setup_cfg_testpackage-0.1.dev0-py3-none-any.whl')
+        zf = zipfile.ZipFile(wheel, 'w')
+        try:
+            zf.writestr('setup_cfg_testpackage/__init__.py', b'')
+            zf.writestr(dist_info + '/METADATA', b'Name: other\n')
+            zf.writestr(dist_info + '/WHEEL', b'Wheel-Version: 1.0\n')
+            zf.writestr(dist_info + '/RECORD', b'')
+        finally:
+            zf.close()
+
+        build_meta._use_prepared_metadata(wheel, metadata_dir)
+
+        zf = zipfile.ZipFile(wheel)
+        try:
+            assert zf.read(dist_info + '/METADATA') == metadata
+            assert zf.read(dist_info + '/WHEEL') == b'Wheel-Version: 1.0\n'
+            assert (zf.read(dist_info + '/entry_points.txt') ==
+                    b'[console_scripts]\nfoo = foo:main\n')
+            record = zf.read(dist_info + '/RECORD').decode('utf-8')
+            for line in record.splitlines():
+                name, digest, size = line.split(',')
+                if name == dist_info + '/RECORD':
+                    continue
+                data = zf.read(name)
+                expected = base64.urlsafe_b64encode(
+                    hashlib.sha256(data).digest()).rstrip(b'=')
+                assert digest == 'sha256=' + expected.decode('ascii')
+                assert int(size) == len(data)
+        finally:
+            zf.close()
+
+        # The wheel of another version does not match the prepared metadata
+        with open_config('setup.cfg') as cfg:
+            cfg.set('metadata', 'version', '0.2')
+        other_dir = os.path.join(self.package_dir, 'other')
+        build_meta.prepare_metadata_for_build_wheel(other_dir)
+        try:
+            build_meta._use_prepared_metadata(wheel, other_dir)
+        except ValueError:
+            pass
+        else:
+            assert False, 'mismatched metadata was copied into the wheel'
+
+    def test_build_sdist(self):
+        # The command modules have to be imported again outside of the
+        # setuptools sandbox used by run_setup
+        for k in list(sys.modules):
+            if k.startswith('setup.cfg.command.'):
+                del sys.modules[k]
+
+        dist_dir = os.path.join(self.package_dir, 'sdist')
+        sdist = build_meta.build_sdist(dist_dir)
+        # Newer versions of setuptools normalize the name of the archive
+        assert sdist.endswith('testpackage-0.1.dev0.tar.gz')
+        assert os.listdir(dist_dir) == [sdist]
+
+        tf = tarfile.open(os.path.join(dist_dir, sdist))
+        try:
+            names = tf.getnames()
+        finally:
+            tf.close()
+        assert sdist[:-len('.tar.gz')] + '/setup.cfg' in names
@@ -0,0 +1,106 @@
+from __future__ import with_statement
+
+import os
+import sys
+import unittest
+
+from . import D2to1TestCase
+from .util import open_config
+from ..config import to_setup
+
+
+class TestCache(D2to1TestCase):
+    def setup(self):
+        super(TestCache, self).setup()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        sys.path.insert(0, self.package_dir)
+
+    def teardown(self):
+        sys.path.remove(self.package_dir)
+        super(TestCache, self).teardown()
+
+    def test_cached_to_setup(self):
+        """
+        Test that to_setup() returns the same arguments when they are loaded
+        from the cache, and that the cache is actually used.
+        """
+
+        kwargs = to_setup(cache_dir=self.cache_dir)
+        assert len([filename for filename in os.listdir(self.cache_dir)
+                    if filename.startswith('setup-')]) == 1
+
+        cached = to_setup(cache_dir=self.cache_dir)
+        assert sorted(cached) == sorted(kwargs)
+        assert cached['cmdclass'] == kwargs['cmdclass']
+        assert cached['long_description'] == kwargs['long_description']
+        assert cached['package_data'] == kwargs['package_data']
+        assert cached['data_files'] == kwargs['data_files']
+        assert ([ext.name for ext in cached['ext_modules']] ==
+                [ext.name for ext in kwargs['ext_modules']])
+
+    def test_cache_invalidation(self):
+        """
+        Test that changes to the description files or setup.cfg are picked up
+        when the cache is enabled.
+        """
+
+        to_setup(cache_dir=self.cache_dir)
+
+        with open('README.txt', 'a') as f:
+            f.write('\nSome more text.')
+        kwargs = to_setup(cache_dir=self.cache_dir)
+        assert 'Some more text.' in kwargs['long_description']
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('metadata', 'version', '0.2')
+        kwargs = to_setup(cache_dir=self.cache_dir)
+        assert kwargs['version'] == '0.2'
+
+    def test_extension_sources_glob(self):
+        """
+        Test that glob patterns in the sources of extension modules are
+        expanded, and that adding files matching them invalidates the cache.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('extension=setup_cfg_testpackage.testext', 'sources',
+                    'src/**/*.c')
+
+        kwargs = to_setup(cache_dir=self.cache_dir)
+        assert kwargs['ext_modules'][0].sources == [
+            os.path.join('src', 'testext.c')]
+
+        # Make sure the new directory gets a different modification time
+        src_dir_mtime = os.stat('src').st_mtime
+        os.mkdir(os.path.join('src', 'sub'))
+        open(os.path.join('src', 'sub', 'helper.c'), 'w').close()
+        os.utime('src', (src_dir_mtime + 10, src_dir_mtime + 10))
+
+        kwargs = to_setup(cache_dir=self.cache_dir)
+        assert kwargs['ext_modules'][0].sources == [
+            os.path.join('src', 'sub', 'helper.c'),
+            os.path.join('src', 'testext.c')]
+
+    def test_new_config_file(self):
+        """
+        Test that creating a distutils config file with command hooks after
+        the results were cached invalidates the cache.
+        """
+
+        from setuptools.dist import Distribution
+        if not hasattr(Distribution(), '_gen_paths'):
+            raise unittest.SkipTest('DIST_EXTRA_CONFIG is not supported')
+
+        extra_config = os.path.join(self.temp_dir, 'extra.cfg')
+        os.environ['DIST_EXTRA_CONFIG'] = extra_config
+        try:
+            kwargs = to_setup(cache_dir=self.cache_dir)
+            assert 'sdist' not in kwargs.get('cmdclass', {})
+
+            with open(extra_config, 'w') as f:
+                f.write('[sdist]\npre-hook.test = '
+                        'setup_cfg_testpackage._setup_hooks.test_pre_hook\n')
+            kwargs = to_setup(cache_dir=self.cache_dir)
+            assert 'sdist' in kwargs['cmdclass']
+        finally:
+            del os.environ['DIST_EXTRA_CONFIG']
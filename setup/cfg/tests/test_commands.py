@@ -1,4 +1,13 @@
+from __future__ import with_statement
+
+import os
+import sys
+import time
+
+from distutils.errors import DistutilsModuleError
+
 from . import D2to1TestCase
+from .util import open_config
 
 
 class TestCommands(D2to1TestCase):
@@ -11,3 +20,169 @@ class TestCommands(D2to1TestCase):
         stdout, _, return_code = self.run_setup('build_py')
         assert 'Running custom build_py command.' in stdout
         assert return_code == 0
+
+    def test_named_build_py_command(self):
+        """
+        Test that a custom command given along with its command name in the
+        commands [global] option runs as well.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('global', 'commands',
+                    'build_py = setup_cfg_testpackage._setup_hooks.'
+                    'test_command')
+
+        stdout, _, return_code = self.run_setup('build_py')
+        assert 'Running custom build_py command.' in stdout
+        assert return_code == 0
+
+    def test_named_command_lazy(self):
+        """
+        Test that command classes given along with their command names are
+        only imported when the command is looked up.
+        """
+
+        from ..config import process_config
+
+        kwargs = process_config({'global': {
+            'commands': 'build_py = setup_cfg_testpackage._setup_hooks.'
+                        'test_command\n'
+                        'missing = setup_cfg_testpackage.missing.command'}})
+        cmdclass = kwargs['cmdclass']
+        assert sorted(cmdclass) == ['build_py', 'missing']
+        assert 'setup_cfg_testpackage._setup_hooks' not in sys.modules
+
+        cmdclass.wrap('build_py', {'pre_hook': {'foo': 'foo.bar'}})
+        sys.path.insert(0, self.package_dir)
+        try:
+            assert cmdclass['build_py'].__name__ == 'build_py'
+            assert cmdclass['build_py'].pre_hook == {'foo': 'foo.bar'}
+        finally:
+            sys.path.remove(self.package_dir)
+
+        try:
+            cmdclass['missing']
+        except DistutilsModuleError:
+            pass
+        else:
+            assert False, 'missing command class was found'
+
+    def test_parallel_build_ext(self):
+        """
+        Test that extension modules are built by the parallel build_ext
+        command by default, compiling each of their sources.
+        """
+
+        with open('src/helper.c', 'w') as f:
+            f.write('int testext_helper(void) { return 0; }\n')
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('extension=setup_cfg_testpackage.testext', 'sources',
+                    'src/testext.c\nsrc/helper.c')
+            cfg.set('extension=setup_cfg_testpackage.testext', 'optional',
+                    'False')
+
+        stdout, _, return_code = self.run_setup('build_ext', '--jobs=2',
+                                                '--build-temp=build/temp',
+                                                '--inplace')
+        assert return_code == 0
+
+        objects = []
+        for dirpath, _, filenames in os.walk(os.path.join('build', 'temp')):
+            objects.extend(filename for filename in filenames
+                           if filename.endswith(('.o', '.obj')))
+        assert sorted(objects) in (['helper.o', 'testext.o'],
+                                   ['helper.obj', 'testext.obj'])
+        assert [filename for filename in os.listdir('setup_cfg_testpackage')
+                if filename.startswith('testext.')]
+
+    def test_build_ext_header_dependencies(self):
+        """
+        Test that build_ext recompiles the sources that include a header when
+        it changes, and only those.
+        """
+
+        with open('src/helper.h', 'w') as f:
+            f.write('int testext_helper(void);\n')
+        with open('src/helper.c', 'w') as f:
+            f.write('#include "helper.h"\n'
+                    'int testext_helper(void) { return 0; }\n')
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('extension=setup_cfg_testpackage.testext', 'sources',
+                    'src/testext.c\nsrc/helper.c')
+            cfg.set('extension=setup_cfg_testpackage.testext', 'optional',
+                    'False')
+
+        args = ('build_ext', '--build-temp=build/temp', '--inplace')
+        _, _, return_code = self.run_setup(*args)
+        assert return_code == 0
+
+        def object_mtimes():
+            mtimes = {}
+            for dirpath, _, filenames in os.walk(os.path.join('build',
+                                                              'temp')):
+                for filename in filenames:
+                    if filename.endswith(('.o', '.obj')):
+                        path = os.path.join(dirpath, filename)
+                        name = os.path.splitext(filename)[0]
+                        mtimes[name] = (path, os.stat(path).st_mtime)
+            return mtimes
+
+        # Make the objects newer than the sources, but older than the header
+        # (and the extension module); distutils compares whole seconds
+        now = time.time()
+        for path, _ in object_mtimes().values():
+            os.utime(path, (now - 10, now - 10))
+        for filename in ('src/testext.c', 'src/helper.c'):
+            os.utime(filename, (now - 20, now - 20))
+        os.utime('src/helper.h', (now + 10, now + 10))
+
+        old_mtimes = object_mtimes()
+        _, _, return_code = self.run_setup(*args)
+        assert return_code == 0
+        new_mtimes = object_mtimes()
+        assert new_mtimes['testext'] == old_mtimes['testext']
+        assert new_mtimes['helper'][1] > old_mtimes['helper'][1]
+
+    def test_build_py_package_data(self):
+        """
+        Test that package data is found by the default build_py command when
+        the distribution does not provide its own.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.remove_option('global', 'commands')
+
+        stdout, _, return_code = self.run_setup('build_py',
+                                                '--build-lib=build/lib')
+        assert 'Running custom build_py command.' not in stdout
+        assert return_code == 0
+
+        package_data = os.path.join('build', 'lib', 'setup_cfg_testpackage',
+                                    'package_data')
+        assert sorted(os.listdir(package_data)) == ['1.txt', '2.txt']
+
+    def test_default_egg_info_command(self):
+        """
+        Test that setup.cfg's egg_info command is only used for distributions
+        with extra_files, or whose results are cached.
+        """
+
+        from ..cache import CACHE_DIR_ENV
+        from ..config import add_default_commands
+
+        def cmdclass(config):
+            kwargs = {}
+            add_default_commands(kwargs, config)
+            return kwargs['cmdclass']
+
+        assert 'egg_info' not in cmdclass({})
+        assert 'egg_info' in cmdclass({'files': {'extra_files': 'a.txt'}})
+
+        os.environ[CACHE_DIR_ENV] = os.path.join(self.package_dir, 'cache')
+        try:
+            assert 'egg_info' in cmdclass({})
+            assert 'egg_info' not in cmdclass({'global': {'cache': 'false'}})
+        finally:
+            del os.environ[CACHE_DIR_ENV]
@@ -0,0 +1,112 @@
+from __future__ import with_statement
+
+import os
+import shutil
+
+from . import D2to1TestCase
+from .util import open_config
+from ..compilers import OBJECT_CACHE_DIR_ENV, ObjectCache
+
+
+class TestCompilers(D2to1TestCase):
+    def setup(self):
+        super(TestCompilers, self).setup()
+        self.cache_dir = os.path.join(self.package_dir, 'objects')
+        self.old_cache_dir = os.environ.get(OBJECT_CACHE_DIR_ENV)
+        os.environ[OBJECT_CACHE_DIR_ENV] = self.cache_dir
+
+    def teardown(self):
+        if self.old_cache_dir is None:
+            del os.environ[OBJECT_CACHE_DIR_ENV]
+        else:
+            os.environ[OBJECT_CACHE_DIR_ENV] = self.old_cache_dir
+        super(TestCompilers, self).teardown()
+
+    def _build_twice(self):
+        with open_config('setup.cfg') as cfg:
+            cfg.set('extension=setup_cfg_testpackage.testext', 'optional',
+                    'False')
+
+        stdout, _, return_code = self.run_setup('build_ext')
+        assert return_code == 0
+        assert 'using cached object' not in stdout
+        assert os.listdir(self.cache_dir)
+
+        shutil.rmtree('build')
+        stdout, _, return_code = self.run_setup('build_ext')
+        assert return_code == 0
+        assert 'using cached object for src/testext.c' in stdout
+
+    def test_cached_compiler(self):
+        """
+        Test that object files are reused from the cache by the cached
+        compiler registered in the [global] compilers option.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('global', 'compilers',
+                    'setup.cfg.compilers.CachingCompiler')
+            cfg.set('build_ext', 'compiler', 'cached')
+
+        self._build_twice()
+
+    def test_build_ext_cache_objects(self):
+        """
+        Test that object files are reused from the cache with the
+        cache-objects option of build_ext.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('build_ext', 'cache-objects', '1')
+
+        self._build_twice()
+
+    def test_other_checkout(self):
+        """
+        Test that object files are shared by checkouts of the same sources in
+        different directories.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('extension=setup_cfg_testpackage.testext', 'optional',
+                    'False')
+            cfg.set('build_ext', 'cache-objects', '1')
+            cfg.set('build_ext', 'include-dirs', self.package_dir)
+
+        # The other checkout is nested in this one, so that the cache, which
+        # is inside it, is in the directories writable by both builds
+        other_dir = os.path.join(self.temp_dir, 'other')
+        shutil.copytree(self.package_dir, other_dir)
+        shutil.move(other_dir, self.package_dir)
+        other_dir = os.path.join(self.package_dir, 'other')
+        with open_config(os.path.join(other_dir, 'setup.cfg')) as cfg:
+            cfg.set('build_ext', 'include-dirs', other_dir)
+        os.environ[OBJECT_CACHE_DIR_ENV] = os.path.join(other_dir, 'objects')
+
+        stdout, _, return_code = self.run_setup('build_ext')
+        assert return_code == 0
+        assert 'using cached object' not in stdout
+
+        os.chdir(other_dir)
+        stdout, _, return_code = self.run_setup('build_ext')
+        assert return_code == 0
+        assert 'using cached object for src/testext.c' in stdout
+
+    def test_object_cache_trim(self):
+        """Test that the least recently used objects are evicted first."""
+
+        cache = ObjectCache(self.cache_dir)
+        for idx, key in enumerate(('aa01', 'bb02', 'cc03')):
+            with open('obj.o', 'wb') as f:
+                f.write(b'x' * 100)
+            cache.store(key, 'obj.o')
+            os.utime(cache.path(key), (1000 + idx, 1000 + idx))
+
+        # Using the oldest object makes it the most recently used
+        assert cache.fetch('aa01', 'fetched.o')
+        cache.max_size = 250
+        cache.trim()
+        assert os.path.exists(cache.path('aa01'))
+        assert not os.path.exists(cache.path('bb02'))
+        assert os.path.exists(cache.path('cc03'))
+        assert not cache.fetch('bb02', 'fetched.o')
@@ -1,9 +1,16 @@
+from __future__ import with_statement
+
 import glob
+import json
 import os
+import platform
+import pstats
+import shutil
 import tarfile
 import sys
 
 from . import D2to1TestCase
+from .util import open_config
 
 
 VERSION = '0.1.dev'
@@ -63,3 +70,265 @@ class TestCore(D2to1TestCase):
         names = ['/'.join(p.split('/')[1:]) for p in tf.getnames()]
 
         assert 'extra-file.txt' in names
+
+    def test_cached_manifest(self):
+        """
+        Test that the extra files are added to the manifest only once, and
+        that the manifest is reused until the project's files change.
+        """
+
+        sources = os.path.join('setup_cfg_testpackage.egg-info',
+                               'SOURCES.txt')
+
+        stdout, _, return_code = self.run_setup('egg_info')
+        assert return_code == 0
+        assert 'reading cached manifest' not in stdout
+        with open(sources) as f:
+            files = f.read().splitlines()
+        assert files.count('extra-file.txt') == 1
+
+        stdout, _, return_code = self.run_setup('egg_info')
+        assert return_code == 0
+        assert 'reading cached manifest' in stdout
+        with open(sources) as f:
+            assert f.read().splitlines() == files
+
+        # Make sure the directory gets a different modification time
+        data_dir_mtime = os.stat('data_files').st_mtime
+        open(os.path.join('data_files', 'new.txt'), 'w').close()
+        os.utime('data_files', (data_dir_mtime + 10, data_dir_mtime + 10))
+
+        stdout, _, return_code = self.run_setup('egg_info')
+        assert 'reading cached manifest' not in stdout
+        with open(sources) as f:
+            assert 'data_files/new.txt' in f.read().splitlines()
+
+    def test_setup_config_lazy(self):
+        """
+        Test that SetupConfig only computes the setup() arguments that are
+        actually read.
+        """
+
+        from ..config import SetupConfig
+
+        # Without the description files only reading the long_description
+        # should fail
+        os.remove('README.txt')
+        setup_config = SetupConfig.from_file('setup.cfg')
+        assert setup_config['name'] == 'setup_cfg_testpackage'
+        assert setup_config['version'] == VERSION
+        assert 'maintainer' not in setup_config
+        long_description = setup_config['long_description']
+        try:
+            str(long_description)
+        except (IOError, OSError):
+            pass
+        else:
+            assert False, 'long_description read a missing file'
+
+    def test_process_config_option_spellings(self):
+        """
+        Test that options are found whether they are spelled with dashes or
+        underscores, and that the underscore spelling takes precedence.
+        """
+
+        from ..config import process_config, get_extension_modules
+
+        config = {
+            'metadata': {'name': 'foo', 'home-page': 'dashes',
+                         'home_page': 'underscores',
+                         'requires-dist': 'bar (>=1.0)'},
+            'extension: foo.ext': {'sources': 'a.c\nb.c',
+                                   'define-macros': 'A=1\nB'}
+        }
+
+        kwargs = process_config(config)
+        assert kwargs == {'name': 'foo', 'url': 'underscores',
+                          'install_requires': ['bar>=1.0']}
+
+        ext, = get_extension_modules(config)
+        assert ext.name == 'foo.ext'
+        assert ext.sources == ['a.c', 'b.c']
+        assert ext.define_macros == [('A', '1'), ('B', None)]
+
+    def test_long_description_lazy(self):
+        """
+        Test that the description files are only read when the
+        long_description is needed.
+        """
+
+        os.remove('README.txt')
+        stdout, _, return_code = self.run_setup('--name')
+        assert stdout == 'setup_cfg_testpackage'
+        assert return_code == 0
+
+    def test_long_description_chunks(self):
+        """
+        Test that the long_description read in chunks matches the stripped
+        contents of the description files.
+        """
+
+        from ..config import LazyDescription
+
+        with open('README.txt', 'w') as f:
+            f.write('\n  \n' + 'x ' * 100 + '\n  \n\n')
+
+        description = LazyDescription(['README.txt', 'CHANGES.txt'])
+        description.chunk_size = 7
+        with open('CHANGES.txt') as f:
+            changes = f.read().strip()
+
+        expected = ('x ' * 100).strip() + '\n\n' + changes + '\n\n'
+        assert description == expected
+
+    def test_read_config_once(self):
+        """
+        Test that config files are only parsed again if they change, and that
+        modifying a parsed config does not affect later reads.
+        """
+
+        from ..config import read_config, _parsed_configs
+
+        config = read_config('setup.cfg')
+        parsed = _parsed_configs[os.path.abspath('setup.cfg')]
+        config['metadata']['name'] = 'modified'
+        assert read_config('setup.cfg')['metadata']['name'] != 'modified'
+        assert _parsed_configs[os.path.abspath('setup.cfg')] is parsed
+
+        with open('setup.cfg', 'a') as f:
+            f.write('\n[extra]\nfoo = bar\n')
+        assert read_config('setup.cfg')['extra'] == {'foo': 'bar'}
+
+    def test_resolve_name(self):
+        """
+        Test resolving names in both the ``module.object`` and
+        ``module:object`` forms, and that failures are remembered.
+        """
+
+        from ..util import resolve_name, _unresolved_names
+
+        assert resolve_name('os.path.join') is os.path.join
+        assert resolve_name('os.path:join') is os.path.join
+        assert resolve_name('os:path.join') is os.path.join
+
+        for name in ('setup_cfg_missing.module.func', 'os:missing'):
+            for _ in range(2):
+                try:
+                    resolve_name(name)
+                except ImportError:
+                    pass
+                else:
+                    assert False, '%s was resolved' % name
+            assert name in _unresolved_names
+
+    def test_profile(self):
+        """
+        Test that the phases of the run are profiled when the profile option
+        is set.
+        """
+
+        from ..profiling import get_profiler
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('global', 'profile', 'cprofile')
+
+        profiler = get_profiler()
+        try:
+            _, stderr, return_code = self.run_setup('build_ext')
+        finally:
+            profiler.mode = None
+
+        assert return_code == 0
+        assert '[setup.cfg] profile:' in stderr
+
+        profile_dir = os.path.join('build', 'setup.cfg', 'profile')
+        with open(os.path.join(profile_dir, 'report.txt')) as f:
+            phases = [line.split()[0] for line in f.read().splitlines()[1:]]
+        for phase in ('parse', 'setup_hooks', 'process_config',
+                      'get_extension_modules', 'cmdclass',
+                      'register_custom_compilers', 'wrap_commands',
+                      'command:build_ext'):
+            assert phase in phases
+
+        stats = pstats.Stats(os.path.join(profile_dir,
+                                          'command-build_ext.pstats'))
+        assert stats.total_calls > 0
+        assert not os.path.exists(os.path.join(profile_dir, 'parse.pstats'))
+
+    def test_compile_cfg(self):
+        """
+        Test that the setup() arguments compiled by the compile_cfg command
+        are used until setup.cfg changes.
+        """
+
+        stdout, _, return_code = self.run_setup('compile_cfg')
+        assert return_code == 0
+        assert os.path.exists('setup.cfg.json')
+
+        with open('setup.cfg.json') as f:
+            compiled = json.load(f)
+        assert compiled['data']['kwargs']['name'] == 'setup_cfg_testpackage'
+        assert compiled['data']['kwargs']['classifiers'][0] == (
+            'Development Status :: 3 - Alpha')
+        assert 'setup.cfg' in compiled['inputs']
+        # Config files that may be created later are recorded as well
+        user_config = [name for name in compiled['inputs']
+                       if name.endswith('pydistutils.cfg')]
+        assert user_config
+        if not os.path.exists(user_config[0]):
+            assert compiled['inputs'][user_config[0]] is None
+
+        # Only the compiled arguments are used from now on
+        compiled['data']['kwargs']['name'] = 'compiled_testpackage'
+        with open('setup.cfg.json', 'w') as f:
+            json.dump(compiled, f)
+
+        # Building does not invalidate them
+        self.run_setup('egg_info')
+        stdout, _, return_code = self.run_setup('--name')
+        assert stdout.splitlines()[-1] == 'compiled_testpackage'
+
+        # Nor are they used by another Python implementation
+        compiled['implementation'] = 'OtherPython'
+        with open('setup.cfg.json', 'w') as f:
+            json.dump(compiled, f)
+        stdout, _, return_code = self.run_setup('--name')
+        assert stdout.splitlines()[-1] == 'setup_cfg_testpackage'
+
+        compiled['implementation'] = platform.python_implementation()
+        with open('setup.cfg.json', 'w') as f:
+            json.dump(compiled, f)
+        with open('setup.cfg', 'a') as f:
+            f.write('\n# changed\n')
+        stdout, _, return_code = self.run_setup('--name')
+        assert stdout.splitlines()[-1] == 'setup_cfg_testpackage'
+
+    def test_compile_cfg_moved(self):
+        """
+        Test that the compiled setup() arguments remain valid when the
+        distribution's directory is moved, and use the moved files.
+        """
+
+        stdout, _, return_code = self.run_setup('compile_cfg')
+        assert return_code == 0
+
+        with open('setup.cfg.json') as f:
+            compiled = json.load(f)
+        assert self.package_dir not in json.dumps(compiled)
+        assert compiled['inputs']['.'] is not None
+        compiled['data']['kwargs']['name'] = 'compiled_testpackage'
+        with open('setup.cfg.json', 'w') as f:
+            json.dump(compiled, f)
+
+        moved_dir = os.path.join(self.temp_dir, 'moved')
+        os.chdir(self.temp_dir)
+        shutil.move(self.package_dir, moved_dir)
+        os.chdir(moved_dir)
+        with open('README.txt', 'w') as f:
+            f.write('The moved README.\n')
+
+        stdout, _, return_code = self.run_setup('--name')
+        assert stdout.splitlines()[-1] == 'compiled_testpackage'
+        stdout, _, return_code = self.run_setup('--long-description')
+        assert return_code == 0
+        assert 'The moved README.' in stdout
@@ -0,0 +1,67 @@
+from __future__ import with_statement
+
+import os
+
+from . import D2to1TestCase
+from ..depends import IncludeGraph, python_include_dirs, scan_includes
+
+
+class TestDepends(D2to1TestCase):
+    def setup(self):
+        super(TestDepends, self).setup()
+        os.mkdir('include')
+        with open('include/a.h', 'w') as f:
+            f.write('#include "b.h"\n#include <missing.h>\n')
+        with open('include/b.h', 'w') as f:
+            f.write('#  include <a.h>\n')
+        with open('src/main.c', 'w') as f:
+            f.write('#include <Python.h>\n#include "a.h"\n'
+                    '/* #include "c.h" is not an include */\n')
+
+    def test_scan_includes(self):
+        assert scan_includes('src/main.c') == [(False, 'Python.h'),
+                                               (True, 'a.h')]
+
+    def test_dependencies(self):
+        """
+        Test that the headers included from a source file are found in its
+        directory and the include path, recursively, and that the scanned
+        includes are cached on disk.
+        """
+
+        cache_file = os.path.join('build', 'depends.json')
+        graph = IncludeGraph(cache_file)
+        include_dir = os.path.abspath('include')
+        assert graph.dependencies('src/main.c', ['include']) == [
+            os.path.join(include_dir, 'a.h'),
+            os.path.join(include_dir, 'b.h')]
+        assert graph.dependencies('src/main.c') == []
+        graph.save()
+
+        graph = IncludeGraph(cache_file)
+        assert graph.includes('include/b.h') == [(False, 'a.h')]
+        assert not graph._changed
+
+        with open('include/b.h', 'w') as f:
+            f.write('\n')
+        graph = IncludeGraph(cache_file)
+        assert graph.dependencies('include/a.h', ['include']) == [
+            os.path.join(include_dir, 'b.h')]
+
+    def test_python_headers(self):
+        """
+        Test that the headers in the Python include directories are not
+        dependencies, even if those directories are on the include path.
+        """
+
+        from distutils import sysconfig
+
+        graph = IncludeGraph()
+        python_inc = sysconfig.get_python_inc()
+        assert os.path.isfile(os.path.join(python_inc, 'Python.h'))
+        assert (os.path.normcase(os.path.abspath(python_inc)) in
+                python_include_dirs())
+        include_dir = os.path.abspath('include')
+        assert graph.dependencies('src/main.c', [python_inc, 'include']) == [
+            os.path.join(include_dir, 'a.h'),
+            os.path.join(include_dir, 'b.h')]
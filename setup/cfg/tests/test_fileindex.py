@@ -0,0 +1,151 @@
+from __future__ import with_statement
+
+import os
+import sys
+
+from distutils.errors import DistutilsFileError
+
+from . import D2to1TestCase
+from ..fileindex import FileIndex
+
+
+class TestFileIndex(D2to1TestCase):
+    def setup(self):
+        super(TestFileIndex, self).setup()
+        for path in ('src/a/one.c', 'src/a/b/two.c', 'src/a/b/two.h',
+                     'src/.hidden/three.c', 'src/.four.c'):
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            open(path, 'w').close()
+
+    def test_glob(self):
+        index = FileIndex()
+        j = os.path.join
+        assert index.glob('src/*.c') == [j('src', 'testext.c')]
+        assert index.glob('src/**/*.c') == [j('src', 'a', 'b', 'two.c'),
+                                            j('src', 'a', 'one.c'),
+                                            j('src', 'testext.c')]
+        assert index.glob('src/*/b/two.?') == [j('src', 'a', 'b', 'two.c'),
+                                               j('src', 'a', 'b', 'two.h')]
+        assert index.glob('src/.*.c') == [j('src', '.four.c')]
+        assert index.glob('src/**') == [j('src', 'a', 'b', 'two.c'),
+                                        j('src', 'a', 'b', 'two.h'),
+                                        j('src', 'a', 'one.c'),
+                                        j('src', 'testext.c')]
+        assert index.glob('missing/*.c') == []
+
+        pattern = os.path.abspath('src') + '/a/*.c'
+        assert index.glob(pattern) == [os.path.abspath(j('src', 'a',
+                                                         'one.c'))]
+
+    def test_listing_cache(self):
+        """
+        Test that directories are only listed again after their modification
+        time changes, including when the listings are loaded from a file.
+        """
+
+        cache_file = os.path.join('build', 'files.json')
+        index = FileIndex(cache_file=cache_file)
+        assert index.glob('src/a/*.c') == [os.path.join('src', 'a', 'one.c')]
+        index.save()
+
+        # Fake a new file that the directory's mtime does not reflect
+        a_dir = os.path.abspath(os.path.join('src', 'a'))
+        st = os.stat(a_dir)
+        open(os.path.join('src', 'a', 'new.c'), 'w').close()
+        os.utime(a_dir, (st.st_atime, st.st_mtime))
+
+        index = FileIndex(cache_file=cache_file)
+        assert index.glob('src/a/*.c') == [os.path.join('src', 'a', 'one.c')]
+        assert a_dir in index.scanned_dirs
+
+        os.utime(a_dir, (st.st_atime, st.st_mtime + 10))
+        assert index.glob('src/a/*.c') == [os.path.join('src', 'a', 'new.c'),
+                                           os.path.join('src', 'a', 'one.c')]
+
+    def test_walk(self):
+        """
+        Test that walking the index gives the same files as distutils, and
+        that files are looked up in the listings of their directories.
+        """
+
+        from distutils.filelist import findall
+
+        index = FileIndex()
+        assert sorted(index.findall()) == sorted(findall())
+        assert (sorted(index.findall('src')) ==
+                sorted(findall('src')))
+
+        assert index.exists('src') and not index.isfile('src')
+        assert index.isfile(os.path.join('src', 'a', 'one.c'))
+        assert not index.exists(os.path.join('src', 'a', 'missing.c'))
+        assert not index.exists(os.path.join('missing', 'missing.c'))
+
+        walked = []
+        for dirpath, dirnames, _ in index.walk('src'):
+            walked.append(dirpath)
+            if 'a' in dirnames:
+                dirnames.remove('a')
+        assert os.path.join('src', 'a') not in walked
+
+    def test_data_files_globs(self):
+        """
+        Test that glob patterns in the data_files option are expanded, that
+        names of existing files that look like patterns are kept, and that
+        patterns matching nothing are an error.
+        """
+
+        from ..config import process_config
+
+        open('data[1].txt', 'w').close()
+        kwargs = process_config({'files': {
+            'data_files': 'share/data = data_files/*.txt\n'
+                          '    data[1].txt'}})
+        assert kwargs['data_files'] == [
+            ('share/data', [os.path.join('data_files', 'a.txt'),
+                            os.path.join('data_files', 'b.txt'),
+                            'data[1].txt'])]
+
+        try:
+            process_config({'files': {
+                'data_files': 'share/data = data_files/*.txt\n'
+                              '    missing/*.txt'}})
+        except DistutilsFileError:
+            assert 'missing/*.txt' in str(sys.exc_info()[1])
+        else:
+            assert False, 'unmatched pattern in data_files was not rejected'
+
+        from ..config import add_extra_files
+
+        try:
+            add_extra_files({'files': {'extra_files': 'missing/*.txt'}}, {})
+        except DistutilsFileError:
+            pass
+        else:
+            assert False, 'unmatched pattern in extra_files was not rejected'
+
+    def test_extension_sources_globs(self):
+        """
+        Test that a pattern in the sources of an extension module that
+        matches nothing is an error, unless it is the name of a file, while
+        one in its depends is only warned about.
+        """
+
+        from ..config import get_extension_modules
+
+        open(os.path.join('src', 'ext[1].c'), 'w').close()
+        section = {'sources': 'src/*/one.c\nsrc/ext[1].c',
+                   'depends': 'include/*.h'}
+        ext = get_extension_modules({'extension:ext': section})[0]
+        assert ext.sources == [os.path.join('src', 'a', 'one.c'),
+                               'src/ext[1].c']
+        assert ext.depends == []
+
+        section['sources'] = 'src/*/missing.c'
+        try:
+            get_extension_modules({'extension:ext': section})
+        except DistutilsFileError:
+            assert 'src/*/missing.c' in str(sys.exc_info()[1])
+        else:
+            assert False, 'unmatched pattern in sources was not rejected'
@@ -0,0 +1,73 @@
+from . import D2to1TestCase
+from ..config import SetupConfig, read_config
+from ..frozenconfig import ConfigView, FrozenConfig
+
+
+class TestFrozenConfig(D2to1TestCase):
+    def test_shared_storage(self):
+        """
+        Test that sections with the same options share their key table, and
+        that equal values are only stored once.
+        """
+
+        classifiers = ''.join(['\nTopic :: %d' % idx for idx in range(10)])
+        config1 = FrozenConfig({'metadata': {'classifier': classifiers[:]},
+                                'extension: a': {'sources': 'a.c'},
+                                'extension: b': {'sources': 'b.c'}})
+        config2 = FrozenConfig({'metadata': {'classifier':
+                                             ''.join(list(classifiers))}})
+
+        assert (config1['extension: a']._keys is
+                config1['extension: b']._keys)
+        assert (config1['metadata']['classifier'] is
+                config2['metadata']['classifier'])
+        assert config1['extension: b'] == {'sources': 'b.c'}
+        assert config1.fold() is config1.fold()
+
+    def test_copy_on_write(self):
+        """
+        Test that modifying a view of a config only copies the modified
+        sections, and leaves the frozen config unchanged.
+        """
+
+        frozen = FrozenConfig({'metadata': {'name': 'foo', 'version': '1.0'},
+                               'files': {'packages': 'foo'}})
+        view = frozen.view()
+        assert not view.modified
+        assert view.freeze() is frozen
+
+        view['metadata']['name'] = 'bar'
+        view.setdefault('global', {})['setup_hooks'] = 'foo.hook'
+        del view['files']
+        # Sections added as dicts can still be modified through the dicts
+        options = {}
+        view['build_ext'] = options
+        options['jobs'] = '2'
+
+        assert view == {'metadata': {'name': 'bar', 'version': '1.0'},
+                        'global': {'setup_hooks': 'foo.hook'},
+                        'build_ext': {'jobs': '2'}}
+        assert frozen['metadata']['name'] == 'foo'
+        assert 'files' in frozen and 'global' not in frozen
+
+        copy = view.copy()
+        copy['metadata']['version'] = '2.0'
+        assert view['metadata']['version'] == '1.0'
+        assert isinstance(copy, ConfigView)
+
+    def test_setup_config_index_shared(self):
+        """
+        Test that the configs read from the same file share their index
+        unless they are modified.
+        """
+
+        setup_config1 = SetupConfig(read_config('setup.cfg'))
+        setup_config2 = SetupConfig(read_config('setup.cfg'))
+        assert setup_config1.index is setup_config2.index
+
+        config = read_config('setup.cfg')
+        config['metadata']['name'] = 'modified'
+        setup_config3 = SetupConfig(config)
+        assert setup_config3.index is not setup_config1.index
+        assert setup_config3['name'] == 'modified'
+        assert setup_config1['name'] == 'setup_cfg_testpackage'
@@ -1,10 +1,80 @@
 from __future__ import with_statement
 
+import json
 import os
+import sys
 import textwrap
+import threading
+import unittest
+
+from distutils.errors import DistutilsOptionError
 
 from . import D2to1TestCase
 from .util import open_config
+from ..hooks import plan_hooks, run_hooks, run_setup_hooks, setup_hook
+from ..timing import get_hook_times
+
+
+_hook_2_started = threading.Event()
+
+
+@setup_hook(parallel=True)
+def parallel_hook_1(config):
+    # Only returns early if parallel_hook_2 runs at the same time
+    config['metadata']['concurrent'] = str(_hook_2_started.wait(5))
+    config['metadata']['name'] = 'hook_1'
+
+
+@setup_hook(parallel=True)
+def parallel_hook_2(config):
+    _hook_2_started.set()
+    config['metadata']['name'] = 'hook_2'
+    del config['metadata']['version']
+
+
+@setup_hook(parallel=True,
+            requires=['setup.cfg.tests.test_hooks.parallel_hook_1'])
+def parallel_hook_3(config):
+    config['files'] = {'seen_name': config['metadata']['name']}
+
+
+@setup_hook(parallel=True)
+def summary_hook_1(config):
+    config['metadata']['summary'] = 'hook_1'
+
+
+@setup_hook(parallel=True,
+            requires=['setup.cfg.tests.test_hooks.summary_hook_1'])
+def summary_hook_2(config):
+    config['metadata']['summary'] = 'hook_2'
+
+
+@setup_hook(parallel=True)
+def summary_hook_3(config):
+    config['metadata']['summary'] = 'hook_3'
+
+
+# Coroutine hooks for test_async_hooks; defined with exec() so that this
+# module can still be imported where the syntax is not supported
+ASYNC_HOOKS = textwrap.dedent("""
+    import asyncio
+
+    async def async_hook_1(config):
+        # Only returns if async_hook_2 runs at the same time
+        await config.setdefault('hook_2_started', asyncio.Event()).wait()
+        config['order'].append('async_hook_1')
+
+    async def async_hook_2(config):
+        config.setdefault('hook_2_started', asyncio.Event()).set()
+        config['order'].append('async_hook_2')
+
+    async def failing_hook(config):
+        raise ValueError('failed')
+
+    async def exiting_hook(config):
+        import sys
+        sys.exit(1)
+""")
 
 
 class TestHooks(D2to1TestCase):
@@ -50,3 +120,166 @@ class TestHooks(D2to1TestCase):
         assert return_code == 0
 
 
+    def test_hook_times(self):
+        """
+        Test that the time taken by each hook is reported and written as
+        JSON.
+        """
+
+        hook_times_file = os.path.join(self.package_dir, 'hook-times.json')
+        os.environ['SETUP_CFG_HOOK_TIMES_FILE'] = hook_times_file
+        try:
+            _, stderr, return_code = self.run_setup('build_ext')
+        finally:
+            del os.environ['SETUP_CFG_HOOK_TIMES_FILE']
+
+        assert return_code == 0
+        assert '[setup.cfg] hook times:' in stderr
+
+        with open(hook_times_file) as f:
+            data = json.load(f)
+        hooks = sorted((rec['kind'], rec['hook'], rec['command'])
+                       for rec in data['hooks'])
+        assert hooks == [
+            ('post_hook', 'setup_cfg_testpackage._setup_hooks.test_post_hook',
+             'build_ext'),
+            ('pre_hook', 'setup_cfg_testpackage._setup_hooks.test_pre_hook',
+             'build_ext'),
+            ('setup_hook', 'setup_cfg_testpackage._setup_hooks.test_hook_1',
+             None),
+            ('setup_hook', 'setup_cfg_testpackage._setup_hooks.test_hook_2',
+             None)]
+
+    def test_hook_times_opt_in(self):
+        """
+        Test that the hook times are only reported if enabled, and are then
+        written next to setup.cfg by default.
+        """
+
+        hook_times_file = os.path.join(self.package_dir, 'build', 'setup.cfg',
+                                       'hook-times.json')
+
+        _, stderr, return_code = self.run_setup('build_ext')
+        assert return_code == 0
+        assert '[setup.cfg] hook times:' not in stderr
+        assert not os.path.exists(hook_times_file)
+
+        with open_config(os.path.join(self.package_dir, 'setup.cfg')) as cfg:
+            cfg.set('global', 'hook-times', 'true')
+
+        try:
+            _, stderr, return_code = self.run_setup('build_ext')
+        finally:
+            get_hook_times().enabled = False
+
+        assert return_code == 0
+        assert '[setup.cfg] hook times:' in stderr
+        assert os.path.exists(hook_times_file)
+
+    def test_hook_time_budget(self):
+        """
+        Test that a hook exceeding its budget in the hook-time-budget option
+        makes the run fail if so configured.
+        """
+
+        with open_config(os.path.join(self.package_dir, 'setup.cfg')) as cfg:
+            cfg.set('global', 'hook-time-budget',
+                    '1m\nsetup_cfg_testpackage._setup_hooks.test_pre_hook = '
+                    '0 fail')
+
+        stdout, _, return_code = self.run_setup('egg_info')
+        assert return_code == 0
+
+        stdout, stderr, return_code = self.run_setup('build_ext')
+        assert 'exceeding its budget' in stderr
+        assert 'build_ext post-hook' not in stdout
+        assert return_code == 1
+
+    def test_parallel_setup_hooks(self):
+        """
+        Test that parallel-safe setup hooks run concurrently, after the hooks
+        they require, and that their changes to the config are merged in
+        the order they are listed.
+        """
+
+        hooks = ['setup.cfg.tests.test_hooks.parallel_hook_%d' % idx
+                 for idx in (1, 2, 3)]
+        config = {'metadata': {'name': 'test', 'version': '0.1'}}
+        _hook_2_started.clear()
+        run_setup_hooks(hooks, config, jobs=4)
+
+        assert config == {
+            'metadata': {'name': 'hook_2', 'concurrent': 'True'},
+            'files': {'seen_name': 'hook_2'}}
+
+        hook_times = get_hook_times()
+        assert [rec['hook'] for rec in hook_times.records] == hooks
+        del hook_times.records[:]
+
+        hook_fns = [parallel_hook_1, parallel_hook_2, parallel_hook_3]
+        batches = plan_hooks(list(zip(hooks, hook_fns)))
+        assert [[hook for hook, _ in batch] for batch in batches] == [
+            hooks[:2], hooks[2:]]
+
+        try:
+            plan_hooks(list(zip(hooks, hook_fns))[::-1])
+        except DistutilsOptionError:
+            pass
+        else:
+            assert False, 'hook requiring a later hook was not rejected'
+
+    def test_parallel_hooks_order(self):
+        """
+        Test that a parallel-safe hook does not run ahead of a hook listed
+        before it, so that the hook listed last wins when both set the same
+        option.
+        """
+
+        hooks = ['setup.cfg.tests.test_hooks.summary_hook_%d' % idx
+                 for idx in (1, 2, 3)]
+        hook_fns = [summary_hook_1, summary_hook_2, summary_hook_3]
+        batches = plan_hooks(list(zip(hooks, hook_fns)))
+        assert [[hook for hook, _ in batch] for batch in batches] == [
+            hooks[:1], hooks[1:]]
+
+        config = {'metadata': {'name': 'test'}}
+        run_setup_hooks(hooks, config, jobs=4)
+        del get_hook_times().records[:]
+        assert config == {'metadata': {'name': 'test', 'summary': 'hook_3'}}
+
+    def test_async_hooks(self):
+        """
+        Test that consecutive coroutine hooks are awaited concurrently, and
+        that their errors are handled like those of other hooks.
+        """
+
+        if sys.version_info < (3, 5):
+            raise unittest.SkipTest('coroutine functions are not supported')
+
+        namespace = {}
+        exec(ASYNC_HOOKS, namespace)
+
+        def sync_hook(config):
+            config['order'].append('sync_hook')
+
+        config = {'order': []}
+        hooks = [('async_hook_1', namespace['async_hook_1']),
+                 ('async_hook_2', namespace['async_hook_2']),
+                 ('exiting_hook', namespace['exiting_hook']),
+                 ('sync_hook', sync_hook)]
+        run_hooks(hooks, config)
+        assert config['order'] == ['async_hook_2', 'async_hook_1',
+                                   'sync_hook']
+
+        hook_times = get_hook_times()
+        assert ([rec['hook'] for rec in hook_times.records] ==
+                ['async_hook_1', 'async_hook_2', 'exiting_hook', 'sync_hook'])
+        del hook_times.records[:]
+
+        try:
+            run_hooks([('failing_hook', namespace['failing_hook'])], None,
+                      'pre_hook', 'build')
+        except SystemExit:
+            pass
+        else:
+            assert False, 'failing coroutine hook did not exit'
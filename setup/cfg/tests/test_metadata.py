@@ -0,0 +1,104 @@
+from __future__ import with_statement
+
+import os
+
+from . import D2to1TestCase
+from .util import open_config
+from ..config import read_config
+from ..metadata import can_write_directly, write_dist_info, write_pkg_info
+
+
+def read_headers(filename):
+    headers = []
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                break
+            headers.append(line.rstrip('\n'))
+    return headers
+
+
+class TestMetadata(D2to1TestCase):
+    def test_write_pkg_info(self):
+        """
+        Test that the metadata written directly from setup.cfg matches the
+        metadata written by egg_info.
+        """
+
+        self.run_setup('egg_info')
+        expected = read_headers(os.path.join(
+            'setup_cfg_testpackage.egg-info', 'PKG-INFO'))
+
+        metadata_dir = os.path.join(self.package_dir, 'metadata')
+        headers = read_headers(write_pkg_info(metadata_dir))
+
+        # egg_info writes the requirements to requires.txt instead
+        assert (sorted(headers) ==
+                sorted(expected + ['Requires-Dist: setuptools']))
+
+    def test_write_dist_info(self):
+        """
+        Test writing a .dist-info directory with the metadata and the entry
+        points.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.add_section('entry_points')
+            cfg.set('entry_points', 'console_scripts',
+                    '\ntestpackage = setup_cfg_testpackage.cli:main')
+
+        metadata_dir = os.path.join(self.package_dir, 'metadata')
+        dist_info = write_dist_info(metadata_dir)
+        assert dist_info == 'setup_cfg_testpackage-0.1.dev0.dist-info'
+
+        dist_info = os.path.join(metadata_dir, dist_info)
+        with open(os.path.join(dist_info, 'METADATA')) as f:
+            metadata = f.read()
+        assert 'Name: setup-cfg-testpackage\n' in metadata
+        assert 'Classifier: Programming Language :: Python\n' in metadata
+        with open('README.txt') as f:
+            assert f.read().strip() in metadata
+
+        with open(os.path.join(dist_info, 'entry_points.txt')) as f:
+            assert f.read() == ('[console_scripts]\n'
+                                'testpackage = setup_cfg_testpackage.cli:main'
+                                '\n\n')
+
+    def test_can_write_directly(self):
+        """
+        Test that the metadata is not written directly for configs with
+        hooks or commands that may change it.
+        """
+
+        assert can_write_directly(read_config('setup.cfg'))
+
+        # Hooks from other config files
+        other_config = os.path.join(self.package_dir, 'other.cfg')
+        with open(other_config, 'w') as f:
+            f.write('[dist_info]\npost-hook.test = foo.hook\n')
+        assert not can_write_directly(read_config('setup.cfg'),
+                                      [other_config])
+
+        # Commands replacing those that write the metadata
+        with open_config('setup.cfg') as cfg:
+            commands = cfg.get('global', 'commands')
+            cfg.set('global', 'commands',
+                    commands + '\negg_info = foo.egg_info')
+        assert not can_write_directly(read_config('setup.cfg'))
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('global', 'commands', 'foo.egg_info')
+        assert not can_write_directly(read_config('setup.cfg'))
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('global', 'commands', commands)
+
+        with open_config('setup.cfg') as cfg:
+            cfg.add_section('egg_info')
+            cfg.set('egg_info', 'pre-hook.test', 'foo.hook')
+        assert not can_write_directly(read_config('setup.cfg'))
+
+        with open_config('setup.cfg') as cfg:
+            cfg.remove_section('egg_info')
+            cfg.set('global', 'setup-hooks', 'foo.hook')
+        assert not can_write_directly(read_config('setup.cfg'))
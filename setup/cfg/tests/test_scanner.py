@@ -0,0 +1,75 @@
+from __future__ import with_statement
+
+import os
+import sys
+
+from distutils.errors import DistutilsOptionError
+
+from . import D2to1TestCase
+from .util import open_config
+from ..config import SetupConfig, read_config
+from ..extern.six import moves
+from ..scanner import UnsupportedSyntax, scan_config
+from ..util import split_csv, split_multiline
+
+
+class TestScanner(D2to1TestCase):
+    def test_scan_config(self):
+        """
+        Test that the scanner parses setup.cfg like RawConfigParser, and
+        records the line numbers of the options.
+        """
+
+        parser = moves.configparser.RawConfigParser()
+        parser.read('setup.cfg')
+        expected = dict((section, dict(parser.items(section)))
+                        for section in parser.sections())
+
+        config = scan_config('setup.cfg')
+        assert config == expected
+        assert config.location('metadata', 'author_email') == 'setup.cfg:5'
+
+        classifiers = config['metadata']['classifier']
+        assert split_multiline(classifiers) == [
+            line.strip() for line in classifiers.splitlines() if line]
+        assert split_csv(config['metadata']['keywords']) == [
+            'packaging', 'distutils', 'setuptools']
+
+    def test_fallback(self):
+        """
+        Test that files using syntax not supported by the scanner are parsed
+        with RawConfigParser instead.
+        """
+
+        with open('setup.cfg', 'a') as f:
+            f.write('\n[extra]\nfoo =\n    bar\n\n    baz\n')
+
+        try:
+            scan_config('setup.cfg')
+        except UnsupportedSyntax:
+            pass
+        else:
+            assert False, 'the scanner parsed a blank line within a value'
+
+        config = read_config('setup.cfg', 'scanner')
+        assert split_multiline(config['extra']['foo']) == ['bar', 'baz']
+        assert config['metadata']['name'] == 'setup_cfg_testpackage'
+
+    def test_error_location(self):
+        """
+        Test that errors in converting options report where the option is
+        when the file was scanned.
+        """
+
+        with open_config('setup.cfg') as cfg:
+            cfg.set('files', 'package-data', 'package_data/*.txt')
+
+        setup_config = SetupConfig.from_file('setup.cfg', 'scanner')
+        try:
+            setup_config['package_data']
+        except DistutilsOptionError:
+            e = str(sys.exc_info()[1])
+            assert e.startswith(os.path.abspath('setup.cfg') + ':'), e
+            assert 'malformed package_data' in e
+        else:
+            assert False, 'malformed package_data was accepted'
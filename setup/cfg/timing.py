@@ -0,0 +1,249 @@
+"""Timing of setup hooks and pre/post command hooks.
+
+Every hook run by setup.cfg is timed, and recorded with its name, kind
+(``setup_hook``, ``pre_hook`` or ``post_hook``), the command it ran for (if
+any) and its duration.
+
+The report of the hook times is enabled with the ``SETUP_CFG_HOOK_TIMES``
+environment variable, or the ``hook-times`` option in the ``[global]``
+section of setup.cfg.  At the end of the run a summary table of the hooks,
+slowest first, is then printed to stderr (so as not to mix with the output of
+metadata queries such as ``./setup.py --version``), and the records are
+written as JSON to ``build/setup.cfg/hook-times.json`` next to setup.cfg (or
+to the file named by the ``SETUP_CFG_HOOK_TIMES_FILE`` environment variable,
+which also enables the report).
+
+A time budget for the hooks can be set with the ``hook-time-budget`` option in
+the ``[global]`` section of setup.cfg.  Each line of the option gives a budget
+in seconds (or with an ``ms``, ``s`` or ``m`` suffix), optionally preceded by
+the name of the hook it applies to and followed by ``warn`` (the default) or
+``fail``::
+
+    [global]
+    hook-time-budget =
+        5s
+        my_package.hooks.generate_sources = 1m fail
+
+A hook that takes longer than its budget causes a warning, or makes the run
+fail.
+"""
+
+from __future__ import with_statement
+
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+from distutils import log
+from distutils.errors import DistutilsOptionError
+
+from .cache import atomic_write
+from .util import split_multiline
+
+
+HOOK_TIMES_ENV = 'SETUP_CFG_HOOK_TIMES'
+HOOK_TIMES_FILE_ENV = 'SETUP_CFG_HOOK_TIMES_FILE'
+DEFAULT_HOOK_TIMES_FILE = os.path.join('build', 'setup.cfg',
+                                       'hook-times.json')
+
+# The clock used to time hooks
+timer = getattr(time, 'perf_counter', time.time)
+
+_DURATION_RE = re.compile(r'^(\d+(?:\.\d*)?|\.\d+)\s*(ms|s|m)?$', re.I)
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60}
+
+_FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+_hook_times = None
+_hook_times_lock = threading.Lock()
+
+
+def parse_duration(value):
+    """Parses a duration in seconds, optionally with an ``ms``, ``s`` or
+    ``m`` suffix.
+    """
+
+    match = _DURATION_RE.match(value.strip())
+    if match is None:
+        raise DistutilsOptionError('invalid duration: %r' % value)
+    number, unit = match.groups()
+    return float(number) * _DURATION_UNITS[(unit or 's').lower()]
+
+
+def parse_budget(value):
+    """Parses the value of the ``hook-time-budget`` option.
+
+    Returns the default budget as a ``(seconds, action)`` tuple (or `None`)
+    and a dict mapping hook names to their own budgets.
+    """
+
+    default = None
+    budgets = {}
+    for line in split_multiline(value):
+        if '=' in line:
+            hook, line = [part.strip() for part in line.split('=', 1)]
+        else:
+            hook = None
+
+        parts = line.split()
+        action = 'warn'
+        if len(parts) == 2:
+            action = parts[1].lower()
+        if len(parts) not in (1, 2) or action not in ('warn', 'fail'):
+            raise DistutilsOptionError(
+                'invalid hook-time-budget: %r (expected a duration followed '
+                'by an optional "warn" or "fail")' % line)
+
+        budget = (parse_duration(parts[0]), action)
+        if hook is None:
+            default = budget
+        else:
+            budgets[hook] = budget
+
+    return default, budgets
+
+
+def _is_true(value):
+    return (value or '').strip().lower() not in _FALSE_VALUES
+
+
+def get_hook_times():
+    """Returns the `HookTimes` shared by everything in this process.
+
+    If enabled, the summary of the hook times is reported when the process
+    exits, unless it was reported earlier.
+    """
+
+    global _hook_times
+
+    with _hook_times_lock:
+        if _hook_times is None:
+            _hook_times = HookTimes()
+            atexit.register(_hook_times.report)
+        return _hook_times
+
+
+class HookTimes(object):
+    """Records how long each hook took, and checks the durations against the
+    configured budgets.
+
+    The records are only reported if enabled by setup.cfg or the environment
+    variables.  Relative paths to the report file are relative to `base_dir`,
+    the directory of setup.cfg once it is known, rather than to the current
+    directory at the end of the run.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.default_budget = None
+        self.budgets = {}
+        self.enabled = False
+        self.base_dir = None
+        self._lock = threading.Lock()
+
+    def enable(self, value):
+        """Enables the report if the given value of the ``hook-times`` option
+        is true; the environment variables take precedence over setup.cfg.
+        """
+
+        if not self.enabled:
+            self.enabled = _is_true(value)
+
+    def set_budget(self, value):
+        """Sets the budgets from the value of the ``hook-time-budget`` option
+        (see `parse_budget`); a false value removes them.
+        """
+
+        if value:
+            self.default_budget, self.budgets = parse_budget(value)
+        else:
+            self.default_budget, self.budgets = None, {}
+
+    @contextmanager
+    def timed(self, kind, hook, command=None):
+        """Context manager that records the time taken by the given hook if
+        it completes.
+        """
+
+        start = timer()
+        yield
+        self.record(kind, hook, command, timer() - start)
+
+    def record(self, kind, hook, command, duration):
+        """Records the duration of a hook, and warns or exits if it exceeds
+        its budget.
+        """
+
+        with self._lock:
+            self.records.append({'kind': kind, 'hook': hook,
+                                 'command': command, 'duration': duration})
+
+        budget = self.budgets.get(hook, self.default_budget)
+        if budget is None or duration <= budget[0]:
+            return
+
+        seconds, action = budget
+        msg = ('[setup.cfg] %s %s took %.3fs, exceeding its budget of %.3fs' %
+               (kind, hook, duration, seconds))
+        if action == 'fail':
+            log.error(msg)
+            sys.exit(1)
+        log.warn(msg)
+
+    def summary(self, records=None):
+        """Returns a table of the recorded hooks (or of the given records),
+        slowest first.
+        """
+
+        if records is None:
+            records = self.records
+
+        rows = [('kind', 'command', 'hook', 'time')]
+        for rec in sorted(records, key=lambda r: -r['duration']):
+            rows.append((rec['kind'], rec['command'] or '-', rec['hook'],
+                         '%.3fs' % rec['duration']))
+
+        widths = [max(len(row[idx]) for row in rows) for idx in range(3)]
+        lines = []
+        for row in rows:
+            cells = [cell.ljust(width) for cell, width in zip(row, widths)]
+            lines.append('  '.join(cells + [row[3].rjust(8)]))
+        return '\n'.join(lines)
+
+    def report(self, filename=None):
+        """Prints the summary and writes the records as JSON, then forgets
+        them.  Does nothing if the report is not enabled, or no hooks were
+        recorded.
+        """
+
+        with self._lock:
+            records = self.records
+            self.records = []
+        if not records:
+            return
+
+        if filename is None:
+            filename = os.environ.get(HOOK_TIMES_FILE_ENV)
+        if not (self.enabled or filename or
+                _is_true(os.environ.get(HOOK_TIMES_ENV))):
+            return
+
+        filename = os.path.join(self.base_dir or os.getcwd(),
+                                filename or DEFAULT_HOOK_TIMES_FILE)
+
+        sys.stderr.write('[setup.cfg] hook times:\n%s\n' %
+                         self.summary(records))
+
+        data = {'hooks': records,
+                'total': sum(rec['duration'] for rec in records)}
+        try:
+            atomic_write(filename, json.dumps(data, indent=2))
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log.warn('[setup.cfg] could not write %s: %s' % (filename, e))
@@ -1,32 +1,90 @@
 """Miscellaneous utilities."""
 
+import os
 import re
+import sys
 
 from collections import defaultdict
 
 
+# Names already resolved by resolve_name(), mapped to the resolved object and
+# the module it was found in
+_resolved_names = {}
+
+# Names that could not be resolved, mapped to the sys.path they were looked
+# for on and the error message
+_unresolved_names = {}
+
+
 def resolve_name(name):
     """Resolve a name like ``module.object`` to an object and return it.
 
+    The name may also be given as ``module:object``, in which case only
+    ``module`` is imported; otherwise progressively shorter prefixes of the
+    name are tried until one can be imported.
+
+    Names are only resolved once: both the result and any failure are
+    remembered (failures are retried if ``sys.path`` changes, and successes
+    if their module is removed from or replaced in ``sys.modules``).
+
     Raise ImportError if the module or name is not found.
     """
 
-    parts = name.split('.')
-    cursor = len(parts) - 1
-    module_name = parts[:cursor]
-    attr_name = parts[-1]
+    try:
+        ret, module_name, module = _resolved_names[name]
+    except KeyError:
+        pass
+    else:
+        if sys.modules.get(module_name) is module:
+            return ret
+
+    path = tuple(sys.path)
+    failure = _unresolved_names.get(name)
+    if failure is not None and failure[0] == path:
+        raise ImportError(failure[1])
+
+    try:
+        ret, module_name = _resolve_name(name)
+    except ImportError:
+        e = sys.exc_info()[1]
+        _unresolved_names[name] = (path, str(e))
+        raise
+
+    _unresolved_names.pop(name, None)
+    _resolved_names[name] = (ret, module_name, sys.modules.get(module_name))
+    return ret
 
-    while cursor > 0:
-        try:
-            ret = __import__('.'.join(module_name), fromlist=[attr_name])
-            break
-        except ImportError:
-            if cursor == 0:
-                raise
-            cursor -= 1
-            module_name = parts[:cursor]
-            attr_name = parts[cursor]
-            ret = ''
+
+def _resolve_name(name):
+    """Does the actual work of `resolve_name`; returns the resolved object and
+    the name of the module it was found in.
+    """
+
+    if ':' in name:
+        module_name, attr_names = name.split(':', 1)
+        __import__(module_name)
+        ret = sys.modules[module_name]
+        parts = attr_names.split('.')
+        cursor = 0
+    else:
+        parts = name.split('.')
+        cursor = len(parts) - 1
+        module_name = parts[:cursor]
+        attr_name = parts[-1]
+
+        while cursor > 0:
+            try:
+                ret = __import__('.'.join(module_name), fromlist=[attr_name])
+                break
+            except ImportError:
+                if cursor == 0:
+                    raise
+                cursor -= 1
+                module_name = parts[:cursor]
+                attr_name = parts[cursor]
+                ret = ''
+
+        module_name = '.'.join(module_name)
 
     for part in parts[cursor:]:
         try:
@@ -34,7 +92,7 @@ def resolve_name(name):
         except AttributeError:
             raise ImportError(name)
 
-    return ret
+    return ret, module_name
 
 
 def has_get_option(config, section, option):
@@ -46,6 +104,54 @@ def has_get_option(config, section, option):
         return False
 
 
+def fold_options(options):
+    """
+    Returns a copy of a section's options keyed on their canonical names, in
+    which dashes are replaced with underscores.  If both spellings of an option
+    are present the one with underscores is used, as in `has_get_option`.
+    """
+
+    folded = {}
+    for option, value in options.items():
+        key = option.replace('-', '_')
+        if key == option or key not in folded:
+            folded[key] = value
+    return folded
+
+
+def index_options(config):
+    """
+    Returns a copy of the config with the options of each section keyed on
+    their canonical names (see `fold_options`).
+    """
+
+    return dict((section, fold_options(options))
+                for section, options in config.items())
+
+
+def relative_path(path, base_dir):
+    """Returns the given absolute path relative to *base_dir*, with ``/``
+    separators (or ``.`` for *base_dir* itself), or unchanged if it is not
+    inside *base_dir*.
+    """
+
+    base_dir = os.path.abspath(base_dir)
+    if path == base_dir:
+        return '.'
+    prefix = os.path.join(base_dir, '')
+    if path.startswith(prefix):
+        return path[len(prefix):].replace(os.sep, '/')
+    return path
+
+
+def absolute_path(name, base_dir):
+    """The reverse of `relative_path`."""
+
+    if os.path.isabs(name):
+        return name
+    return os.path.normpath(os.path.join(base_dir, *name.split('/')))
+
+
 def split_multiline(value):
     """Special behaviour when we have a multi line options"""
 